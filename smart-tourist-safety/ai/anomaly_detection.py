@@ -3,108 +3,614 @@ Anomaly Detection Engine for Smart Tourist Safety Monitoring System
 This module implements AI/ML models for detecting unusual tourist behavior
 """
 
+import math
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import DBSCAN
-import joblib
+import time
+import metrics
+from feature_store import TouristFeatureStore
+from timestamps import parse_epoch_ms
+from model_registry import ModelBundle, ModelRegistry
+from inactivity_scanner import InactivityScanner
+from result_cache import ResultCache, content_key
+from crowd_density import SiteCrowdMonitors
+from geo_kernels import haversine, trajectory_features
+from route_index import RouteIndex, RouteIndexCache, CorridorTracker, route_digest
+from wire_format import LocationColumns, coordinates
+from trajectory_simplifier import simplify_mask
 import json
 from datetime import datetime, timedelta
+from threading import Thread, Lock
 import warnings
 warnings.filterwarnings('ignore')
 
+# Scored once during warm-up so the first real request runs on warm code paths
+WARM_UP_WINDOW = [
+    {"latitude": 27.175015, "longitude": 78.042155, "timestamp": "2025-09-08T10:00:00Z"},
+    {"latitude": 27.175120, "longitude": 78.042210, "timestamp": "2025-09-08T10:05:00Z"},
+    {"latitude": 27.175230, "longitude": 78.042315, "timestamp": "2025-09-08T10:10:00Z"},
+]
+
+# Route deviation score above which a path counts as deviating
+ROUTE_DEVIATION_THRESHOLD = 0.3
+
+# Logistic scale of each detector's margin past its own threshold; every
+# detector's risk crosses 0.5 exactly where it flags an anomaly
+RISK_SCALES = {"location_dropoff": 0.05, "prolonged_inactivity": 0.25, "route_deviation": 0.25}
+
+def detector_risk(result):
+    """
+    Risk in [0, 1] of one detection result
+    :param result: Result of one of the three detectors
+    :return: 0 for windows too short to score, 1 outside the route corridor
+    """
+    kind = result.get("type")
+    if kind == "location_dropoff":
+        margin = -result["score"]
+    elif kind == "prolonged_inactivity":
+        margin = result["max_inactivity_minutes"] / result["threshold_minutes"] - 1
+    elif kind == "route_deviation":
+        if result["outside_corridor"]:
+            return 1.0
+        margin = result["score"] / ROUTE_DEVIATION_THRESHOLD - 1
+    else:
+        return 0.0
+    return 1 / (1 + math.exp(-max(-50.0, min(50.0, margin / RISK_SCALES[kind]))))
+
+def combined_risk(results):
+    """
+    Combine detection results into one risk score: the highest detector risk,
+    so a single strong signal is never averaged away
+    :param results: Dict of detector name to result; None entries are skipped
+    :return: Risk score, level ('low', 'medium' from 0.5, 'high' from 0.8) and
+             the detectors that flagged an anomaly
+    """
+    risks = {name: detector_risk(result) for name, result in results.items() if result is not None}
+    score = max(risks.values(), default=0.0)
+    return {
+        "risk_score": float(score),
+        "risk_level": "high" if score >= 0.8 else "medium" if score >= 0.5 else "low",
+        "detector_risks": risks,
+        "anomalies": [name for name, result in results.items() if result is not None and result["anomaly"]]
+    }
+
 class AnomalyDetectionEngine:
     """
     AI Engine for detecting anomalies in tourist behavior patterns
     """
     
-    def __init__(self):
-        self.location_dropoff_model = IsolationForest(contamination=0.1, random_state=42)
-        self.inactivity_model = IsolationForest(contamination=0.1, random_state=42)
-        self.route_deviation_model = IsolationForest(contamination=0.1, random_state=42)
-        self.scaler = StandardScaler()
-        self.is_trained = False
+    def __init__(self, scoring_mode='frozen', registry_dir='models/registry',
+                 cache_size=10000, cache_ttl_seconds=30, simplify_tolerance_m=None,
+                 simplify_max_gap_seconds=300.0):
+        """
+        :param scoring_mode: 'frozen' scores with the scaler and forest fitted in
+                             train_models; 'refit' restores the original
+                             per-request scaler fit
+        :param registry_dir: Directory of the versioned model registry
+        :param cache_size: Results of stateless requests kept for re-posted
+                           windows (0 disables the cache)
+        :param cache_ttl_seconds: How long a cached result is served
+        :param simplify_tolerance_m: When set, drop-off windows, training windows
+                                     and streaming tracks are simplified with this
+                                     error bound in metres before features are
+                                     extracted (see trajectory_simplifier.py)
+        :param simplify_max_gap_seconds: Longest time between kept points
+        """
+        # All models live in one bundle that is replaced with a single reference
+        # assignment, so a request always scores against a consistent set
+        self.models = ModelBundle.untrained()
+        self.model_generation = 0  # Bumped on every swap; part of result cache keys
+        self.result_cache = ResultCache(cache_size, cache_ttl_seconds)
+        self.registry = ModelRegistry(registry_dir)
+        self.reload_lock = Lock()
+        self.reload_status = {"state": "idle", "version": None, "error": None}
+        self.simplify_tolerance_m = simplify_tolerance_m
+        self.simplify_max_gap_seconds = simplify_max_gap_seconds
+        self.feature_store = TouristFeatureStore(simplify_tolerance_m=simplify_tolerance_m,
+                                                 simplify_max_gap_seconds=simplify_max_gap_seconds)
+        self.route_indexes = RouteIndexCache()
+        self.corridor_tracker = CorridorTracker()
+        self.crowd_monitor = SiteCrowdMonitors()
+        self.scoring_mode = scoring_mode
+        self.online_refresher = None
+        self.inactivity_scanner = None
+    
+    @property
+    def location_dropoff_model(self):
+        return self.models.location_dropoff_model
+    
+    @property
+    def inactivity_model(self):
+        return self.models.inactivity_model
+    
+    @property
+    def route_deviation_model(self):
+        return self.models.route_deviation_model
+    
+    @property
+    def scaler(self):
+        return self.models.scaler
+    
+    @property
+    def is_trained(self):
+        return self.models.is_trained
+    
+    @property
+    def model_version(self):
+        return self.models.version
+    
+    def enable_online_refresh(self, **options):
+        """
+        Start refitting the dropoff model in the background from recently scored
+        feature vectors; options are passed to OnlineRefresher
+        """
+        from online_refresh import OnlineRefresher
         
+        if self.online_refresher is None:
+            self.online_refresher = OnlineRefresher(self, **options).start()
+            metrics.track_queue('online_refresh_pending', lambda: len(self.online_refresher.pending))
+        return self.online_refresher
+    
+    def enable_inactivity_scanner(self, **options):
+        """
+        Start flagging tourists that stop reporting; every request carrying a
+        tourist_id counts as a sighting. Options are passed to InactivityScanner
+        """
+        if self.inactivity_scanner is None:
+            self.inactivity_scanner = InactivityScanner(**options).start()
+            metrics.track_queue('inactivity_schedule', lambda: len(self.inactivity_scanner.heap))
+        return self.inactivity_scanner
+    
+    def _record_sighting(self, tourist_id, epoch, latitude, longitude):
+        """Pass a tourist's latest point to the crowd monitor and inactivity scanner"""
+        self.crowd_monitor.update(tourist_id, latitude, longitude)
+        if self.inactivity_scanner is not None:
+            self.inactivity_scanner.touch(tourist_id, float(epoch))
+    
+    def forget_tourist(self, tourist_id):
+        """
+        Drop all streaming state of a tourist, e.g. at checkout
+        :return: Whether any state was held
+        """
+        forgotten = [self.feature_store.remove(tourist_id), self.corridor_tracker.remove(tourist_id),
+                     self.crowd_monitor.remove(tourist_id)]
+        if self.inactivity_scanner is not None:
+            forgotten.append(self.inactivity_scanner.forget(tourist_id))
+        return any(forgotten)
+    
+    def _update_track(self, tourist_id, location_data):
+        """Add new points to a tourist's streaming track and record the sighting"""
+        track = self.feature_store.update(tourist_id, location_data)
+        if len(track):
+            self._record_sighting(tourist_id, track.last_epoch, *track.last_position)
+        return track
+    
+    def swap_models(self, bundle):
+        """
+        Make a bundle live; requests already running finish on the previous one
+        """
+        self.models = bundle
+        self.model_generation += 1
+        self.result_cache.invalidate()
+    
+    def _cached(self, kind, parts, compute):
+        """
+        Serve a stateless request from the result cache, computing it on a miss
+        """
+        key = content_key(kind, self.model_generation, self.model_version, *parts)
+        result = self.result_cache.get(key)
+        if result is None:
+            result = compute()
+            self.result_cache.put(key, result)
+        return result
+        
+    def _columns(self, location_data):
+        """
+        A window as LocationColumns; point lists are converted here, with every
+        timestamp parsed to epoch milliseconds in one vectorized call
+        """
+        if isinstance(location_data, LocationColumns):
+            return location_data
+        return LocationColumns.from_points(location_data)
+    
+    def _time_sorted(self, window):
+        """LocationColumns in time order; window itself when already sorted"""
+        if len(window) > 1 and np.any(window.timestamp_ms[1:] < window.timestamp_ms[:-1]):
+            order = np.argsort(window.timestamp_ms, kind='stable')
+            return LocationColumns(window.latitude[order], window.longitude[order], window.timestamp_ms[order])
+        return window
+    
+    def _simplify(self, window):
+        """
+        Drop the redundant points of a stateless window when simplification is on
+        :param window: LocationColumns
+        :return: The kept points in time order, or window itself when unchanged
+        """
+        if self.simplify_tolerance_m is None or len(window) < 3:
+            return window
+        
+        order = np.argsort(window.timestamp_ms, kind='stable')
+        kept = order[simplify_mask(window.latitude[order], window.longitude[order], window.seconds[order],
+                                   tolerance_m=self.simplify_tolerance_m,
+                                   max_gap_seconds=self.simplify_max_gap_seconds)]
+        return LocationColumns(window.latitude[kept], window.longitude[kept], window.timestamp_ms[kept])
+    
     def preprocess_location_data(self, location_data):
         """
         Preprocess location data for anomaly detection
-        :param location_data: List of location points with timestamps
+        :param location_data: List of location points with timestamps, or LocationColumns
         :return: Processed features for anomaly detection
         """
         if len(location_data) < 2:
             return None
-            
-        # Convert to DataFrame
-        df = pd.DataFrame(location_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
-        
-        # Calculate features
-        df['time_diff'] = df['timestamp'].diff().dt.total_seconds().fillna(0)
-        df['distance'] = np.sqrt((df['latitude'].diff())**2 + (df['longitude'].diff())**2).fillna(0)
-        df['speed'] = df['distance'] / (df['time_diff'] + 1e-6)  # Avoid division by zero
+        window = self._simplify(self._columns(location_data))
         
-        # Remove first row which has NaN values
-        df = df.iloc[1:].reset_index(drop=True)
+        # Sort by time and calculate features (distance in metres, speed in m/s)
+        order = np.argsort(window.timestamp_ms, kind='stable')
+        latitude, longitude = window.latitude[order], window.longitude[order]
+        seconds = (window.timestamp_ms[order] - window.timestamp_ms[order[0]]) / 1000.0
+        movement = trajectory_features(latitude, longitude, seconds)
         
-        # Extract features
-        features = df[['latitude', 'longitude', 'time_diff', 'distance', 'speed']].values
+        # Extract features, dropping the first row which has no previous point
+        return np.column_stack((
+            latitude, longitude, movement['time_diff'], movement['distance'], movement['speed']
+        ))[1:]
+    
+    def latest_location_features(self, location_data):
+        """
+        Feature row of the newest point of a window
+        :param location_data: List of location points with timestamps, or LocationColumns
+        :return: Same values as the last row of preprocess_location_data, or None
+        """
+        if len(location_data) < 2:
+            return None
+        window = self._simplify(self._columns(location_data))
         
-        return features
+        previous, last = np.argsort(window.timestamp_ms, kind='stable')[-2:]
+        latitude, longitude = window.latitude[last], window.longitude[last]
+        time_diff = (window.timestamp_ms[last] - window.timestamp_ms[previous]) / 1000.0
+        distance = haversine(window.latitude[previous], window.longitude[previous], latitude, longitude)
+        return np.array([latitude, longitude, time_diff, distance, distance / (time_diff + 1e-6)])
+    
+    def _dropoff_result(self, score):
+        return {
+            "anomaly": bool(score < 0),
+            "score": float(score),
+            "confidence": float(abs(score)),  # How far from the threshold
+            "timestamp": datetime.now().isoformat(),
+            "type": "location_dropoff"
+        }
     
-    def detect_location_dropoff(self, location_data):
+    def detect_location_dropoff(self, location_data, tourist_id=None):
         """
         Detect sudden stoppage or location drop-off
-        :param location_data: List of recent location points
+        :param location_data: List of recent location points, or LocationColumns
+        :param tourist_id: Optional tourist id; when given, the streaming feature
+                           store is updated with the new points and scored instead
         :return: Anomaly score and detection result
         """
-        features = self.preprocess_location_data(location_data)
+        # Requests with a tourist_id update streaming state, so they always run
+        if tourist_id is None and self.result_cache.enabled:
+            return self._cached('location_dropoff', (location_data,),
+                                lambda: self._detect_location_dropoff(location_data))
+        return self._detect_location_dropoff(location_data, tourist_id)
+    
+    def _frozen_scoring(self, models):
+        return self.scoring_mode == 'frozen' and models.compiled_dropoff_model is not None
+    
+    def _detect_location_dropoff(self, location_data, tourist_id=None):
+        models = self.models
+        started = time.perf_counter()
+        if self._frozen_scoring(models):
+            # Only the latest point decides the result, so only it is scored
+            if tourist_id is not None:
+                latest = self._update_track(tourist_id, location_data).latest_features()
+            else:
+                latest = self.latest_location_features(location_data)
+            metrics.lap(metrics.FEATURE_EXTRACTION, started)
+            return self._score_latest(models, latest)
+        
+        if tourist_id is not None:
+            features = self._update_track(tourist_id, location_data).features()
+        else:
+            features = self.preprocess_location_data(location_data)
+        metrics.lap(metrics.FEATURE_EXTRACTION, started)
+        return self._score_window(models, features)
+    
+    def _score_latest(self, models, latest):
+        """Frozen drop-off scoring of the newest point's feature row"""
+        if latest is None:
+            return {"anomaly": False, "score": 0, "confidence": 0}
+        if self.online_refresher is not None:
+            self.online_refresher.observe(latest)
+        
+        started = time.perf_counter()
+        scaled_features = models.frozen_scaler.transform(latest[None, :])
+        started = metrics.lap(metrics.SCALING, started)
+        score = models.compiled_dropoff_model.decision_function(scaled_features)[0]
+        metrics.lap(metrics.MODEL_SCORING, started)
+        metrics.DROPOFF_ROWS.inc()
+        return self._dropoff_result(score)
+    
+    def _score_window(self, models, features):
+        """Refit drop-off scoring of a window's feature rows; the newest decides"""
         if features is None:
             return {"anomaly": False, "score": 0, "confidence": 0}
+        if self.online_refresher is not None:
+            self.online_refresher.observe(features[-1])
         
-        # Scale features
-        scaled_features = self.scaler.fit_transform(features)
+        if models.location_dropoff_model is None:
+            raise ValueError("Location dropoff model is not trained")
         
-        # Detect anomalies
-        anomaly_scores = self.location_dropoff_model.decision_function(scaled_features)
-        predictions = self.location_dropoff_model.predict(scaled_features)
+        # Scale features on the window itself, leaving the trained scaler untouched
+        from sklearn.preprocessing import StandardScaler
+        started = time.perf_counter()
+        scaled_features = StandardScaler().fit_transform(features)
+        started = metrics.lap(metrics.SCALING, started)
         
-        # Check if the latest point is anomalous
-        latest_anomaly = predictions[-1] == -1
-        latest_score = anomaly_scores[-1]
+        # Detect anomalies and check if the latest point is anomalous
+        anomaly_scores = models.location_dropoff_model.decision_function(scaled_features)
+        metrics.lap(metrics.MODEL_SCORING, started)
+        metrics.DROPOFF_ROWS.inc(len(scaled_features))
+        return self._dropoff_result(anomaly_scores[-1])
+    
+    def _stack_windows(self, windows):
+        """
+        Flatten many location windows into contiguous, time-sorted arrays
+        :param windows: List of location point lists (or LocationColumns), one per tourist
+        :return: (features, segment ids, segment end offsets, kept window indices,
+                 latest epoch seconds of every kept window)
+        """
+        kept = [i for i, window in enumerate(windows) if len(window) >= 2]
+        if not kept:
+            return None, None, None, kept, None
         
-        # Calculate confidence (how far from the threshold)
-        confidence = abs(latest_score)
+        lengths = np.array([len(windows[i]) for i in kept], dtype=np.int64)
+        columnar = [isinstance(windows[i], LocationColumns) for i in kept]
+        points = [p for i, is_columns in zip(kept, columnar) if not is_columns for p in windows[i]]
+        latitude = np.fromiter((p['latitude'] for p in points), dtype=float, count=len(points))
+        longitude = np.fromiter((p['longitude'] for p in points), dtype=float, count=len(points))
         
-        return {
-            "anomaly": bool(latest_anomaly),
-            "score": float(latest_score),
-            "confidence": float(confidence),
-            "timestamp": datetime.now().isoformat(),
-            "type": "location_dropoff"
-        }
+        # Parse every timestamp of every window in a single vectorized call
+        seconds = parse_epoch_ms([p['timestamp'] for p in points]) / 1000.0
+        
+        if any(columnar):
+            # Interleave the parsed point lists with the columnar windows
+            pieces = []
+            offset = 0
+            for i, is_columns in zip(kept, columnar):
+                if is_columns:
+                    pieces.append((windows[i].latitude, windows[i].longitude, windows[i].seconds))
+                else:
+                    end = offset + len(windows[i])
+                    pieces.append((latitude[offset:end], longitude[offset:end], seconds[offset:end]))
+                    offset = end
+            latitude, longitude, seconds = (np.concatenate(column) for column in zip(*pieces))
+        
+        # Sort by time inside each window, keeping windows contiguous
+        owner = np.repeat(np.arange(len(kept)), lengths)
+        order = np.lexsort((seconds, owner))
+        latitude, longitude, seconds = latitude[order], longitude[order], seconds[order]
+        
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        if self.simplify_tolerance_m is not None:
+            # Simplify every window in one pass; first and last points survive
+            simplified = simplify_mask(latitude, longitude, seconds, starts, self.simplify_tolerance_m,
+                                       self.simplify_max_gap_seconds)
+            latitude, longitude, seconds, owner = (latitude[simplified], longitude[simplified],
+                                                   seconds[simplified], owner[simplified])
+            lengths = np.bincount(owner, minlength=len(kept))
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        movement = trajectory_features(latitude, longitude, seconds, starts)
+        
+        # Drop the first point of every window, as preprocess_location_data does
+        keep = np.ones(len(latitude), dtype=bool)
+        keep[starts] = False
+        features = np.column_stack((
+            latitude, longitude, movement['time_diff'], movement['distance'], movement['speed']
+        ))[keep]
+        segments = owner[keep]
+        ends = np.cumsum(lengths - 1)
+        
+        return features, segments, ends, kept, seconds[np.cumsum(lengths) - 1]
+    
+    def detect_batch(self, tourist_windows):
+        """
+        Detect location dropoff for many tourists with a single model call
+        :param tourist_windows: List of {"tourist_id": ..., "location_data": [...]} entries
+        :return: List of detection results in the same order as the input
+        """
+        windows = [entry.get('location_data', []) for entry in tourist_windows]
+        results = [
+            {"tourist_id": entry.get('tourist_id'), "anomaly": False, "score": 0, "confidence": 0}
+            for entry in tourist_windows
+        ]
+        
+        started = time.perf_counter()
+        features, segments, ends, kept, last_seen = self._stack_windows(windows)
+        metrics.lap(metrics.FEATURE_EXTRACTION, started)
+        if features is None:
+            return results
+        if self.online_refresher is not None:
+            self.online_refresher.observe(features[ends - 1])
+        for index, epoch, (latitude, longitude) in zip(kept, last_seen, features[ends - 1, :2]):
+            if tourist_windows[index].get('tourist_id') is not None:
+                self._record_sighting(tourist_windows[index]['tourist_id'], epoch, latitude, longitude)
+        
+        models = self.models
+        started = time.perf_counter()
+        if self.scoring_mode == 'frozen' and models.compiled_dropoff_model is not None:
+            latest = models.frozen_scaler.transform(features[ends - 1])
+            started = metrics.lap(metrics.SCALING, started)
+            anomaly_scores = models.compiled_dropoff_model.decision_function(latest)
+        else:
+            if models.location_dropoff_model is None:
+                raise ValueError("Location dropoff model is not trained")
+            
+            # Standardize each window on its own statistics, matching the
+            # per-request scaler fit of the 'refit' scoring mode
+            starts = np.concatenate(([0], ends[:-1]))
+            counts = (ends - starts)[:, None]
+            means = np.add.reduceat(features, starts, axis=0) / counts
+            centered = features - means[segments]
+            scales = np.sqrt(np.add.reduceat(centered**2, starts, axis=0) / counts)
+            scales[scales < 10 * np.finfo(float).eps] = 1.0
+            
+            # Only the latest point of each window decides the result
+            latest = centered[ends - 1] / scales
+            started = metrics.lap(metrics.SCALING, started)
+            anomaly_scores = models.location_dropoff_model.decision_function(latest)
+        metrics.lap(metrics.MODEL_SCORING, started)
+        metrics.DROPOFF_ROWS.inc(len(latest))
+        
+        for index, score in zip(kept, anomaly_scores):
+            results[index].update(self._dropoff_result(score))
+        
+        return results
     
-    def detect_prolonged_inactivity(self, location_data, threshold_minutes=30):
+    def detect_location_dropoff_many(self, requests):
+        """
+        Score many independent detect_location_dropoff requests with a single
+        model call; results are the same as scoring each request on its own
+        :param requests: List of {"location_data": [...], "tourist_id": ...} entries
+        :return: List of results, or of the exception raised for that request
+        """
+        models = self.models
+        if self.scoring_mode != 'frozen' or models.compiled_dropoff_model is None:
+            results = []
+            for entry in requests:
+                try:
+                    results.append(self.detect_location_dropoff(entry['location_data'], entry.get('tourist_id')))
+                except Exception as e:
+                    results.append(e)
+            return results
+        
+        results = [{"anomaly": False, "score": 0, "confidence": 0} for _ in requests]
+        rows = []
+        scored = []
+        cache_keys = {}
+        started = time.perf_counter()
+        for index, entry in enumerate(requests):
+            if entry.get('tourist_id') is None and self.result_cache.enabled:
+                key, cached = self._cache_lookup('location_dropoff', (entry['location_data'],))
+                if cached is not None:
+                    results[index] = cached
+                    continue
+                cache_keys[index] = key
+            try:
+                if entry.get('tourist_id') is not None:
+                    latest = self._update_track(entry['tourist_id'], entry['location_data']).latest_features()
+                else:
+                    latest = self.latest_location_features(entry['location_data'])
+            except Exception as e:
+                results[index] = e
+                continue
+            if latest is not None:
+                rows.append(latest)
+                scored.append(index)
+        
+        metrics.lap(metrics.FEATURE_EXTRACTION, started)
+        
+        if rows:
+            for index, result in zip(scored, self._score_latest_many(models, rows)):
+                results[index] = result
+        for index, key in cache_keys.items():
+            if not isinstance(results[index], Exception):
+                self.result_cache.put(key, results[index])
+        return results
+    
+    def _score_latest_many(self, models, rows):
+        """Frozen drop-off results of many newest-point feature rows, with one model call"""
+        features = np.vstack(rows)
+        if self.online_refresher is not None:
+            self.online_refresher.observe(features)
+        started = time.perf_counter()
+        scaled_features = models.frozen_scaler.transform(features)
+        started = metrics.lap(metrics.SCALING, started)
+        scores = models.compiled_dropoff_model.decision_function(scaled_features)
+        metrics.lap(metrics.MODEL_SCORING, started)
+        metrics.DROPOFF_ROWS.inc(len(rows))
+        return [self._dropoff_result(score) for score in scores]
+    
+    def _cache_lookup(self, kind, parts):
+        """
+        :return: (key to store the result under, cached result), or (None, None)
+                 when the cache is off
+        """
+        if not self.result_cache.enabled:
+            return None, None
+        key = content_key(kind, self.model_generation, self.model_version, *parts)
+        return key, self.result_cache.get(key)
+    
+    def detect_prolonged_inactivity(self, location_data, threshold_minutes=30, tourist_id=None):
         """
         Detect prolonged inactivity based on location data
-        :param location_data: List of location points
+        :param location_data: List of location points, or LocationColumns
         :param threshold_minutes: Threshold for inactivity in minutes
+        :param tourist_id: Optional tourist id; when given, the gap is read from
+                           the streaming feature store after adding the new points
         :return: Anomaly detection result
         """
-        if len(location_data) < 2:
-            return {"anomaly": False, "score": 0, "confidence": 0}
+        started = time.perf_counter()
+        if tourist_id is not None:
+            track = self._update_track(tourist_id, location_data)
+            if len(track) < 2:
+                return {"anomaly": False, "score": 0, "confidence": 0}
+            max_inactivity = track.max_time_gap() / 60  # Convert to minutes
+        else:
+            if len(location_data) < 2:
+                return {"anomaly": False, "score": 0, "confidence": 0}
+            
+            # Longest gap between consecutive points
+            timestamp_ms = self._columns(location_data).timestamp_ms
+            max_inactivity = np.diff(np.sort(timestamp_ms)).max() / 60000  # Convert to minutes
+        metrics.lap(metrics.FEATURE_EXTRACTION, started)
+        return self._inactivity_result(max_inactivity, threshold_minutes)
+    
+    def detect_prolonged_inactivity_many(self, requests):
+        """
+        Run many independent detect_prolonged_inactivity requests; the longest
+        gap of every window without a tourist_id is found in one sorted pass
+        :param requests: List of {"location_data": [...], "threshold_minutes": ..., "tourist_id": ...} entries
+        :return: List of results, or of the exception raised for that request
+        """
+        results = [None] * len(requests)
+        stacked = []
+        timestamps = []
+        started = time.perf_counter()
+        for index, entry in enumerate(requests):
+            try:
+                if entry.get('tourist_id') is not None or len(entry['location_data']) < 2:
+                    results[index] = self.detect_prolonged_inactivity(
+                        entry['location_data'], entry.get('threshold_minutes', 30), entry.get('tourist_id'))
+                    continue
+                timestamps.append(self._columns(entry['location_data']).timestamp_ms)
+            except Exception as e:
+                results[index] = e
+                continue
+            stacked.append(index)
+        if not stacked:
+            return results
         
-        # Convert to DataFrame
-        df = pd.DataFrame(location_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
+        # Sort inside each window and take the largest step, ignoring the step
+        # from one window's last point to the next window's first
+        lengths = np.array([len(timestamp_ms) for timestamp_ms in timestamps])
+        owner = np.repeat(np.arange(len(stacked)), lengths)
+        timestamp_ms = np.concatenate(timestamps)
+        timestamp_ms = timestamp_ms[np.lexsort((timestamp_ms, owner))]
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        gaps = np.diff(timestamp_ms, prepend=timestamp_ms[0])
+        gaps[starts] = 0
+        max_gaps = np.maximum.reduceat(gaps, starts)
+        metrics.lap(metrics.FEATURE_EXTRACTION, started)
         
-        # Calculate time differences
-        df['time_diff'] = df['timestamp'].diff().dt.total_seconds() / 60  # Convert to minutes
+        for index, max_gap in zip(stacked, max_gaps):
+            results[index] = self._inactivity_result(max_gap / 60000, requests[index].get('threshold_minutes', 30))
+        return results
+    
+    def _inactivity_result(self, max_inactivity, threshold_minutes):
+        metrics.INACTIVITY_ROWS.inc()
         
         # Check for prolonged inactivity
-        max_inactivity = df['time_diff'].max()
         is_inactive = max_inactivity > threshold_minutes
         
         # Calculate score based on how much it exceeds threshold
@@ -121,41 +627,120 @@ class AnomalyDetectionEngine:
             "type": "prolonged_inactivity"
         }
     
-    def detect_route_deviation(self, current_path, planned_itinerary):
+    def detect_route_deviation(self, current_path, planned_itinerary, itinerary_id=None, tourist_id=None):
         """
         Detect significant deviation from planned itinerary
-        :param current_path: List of actual location points
+        :param current_path: List of actual location points, or LocationColumns
         :param planned_itinerary: List of planned location points
+        :param itinerary_id: Optional id the compiled route is cached under; once
+                             cached, planned_itinerary may be omitted
+        :param tourist_id: Optional tourist id; corridor exits are then tracked
+                           incrementally across requests, so a single new point
+                           is enough
         :return: Anomaly detection result
         """
-        if len(current_path) < 2 or len(planned_itinerary) < 2:
-            return {"anomaly": False, "score": 0, "confidence": 0}
-        
-        # Convert to arrays
-        current_coords = np.array([[p['latitude'], p['longitude']] for p in current_path])
-        planned_coords = np.array([[p['latitude'], p['longitude']] for p in planned_itinerary])
-        
-        # Calculate centroid of each path
-        current_centroid = np.mean(current_coords, axis=0)
-        planned_centroid = np.mean(planned_coords, axis=0)
+        if tourist_id is None and self.result_cache.enabled:
+            return self._cached('route_deviation', (current_path, planned_itinerary, itinerary_id),
+                                lambda: self._detect_route_deviation(current_path, planned_itinerary, itinerary_id))
+        return self._detect_route_deviation(current_path, planned_itinerary, itinerary_id, tourist_id)
+    
+    def _route(self, planned_itinerary, itinerary_id=None, routes=None):
+        """
+        Compiled planned route, from the cache when itinerary_id is given
+        :param routes: Optional dict of routes already compiled for this batch,
+                       so requests sharing a planned itinerary compile it once
+        """
+        if itinerary_id is not None:
+            return self.route_indexes.get(itinerary_id, planned_itinerary)
+        if planned_itinerary is None or len(planned_itinerary) < 2:
+            return None
+        if routes is None:
+            return RouteIndex(planned_itinerary)
+        digest = route_digest(*coordinates(planned_itinerary))
+        if digest not in routes:
+            routes[digest] = RouteIndex(planned_itinerary)
+        return routes[digest]
+    
+    def detect_route_deviation_many(self, requests):
+        """
+        Run many independent detect_route_deviation requests; a planned
+        itinerary shared by several of them is compiled once for the batch
+        :param requests: List of {"current_path": [...], "planned_itinerary": [...],
+                         "itinerary_id": ..., "tourist_id": ...} entries
+        :return: List of results, or of the exception raised for that request
+        """
+        results = []
+        routes = {}
+        for entry in requests:
+            try:
+                parts = (entry['current_path'], entry.get('planned_itinerary'), entry.get('itinerary_id'))
+                key = result = None
+                if entry.get('tourist_id') is None:
+                    key, result = self._cache_lookup('route_deviation', parts)
+                if result is None:
+                    result = self._detect_route_deviation(*parts, entry.get('tourist_id'), routes)
+                    if key is not None:
+                        self.result_cache.put(key, result)
+                results.append(result)
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    def _detect_route_deviation(self, current_path, planned_itinerary, itinerary_id=None, tourist_id=None,
+                                routes=None):
+        # Route compilation (or cache lookup) and point distances are timed together
+        started = time.perf_counter()
+        route = self._route(planned_itinerary, itinerary_id, routes)
         
-        # Calculate distance between centroids
-        centroid_distance = np.linalg.norm(current_centroid - planned_centroid)
+        min_points = 1 if tourist_id is not None else 2
+        if route is None or len(current_path) < min_points:
+            return {"anomaly": False, "score": 0, "confidence": 0}
         
-        # Calculate path lengths
-        current_length = np.sum(np.linalg.norm(np.diff(current_coords, axis=0), axis=1))
-        planned_length = np.sum(np.linalg.norm(np.diff(planned_coords, axis=0), axis=1))
+        # The last distance, the corridor exits and the path length all follow time order
+        window = self._time_sorted(self._columns(current_path))
+        epochs = None
+        if tourist_id is not None:
+            epochs = window.seconds.tolist()
+            self._record_sighting(tourist_id, epochs[-1], window.latitude[-1], window.longitude[-1])
+        return self._route_result(route, window.latitude, window.longitude, started, epochs, itinerary_id,
+                                  tourist_id)
+    
+    def _route_result(self, route, latitude, longitude, started, epochs=None, itinerary_id=None, tourist_id=None):
+        """
+        Score a path against a compiled route
+        :param started: perf_counter value route matching began at
+        :param epochs: Point times, needed only to track corridor exits of tourist_id
+        """
+        # Exact distance of every point to the planned route
+        route_distances = route.distances(latitude, longitude)
+        metrics.lap(metrics.ROUTE_MATCHING, started)
+        metrics.ROUTE_ROWS.inc(len(route_distances))
+        if tourist_id is not None:
+            corridor = self.corridor_tracker.update(tourist_id, itinerary_id, epochs, route_distances)
+        else:
+            corridor = self.corridor_tracker.evaluate(route_distances)
         
-        # Calculate deviation metrics
-        centroid_deviation = centroid_distance / (np.linalg.norm(planned_centroid) + 1e-6)
-        length_deviation = abs(current_length - planned_length) / (planned_length + 1e-6)
+        if len(latitude) >= 2:
+            # Calculate the great-circle distance between the path centroids
+            centroid_distance = haversine(latitude.mean(), longitude.mean(), *route.centroid)
+            
+            # Calculate path length in metres
+            current_length = np.sum(haversine(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:]))
+            
+            # Calculate deviation metrics relative to the planned route length, so
+            # the score means the same thing at every site
+            centroid_deviation = centroid_distance / (route.length_m + 1e-6)
+            length_deviation = abs(current_length - route.length_m) / (route.length_m + 1e-6)
+        else:
+            centroid_deviation = length_deviation = 0.0
         
         # Combined deviation score
         deviation_score = 0.6 * centroid_deviation + 0.4 * length_deviation
         
-        # Determine if it's an anomaly (threshold can be adjusted)
-        is_deviation = deviation_score > 0.3
-        confidence = min(1.0, deviation_score)
+        # Determine if it's an anomaly (threshold can be adjusted); leaving the
+        # corridor around the route is a deviation regardless of the score
+        is_deviation = deviation_score > ROUTE_DEVIATION_THRESHOLD or corridor['outside_corridor']
+        confidence = 1.0 if corridor['outside_corridor'] else min(1.0, deviation_score)
         
         return {
             "anomaly": bool(is_deviation),
@@ -163,45 +748,238 @@ class AnomalyDetectionEngine:
             "confidence": float(confidence),
             "centroid_deviation": float(centroid_deviation),
             "length_deviation": float(length_deviation),
+            "route_distance_m": float(route_distances[-1]),
+            "max_route_distance_m": float(route_distances.max()),
+            "outside_corridor": corridor['outside_corridor'],
+            "consecutive_outside": corridor['consecutive_outside'],
             "timestamp": datetime.now().isoformat(),
             "type": "route_deviation"
         }
     
-    def train_models(self, training_data):
+    def detect_all(self, location_data, planned_itinerary=None, itinerary_id=None,
+                   threshold_minutes=30, tourist_id=None):
+        """
+        Run all three detectors on one window in a single pass: the window is
+        parsed and sorted once and one feature matrix is shared by all of them,
+        then their results are combined into a risk score
+        :param location_data: List of recent location points, or LocationColumns
+        :param planned_itinerary: Planned location points; route deviation is
+                                  skipped when neither it nor itinerary_id is given
+        :param itinerary_id: Optional id the compiled route is cached under
+        :param threshold_minutes: Threshold for inactivity in minutes
+        :param tourist_id: Optional tourist id; the streaming state is updated
+                           once for all three detectors
+        :return: Result of every detector plus the combined risk
+        """
+        if tourist_id is None and self.result_cache.enabled:
+            return self._cached('all', (location_data, planned_itinerary, itinerary_id, threshold_minutes),
+                                lambda: self._detect_all(location_data, planned_itinerary, itinerary_id,
+                                                         threshold_minutes))
+        return self._detect_all(location_data, planned_itinerary, itinerary_id, threshold_minutes, tourist_id)
+    
+    def _window_features(self, window):
+        """
+        Feature matrix of a time-sorted LocationColumns window, with the same
+        rows as preprocess_location_data
+        """
+        if len(window) < 2:
+            return None
+        seconds = (window.timestamp_ms - window.timestamp_ms[0]) / 1000.0
+        movement = trajectory_features(window.latitude, window.longitude, seconds)
+        return np.column_stack((
+            window.latitude, window.longitude, movement['time_diff'], movement['distance'], movement['speed']
+        ))[1:]
+    
+    def _detect_all(self, location_data, planned_itinerary=None, itinerary_id=None,
+                    threshold_minutes=30, tourist_id=None):
+        models = self.models
+        window, latest, features, max_gap = self._all_inputs(models, location_data, tourist_id)
+        if self._frozen_scoring(models):
+            dropoff = self._score_latest(models, latest)
+        else:
+            dropoff = self._score_window(models, features)
+        return self._all_results(window, dropoff, max_gap, planned_itinerary, itinerary_id,
+                                 threshold_minutes, tourist_id)
+    
+    def detect_all_many(self, requests):
+        """
+        Run many independent detect_all requests; with frozen scoring the
+        drop-off rows of the whole batch are scored with a single model call
+        :param requests: List of {"location_data": [...], "planned_itinerary": [...], "itinerary_id": ...,
+                         "threshold_minutes": ..., "tourist_id": ...} entries
+        :return: List of results, or of the exception raised for that request
+        """
+        models = self.models
+        if not self._frozen_scoring(models):
+            results = []
+            for entry in requests:
+                try:
+                    results.append(self.detect_all(entry['location_data'], entry.get('planned_itinerary'),
+                                                   entry.get('itinerary_id'), entry.get('threshold_minutes', 30),
+                                                   entry.get('tourist_id')))
+                except Exception as e:
+                    results.append(e)
+            return results
+        
+        results = [None] * len(requests)
+        prepared = {}
+        rows = []
+        scored = []
+        cache_keys = {}
+        for index, entry in enumerate(requests):
+            try:
+                if entry.get('tourist_id') is None:
+                    key, cached = self._cache_lookup('all', (entry['location_data'], entry.get('planned_itinerary'),
+                                                             entry.get('itinerary_id'),
+                                                             entry.get('threshold_minutes', 30)))
+                    if cached is not None:
+                        results[index] = cached
+                        continue
+                    if key is not None:
+                        cache_keys[index] = key
+                prepared[index] = self._all_inputs(models, entry['location_data'], entry.get('tourist_id'))
+            except Exception as e:
+                results[index] = e
+                continue
+            if prepared[index][1] is not None:
+                rows.append(prepared[index][1])
+                scored.append(index)
+        
+        dropoffs = dict(zip(scored, self._score_latest_many(models, rows))) if rows else {}
+        routes = {}
+        for index, (window, _, _, max_gap) in prepared.items():
+            entry = requests[index]
+            try:
+                results[index] = self._all_results(
+                    window, dropoffs.get(index, {"anomaly": False, "score": 0, "confidence": 0}), max_gap,
+                    entry.get('planned_itinerary'), entry.get('itinerary_id'), entry.get('threshold_minutes', 30),
+                    entry.get('tourist_id'), routes)
+            except Exception as e:
+                results[index] = e
+                continue
+            if index in cache_keys:
+                self.result_cache.put(cache_keys[index], results[index])
+        return results
+    
+    def _all_inputs(self, models, location_data, tourist_id=None):
+        """
+        Parse a window once and extract what all three detectors need
+        :return: (time-sorted LocationColumns, newest drop-off feature row,
+                 drop-off feature rows, longest gap in seconds); the row or the
+                 rows may be None when the scoring mode does not need them
+        """
+        # Parse once into time-sorted columns
+        started = time.perf_counter()
+        window = self._time_sorted(self._columns(location_data))
+        started = metrics.lap(metrics.PARSE, started)
+        
+        if tourist_id is not None:
+            # One streaming update feeds drop-off and inactivity
+            track = self._update_track(tourist_id, window)
+            if self._frozen_scoring(models):
+                latest, features = track.latest_features(), None
+            else:
+                latest, features = None, track.features()
+            max_gap = track.max_time_gap() if len(track) >= 2 else None
+        else:
+            # One feature matrix of the raw window; drop-off only needs its own
+            # when the window is simplified first
+            features = self._window_features(window)
+            max_gap = features[:, 2].max() if features is not None else None
+            dropoff_window = self._simplify(window)
+            if dropoff_window is not window:
+                features = self._window_features(dropoff_window)
+            latest = features[-1] if features is not None else None
+        metrics.lap(metrics.FEATURE_EXTRACTION, started)
+        return window, latest, features, max_gap
+    
+    def _all_results(self, window, dropoff, max_gap, planned_itinerary, itinerary_id, threshold_minutes,
+                     tourist_id=None, routes=None):
+        """Add the inactivity and route results to a drop-off result and combine them"""
+        results = {"location_dropoff": dropoff}
+        if max_gap is None:
+            results["prolonged_inactivity"] = {"anomaly": False, "score": 0, "confidence": 0}
+        else:
+            results["prolonged_inactivity"] = self._inactivity_result(max_gap / 60, threshold_minutes)
+        
+        results["route_deviation"] = None
+        if planned_itinerary or itinerary_id is not None:
+            started = time.perf_counter()
+            route = self._route(planned_itinerary, itinerary_id, routes)
+            min_points = 1 if tourist_id is not None else 2
+            if route is None or len(window) < min_points:
+                results["route_deviation"] = {"anomaly": False, "score": 0, "confidence": 0}
+            else:
+                epochs = window.seconds.tolist() if tourist_id is not None else None
+                results["route_deviation"] = self._route_result(route, window.latitude, window.longitude,
+                                                                started, epochs, itinerary_id, tourist_id)
+        
+        return dict(results, **combined_risk(results), timestamp=datetime.now().isoformat(), type="combined")
+    
+    def detect_crowd_hotspots(self, min_size=None):
+        """
+        Cluster the latest positions of all tracked tourists, site by site, to find crowds
+        :param min_size: Smallest cluster reported
+        :return: Cluster centroids and sizes, largest first
+        """
+        return self.crowd_monitor.hotspots(min_size)
+    
+    def train_models(self, training_data, workers=1):
         """
         Train the anomaly detection models with historical data
         :param training_data: Dictionary with training data for each model
+        :param workers: Feature extraction processes (1 extracts in-process)
         """
-        # Train location dropoff model
-        if 'location_data' in training_data:
-            all_features = []
-            for location_sequence in training_data['location_data']:
-                features = self.preprocess_location_data(location_sequence)
-                if features is not None:
-                    all_features.append(features)
-            
-            if all_features:
-                combined_features = np.vstack(all_features)
-                scaled_features = self.scaler.fit_transform(combined_features)
-                self.location_dropoff_model.fit(scaled_features)
+        if 'location_data' not in training_data:
+            self.swap_models(self.models.replace(is_trained=True))
+            return {"status": "success", "message": "Models trained successfully"}
         
-        # For other models, we would similarly train with appropriate data
-        # This is a simplified implementation
+        from training_pipeline import TrainingPipeline, WindowSource
         
-        self.is_trained = True
-        return {"status": "success", "message": "Models trained successfully"}
+        pipeline = TrainingPipeline(workers, simplify_tolerance_m=self.simplify_tolerance_m,
+                                    simplify_max_gap_seconds=self.simplify_max_gap_seconds)
+        result = self.train_from_source(WindowSource(training_data['location_data']), pipeline)
+        if result['status'] == 'success':
+            result['message'] = "Models trained successfully"
+        return result
+    
+    def train_from_source(self, source, pipeline=None):
+        """
+        Train all three models from a chunked trajectory source and swap them in
+        :param source: WindowSource, CsvSource or DeviceDataSource
+        :param pipeline: TrainingPipeline with the worker and sampling settings
+        :return: Status with the pipeline's per-stage timing report
+        """
+        from training_pipeline import TrainingPipeline
+        
+        models, report = (pipeline or TrainingPipeline()).run(source)
+        if models['scaler'] is None:
+            return {"status": "error", "message": "No usable trajectories in training data", "report": report}
+        
+        # Fitted into fresh objects, so live scoring never sees a partial fit
+        self.swap_models(self.models.replace(
+            location_dropoff_model=models['location_dropoff'],
+            inactivity_model=models['inactivity'],
+            route_deviation_model=models['route_deviation'],
+            scaler=models['scaler'],
+            is_trained=True
+        ))
+        return {"status": "success", "message": "Models trained from source", "report": report}
     
     def save_models(self, filepath):
         """
         Save trained models to disk
         :param filepath: Path to save models
         """
+        import joblib
+        
+        models = self.models
         model_data = {
-            'location_dropoff_model': self.location_dropoff_model,
-            'inactivity_model': self.inactivity_model,
-            'route_deviation_model': self.route_deviation_model,
-            'scaler': self.scaler,
-            'is_trained': self.is_trained
+            'location_dropoff_model': models.location_dropoff_model,
+            'inactivity_model': models.inactivity_model,
+            'route_deviation_model': models.route_deviation_model,
+            'scaler': models.scaler,
+            'is_trained': models.is_trained
         }
         
         joblib.dump(model_data, filepath)
@@ -212,16 +990,108 @@ class AnomalyDetectionEngine:
         Load trained models from disk
         :param filepath: Path to load models from
         """
+        import joblib
+        
         try:
             model_data = joblib.load(filepath)
-            self.location_dropoff_model = model_data['location_dropoff_model']
-            self.inactivity_model = model_data['inactivity_model']
-            self.route_deviation_model = model_data['route_deviation_model']
-            self.scaler = model_data['scaler']
-            self.is_trained = model_data['is_trained']
+            self.swap_models(ModelBundle(
+                model_data['location_dropoff_model'],
+                model_data['inactivity_model'],
+                model_data['route_deviation_model'],
+                model_data['scaler'],
+                is_trained=model_data['is_trained']
+            ))
             return {"status": "success", "message": "Models loaded successfully"}
         except Exception as e:
             return {"status": "error", "message": f"Failed to load models: {str(e)}"}
+    
+    def publish_models(self, metadata=None):
+        """
+        Publish the live models as a new version in the model registry
+        :param metadata: Optional extra metadata stored with the version
+        """
+        try:
+            version = self.registry.publish(self.models, metadata)
+            return {"status": "success", "version": version, "message": f"Models published as {version}"}
+        except Exception as e:
+            return {"status": "error", "message": f"Failed to publish models: {str(e)}"}
+    
+    def activate_models(self, version=None):
+        """
+        Load a registry version (latest by default) memory-mapped and swap it in
+        :param version: Registry version name
+        """
+        with self.reload_lock:
+            return self._activate(version)
+    
+    def activate_models_async(self, version=None):
+        """
+        Activate a registry version in a background thread; scoring continues on
+        the current models until the new ones are fully loaded
+        """
+        if not self.reload_lock.acquire(blocking=False):
+            return {"status": "error", "message": "A model reload is already in progress"}
+        
+        def reload():
+            try:
+                self._activate(version)
+            finally:
+                self.reload_lock.release()
+        
+        self.reload_status = {"state": "loading", "version": version, "error": None}
+        Thread(target=reload, daemon=True).start()
+        return {"status": "loading", "version": version, "message": "Model reload started"}
+    
+    def warm_up(self, timer, version=None):
+        """
+        Preload a registry version (the latest by default) before taking traffic.
+        The NumPy scoring components are loaded first, which is all frozen
+        scoring needs, so the service is marked ready before the sklearn models
+        and pandas are loaded
+        :param timer: StartupTimer recording the stages and readiness
+        """
+        with self.reload_lock:
+            try:
+                with timer.stage('registry_lookup'):
+                    version = version or self.registry.latest_version()
+                
+                if version is not None and self.scoring_mode == 'frozen':
+                    with timer.stage('load_scoring_models'):
+                        bundle = self.registry.load(version, components=ModelBundle.SCORING_COMPONENTS)
+                    if bundle.compiled_dropoff_model is not None:
+                        self.swap_models(bundle)
+                        with timer.stage('first_score'):
+                            self._detect_location_dropoff(WARM_UP_WINDOW)
+                        timer.mark_ready()
+                
+                if version is not None:
+                    with timer.stage('load_full_models'):
+                        result = self._activate(version)
+                    if result['status'] != 'success':
+                        raise RuntimeError(result['message'])
+                
+                if not timer.ready:
+                    timer.mark_ready()
+                
+                # Needed by the refit and training paths only
+                with timer.stage('deferred_imports'):
+                    import pandas
+                    import sklearn.ensemble
+            except Exception as e:
+                timer.mark_failed(e)
+                print(f"Warm-up failed: {e}")
+    
+    def _activate(self, version):
+        self.reload_status = {"state": "loading", "version": version, "error": None}
+        try:
+            bundle = self.registry.load(version)
+        except Exception as e:
+            self.reload_status = {"state": "failed", "version": version, "error": str(e)}
+            return {"status": "error", "message": f"Failed to activate models: {str(e)}"}
+        
+        self.swap_models(bundle)
+        self.reload_status = {"state": "idle", "version": bundle.version, "error": None}
+        return {"status": "success", "version": bundle.version, "message": f"Models {bundle.version} active"}
 
 # Example usage
 if __name__ == "__main__":
@@ -3,14 +3,77 @@ Flask API for the Anomaly Detection Engine
 This module exposes the AI/ML models as RESTful APIs
 """
 
-from flask import Flask, request, jsonify
-from anomaly_detection import AnomalyDetectionEngine
-import json
+from startup import StartupTimer
+import os
+
+# Started first so the breakdown covers the imports below
+startup = StartupTimer(float(os.environ.get('AI_STARTUP_BUDGET_SECONDS', 10)))
+
+with startup.stage('imports'):
+    from flask import Flask, request, jsonify, g
+    from anomaly_detection import AnomalyDetectionEngine
+    from feature_store import to_epoch_seconds
+    from inactivity_scanner import mqtt_publisher
+    import wire_format
+    import metrics
+    import time
+    from threading import Thread
+    import json
 
 app = Flask(__name__)
 
 # Initialize the anomaly detection engine
-engine = AnomalyDetectionEngine()
+with startup.stage('engine'):
+    engine = AnomalyDetectionEngine(
+        cache_size=int(os.environ.get('AI_RESULT_CACHE_SIZE', 10000)),
+        cache_ttl_seconds=float(os.environ.get('AI_RESULT_CACHE_TTL_SECONDS', 30)),
+        simplify_tolerance_m=float(os.environ['AI_SIMPLIFY_TOLERANCE_M'])
+        if os.environ.get('AI_SIMPLIFY_TOLERANCE_M') else None
+    )
+
+# Optionally scan all tracked tourists for inactivity and publish alerts over MQTT
+if os.environ.get('AI_INACTIVITY_SCAN_SECONDS'):
+    broker = os.environ.get('AI_ALERTS_MQTT_BROKER')
+    engine.enable_inactivity_scanner(
+        threshold_minutes=float(os.environ.get('AI_INACTIVITY_THRESHOLD_MINUTES', 30)),
+        tick_seconds=float(os.environ['AI_INACTIVITY_SCAN_SECONDS']),
+        publisher=mqtt_publisher(broker) if broker else None
+    )
+
+def warm_up():
+    """Preload the models, then start the optional services that need sklearn"""
+    if os.environ.get('AI_WARMUP', '1') != '0':
+        engine.warm_up(startup, os.environ.get('AI_MODEL_VERSION'))
+    else:
+        startup.mark_ready()
+    
+    # Optionally refit the dropoff model from recent traffic on a schedule
+    if os.environ.get('AI_ONLINE_REFRESH_SECONDS'):
+        engine.enable_online_refresh(interval_seconds=float(os.environ['AI_ONLINE_REFRESH_SECONDS']))
+
+Thread(target=warm_up, daemon=True).start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Latency and count of every request, labelled by route pattern"""
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - g.request_started)
+    metrics.REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    return response
+
+def detection_request():
+    """Body of a /detect request, as JSON or in the columnar wire format"""
+    started = time.perf_counter()
+    if request.mimetype == wire_format.CONTENT_TYPE:
+        data = wire_format.decode(request.get_data())
+    else:
+        data = request.get_json()
+    metrics.lap(metrics.PARSE, started)
+    return data
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -18,22 +81,43 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "Anomaly Detection Engine",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "ready": startup.ready
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({"status": "alive"})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: models are preloaded and the replica can take traffic"""
+    report = startup.report()
+    if startup.ready:
+        return jsonify({"status": "ready", "model_version": engine.model_version, "startup": report})
+    return jsonify({"status": "failed" if startup.error else "warming_up", "startup": report}), 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request latency, stage timings, throughput and queue depths for Prometheus"""
+    body, content_type = metrics.exposition()
+    return body, 200, {"Content-Type": content_type}
+
 @app.route('/detect/location-dropoff', methods=['POST'])
 def detect_location_dropoff():
     """Detect location dropoff anomalies"""
     try:
-        data = request.get_json()
+        data = detection_request()
         location_data = data.get('location_data', [])
+        tourist_id = data.get('tourist_id')
         
         if not location_data:
             return jsonify({
                 "error": "Missing location_data parameter"
             }), 400
         
-        result = engine.detect_location_dropoff(location_data)
+        result = engine.detect_location_dropoff(location_data, tourist_id)
         return jsonify(result)
     
     except Exception as e:
@@ -41,20 +125,44 @@ def detect_location_dropoff():
             "error": f"Failed to detect location dropoff: {str(e)}"
         }), 500
 
+@app.route('/detect/batch', methods=['POST'])
+def detect_batch():
+    """Detect location dropoff anomalies for many tourists in one request"""
+    try:
+        data = detection_request()
+        tourists = data.get('tourists', [])
+        
+        if not tourists:
+            return jsonify({
+                "error": "Missing tourists parameter"
+            }), 400
+        
+        results = engine.detect_batch(tourists)
+        return jsonify({
+            "results": results,
+            "count": len(results)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to detect batch anomalies: {str(e)}"
+        }), 500
+
 @app.route('/detect/inactivity', methods=['POST'])
 def detect_inactivity():
     """Detect prolonged inactivity anomalies"""
     try:
-        data = request.get_json()
+        data = detection_request()
         location_data = data.get('location_data', [])
         threshold_minutes = data.get('threshold_minutes', 30)
+        tourist_id = data.get('tourist_id')
         
         if not location_data:
             return jsonify({
                 "error": "Missing location_data parameter"
             }), 400
         
-        result = engine.detect_prolonged_inactivity(location_data, threshold_minutes)
+        result = engine.detect_prolonged_inactivity(location_data, threshold_minutes, tourist_id)
         return jsonify(result)
     
     except Exception as e:
@@ -66,16 +174,18 @@ def detect_inactivity():
 def detect_route_deviation():
     """Detect route deviation anomalies"""
     try:
-        data = request.get_json()
+        data = detection_request()
         current_path = data.get('current_path', [])
         planned_itinerary = data.get('planned_itinerary', [])
+        itinerary_id = data.get('itinerary_id')
+        tourist_id = data.get('tourist_id')
         
-        if not current_path or not planned_itinerary:
+        if not current_path or not (planned_itinerary or itinerary_id):
             return jsonify({
                 "error": "Missing current_path or planned_itinerary parameters"
             }), 400
         
-        result = engine.detect_route_deviation(current_path, planned_itinerary)
+        result = engine.detect_route_deviation(current_path, planned_itinerary, itinerary_id, tourist_id)
         return jsonify(result)
     
     except Exception as e:
@@ -83,6 +193,32 @@ def detect_route_deviation():
             "error": f"Failed to detect route deviation: {str(e)}"
         }), 500
 
+@app.route('/detect/all', methods=['POST'])
+def detect_all():
+    """Run all three detectors on one window and combine them into a risk score"""
+    try:
+        data = detection_request()
+        location_data = data.get('location_data', [])
+        
+        if not location_data:
+            return jsonify({
+                "error": "Missing location_data parameter"
+            }), 400
+        
+        result = engine.detect_all(
+            location_data,
+            planned_itinerary=data.get('planned_itinerary'),
+            itinerary_id=data.get('itinerary_id'),
+            threshold_minutes=data.get('threshold_minutes', 30),
+            tourist_id=data.get('tourist_id')
+        )
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to run detectors: {str(e)}"
+        }), 500
+
 @app.route('/train', methods=['POST'])
 def train_models():
     """Train the anomaly detection models"""
@@ -128,5 +264,169 @@ def load_models():
             "error": f"Failed to load models: {str(e)}"
         }), 500
 
+@app.route('/models', methods=['GET'])
+def list_models():
+    """List registry versions and the active model version"""
+    try:
+        return jsonify({
+            "active_version": engine.model_version,
+            "latest_version": engine.registry.latest_version(),
+            "versions": engine.registry.versions(),
+            "reload": engine.reload_status,
+            "online_refresh": engine.online_refresher.status if engine.online_refresher else None
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to list models: {str(e)}"
+        }), 500
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    """Hit-rate counters of the detection result cache"""
+    try:
+        return jsonify(engine.result_cache.stats())
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to get cache stats: {str(e)}"
+        }), 500
+
+@app.route('/models/publish', methods=['POST'])
+def publish_models():
+    """Publish the live models as a new registry version"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = engine.publish_models(data.get('metadata'))
+        return jsonify(result), 200 if result['status'] == 'success' else 500
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to publish models: {str(e)}"
+        }), 500
+
+@app.route('/models/activate', methods=['POST'])
+def activate_models():
+    """Swap in a registry version; loads in the background unless background is false"""
+    try:
+        data = request.get_json(silent=True) or {}
+        version = data.get('version')
+        
+        if data.get('background', True):
+            result = engine.activate_models_async(version)
+            return jsonify(result), 202 if result['status'] == 'loading' else 409
+        
+        result = engine.activate_models(version)
+        return jsonify(result), 200 if result['status'] == 'success' else 500
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to activate models: {str(e)}"
+        }), 500
+
+@app.route('/models/refresh', methods=['POST'])
+def refresh_models():
+    """Refit the dropoff model from recent traffic now"""
+    try:
+        if engine.online_refresher is None:
+            return jsonify({
+                "error": "Online refresh is not enabled"
+            }), 400
+        
+        result = engine.online_refresher.refresh_now()
+        return jsonify(result), 500 if result['status'] == 'error' else 200
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to refresh models: {str(e)}"
+        }), 500
+
+@app.route('/crowd/positions', methods=['POST'])
+def update_crowd_positions():
+    """Update the latest positions used for crowd detection without scoring"""
+    try:
+        data = request.get_json()
+        positions = data.get('positions', [])
+        for position in positions:
+            engine.crowd_monitor.update(position['tourist_id'], position['latitude'], position['longitude'])
+        
+        return jsonify({"status": "success", "count": len(positions)})
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to update crowd positions: {str(e)}"
+        }), 500
+
+@app.route('/crowd/hotspots', methods=['GET'])
+def crowd_hotspots():
+    """Crowd clusters over the latest positions of all tracked tourists"""
+    try:
+        min_size = request.args.get('min_size', type=int)
+        result = engine.detect_crowd_hotspots(min_size)
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to detect crowd hotspots: {str(e)}"
+        }), 500
+
+@app.route('/tourists/seen', methods=['POST'])
+def record_sightings():
+    """Record tourist sightings for the inactivity scanner without scoring"""
+    try:
+        if engine.inactivity_scanner is None:
+            return jsonify({
+                "error": "Inactivity scanner is not enabled"
+            }), 400
+        
+        data = request.get_json()
+        sightings = data.get('sightings', [])
+        for sighting in sightings:
+            engine.inactivity_scanner.touch(sighting['tourist_id'], to_epoch_seconds(sighting['timestamp']))
+        
+        return jsonify({"status": "success", "count": len(sightings)})
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to record sightings: {str(e)}"
+        }), 500
+
+@app.route('/tourists/<tourist_id>', methods=['DELETE'])
+def forget_tourist(tourist_id):
+    """Drop the streaming state of a tourist who checked out"""
+    try:
+        if not engine.forget_tourist(tourist_id):
+            return jsonify({
+                "error": f"Tourist {tourist_id} is not tracked"
+            }), 404
+        
+        return jsonify({"status": "success", "tourist_id": tourist_id})
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to forget tourist: {str(e)}"
+        }), 500
+
+@app.route('/alerts/inactivity', methods=['GET'])
+def inactivity_alerts():
+    """Tourists currently flagged as inactive and the most recent alerts"""
+    try:
+        if engine.inactivity_scanner is None:
+            return jsonify({
+                "error": "Inactivity scanner is not enabled"
+            }), 400
+        
+        scanner = engine.inactivity_scanner
+        return jsonify({
+            "inactive": scanner.inactive(),
+            "recent_alerts": scanner.recent_alerts(int(request.args.get('limit', 100))),
+            "scanner": scanner.status()
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to get inactivity alerts: {str(e)}"
+        }), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
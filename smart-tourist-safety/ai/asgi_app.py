@@ -0,0 +1,201 @@
+"""
+Micro-batching ASGI front end for the Anomaly Detection Engine
+This module serves the same API as app.py, but concurrent /detect/* requests
+are collected into micro-batches for a short window and each batch is scored
+with one engine call in a worker thread; every other route is passed to the
+Flask app unchanged
+
+Usage (needs uvicorn):
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import wire_format
+from app import app as flask_app, engine
+from micro_batcher import MicroBatcher
+
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('AI_BATCH_WORKERS', 1)))
+batch_options = {
+    "max_batch_size": int(os.environ.get('AI_BATCH_MAX_SIZE', 64)),
+    "max_wait_ms": float(os.environ.get('AI_BATCH_MAX_WAIT_MS', 2.0))
+}
+batchers = {
+    "dropoff": MicroBatcher(engine.detect_location_dropoff_many, executor, **batch_options),
+    "inactivity": MicroBatcher(engine.detect_prolonged_inactivity_many, executor, **batch_options),
+    "route": MicroBatcher(engine.detect_route_deviation_many, executor, **batch_options),
+    "all": MicroBatcher(engine.detect_all_many, executor, **batch_options)
+}
+for name, batcher in batchers.items():
+    metrics.track_queue(f"batch_{name}", lambda batcher=batcher: len(batcher.pending))
+
+
+async def detect_location_dropoff(data):
+    location_data = data.get('location_data', [])
+    if not location_data:
+        return 400, {"error": "Missing location_data parameter"}
+    try:
+        return 200, await batchers['dropoff'].submit(
+            {"location_data": location_data, "tourist_id": data.get('tourist_id')})
+    except Exception as e:
+        return 500, {"error": f"Failed to detect location dropoff: {str(e)}"}
+
+
+async def detect_inactivity(data):
+    location_data = data.get('location_data', [])
+    if not location_data:
+        return 400, {"error": "Missing location_data parameter"}
+    try:
+        return 200, await batchers['inactivity'].submit(
+            {"location_data": location_data, "threshold_minutes": data.get('threshold_minutes', 30),
+             "tourist_id": data.get('tourist_id')})
+    except Exception as e:
+        return 500, {"error": f"Failed to detect inactivity: {str(e)}"}
+
+
+async def detect_route_deviation(data):
+    current_path = data.get('current_path', [])
+    planned_itinerary = data.get('planned_itinerary', [])
+    itinerary_id = data.get('itinerary_id')
+    if not current_path or not (planned_itinerary or itinerary_id):
+        return 400, {"error": "Missing current_path or planned_itinerary parameters"}
+    try:
+        return 200, await batchers['route'].submit(
+            {"current_path": current_path, "planned_itinerary": planned_itinerary,
+             "itinerary_id": itinerary_id, "tourist_id": data.get('tourist_id')})
+    except Exception as e:
+        return 500, {"error": f"Failed to detect route deviation: {str(e)}"}
+
+
+async def detect_all(data):
+    location_data = data.get('location_data', [])
+    if not location_data:
+        return 400, {"error": "Missing location_data parameter"}
+    try:
+        return 200, await batchers['all'].submit(
+            {"location_data": location_data, "planned_itinerary": data.get('planned_itinerary'),
+             "itinerary_id": data.get('itinerary_id'), "threshold_minutes": data.get('threshold_minutes', 30),
+             "tourist_id": data.get('tourist_id')})
+    except Exception as e:
+        return 500, {"error": f"Failed to run detectors: {str(e)}"}
+
+
+BATCHED_ROUTES = {
+    "/detect/location-dropoff": detect_location_dropoff,
+    "/detect/inactivity": detect_inactivity,
+    "/detect/route-deviation": detect_route_deviation,
+    "/detect/all": detect_all
+}
+
+
+def call_wsgi(scope, body):
+    """Run one request through the Flask app (in a worker thread)"""
+    environ = {
+        "REQUEST_METHOD": scope['method'],
+        "SCRIPT_NAME": scope.get('root_path', ''),
+        "PATH_INFO": scope['path'],
+        "QUERY_STRING": scope.get('query_string', b'').decode('latin-1'),
+        "SERVER_NAME": (scope.get('server') or ('localhost', 0))[0],
+        "SERVER_PORT": str((scope.get('server') or ('localhost', 0))[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get('scheme', 'http'),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value.decode('latin-1')
+        elif name != 'CONTENT_LENGTH':
+            environ[f"HTTP_{name}"] = value.decode('latin-1')
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    chunks = flask_app(environ, start_response)
+    try:
+        content = b''.join(chunks)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return response['status'], response['headers'], content
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({"type": "lifespan.startup.complete"})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    body = await read_body(receive)
+    handler = BATCHED_ROUTES.get(scope['path']) if scope['method'] == 'POST' else None
+    if handler is not None:
+        content_type = dict(scope.get('headers', [])).get(b'content-type', b'')
+        parse_started = time.perf_counter()
+        try:
+            if content_type.split(b';')[0].strip() == wire_format.CONTENT_TYPE.encode():
+                data = wire_format.decode(body)
+            else:
+                data = json.loads(body or b'null')
+            if not isinstance(data, dict):
+                raise ValueError("Request body must be a JSON object")
+        except ValueError as e:
+            status, result = 400, {"error": f"Invalid request body: {str(e)}"}
+        else:
+            metrics.lap(metrics.PARSE, parse_started)
+            status, result = await handler(data)
+        headers = [(b'content-type', b'application/json')]
+        content = json.dumps(result).encode()
+        # The Flask app records every other route itself
+        metrics.REQUEST_SECONDS.labels(scope['path'], 'POST').observe(time.perf_counter() - started)
+        metrics.REQUESTS.labels(scope['path'], 'POST', status).inc()
+    elif scope['path'] == '/batching' and scope['method'] == 'GET':
+        status, headers = 200, [(b'content-type', b'application/json')]
+        content = json.dumps({name: dict(batcher.stats, **batch_options)
+                              for name, batcher in batchers.items()}).encode()
+    else:
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(
+            None, call_wsgi, scope, body)
+
+    if handler is not None or scope['path'] == '/batching':
+        headers.append((b'content-length', str(len(content)).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": content})
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, host='0.0.0.0', port=5001)
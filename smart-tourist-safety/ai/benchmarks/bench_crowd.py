@@ -0,0 +1,84 @@
+"""
+Latency benchmark for crowd hotspot detection
+Places many tourists around a site with a few dense gatherings, then times a
+full clustering pass of CrowdDensityMonitor against point-level DBSCAN
+
+Usage: python benchmarks/bench_crowd.py [--tourists 200000] [--exact]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crowd_density import CrowdDensityMonitor, METRES_PER_DEGREE
+
+CENTRE = (27.175015, 78.042155)  # Taj Mahal
+GATHERINGS = [(0.004, 0.006, 5000, 40), (-0.01, -0.012, 3000, 15), (0.02, -0.015, 800, 10), (-0.02, 0.02, 150, 8)]
+
+
+def synthetic_positions(rng, count, extent_deg):
+    """Uniform background plus gaussian gatherings of (size, spread in metres)"""
+    latitude = CENTRE[0] + rng.uniform(-extent_deg, extent_deg, count)
+    longitude = CENTRE[1] + rng.uniform(-extent_deg, extent_deg, count)
+    start = 0
+    for lat_offset, lon_offset, size, spread_m in GATHERINGS:
+        size = min(size, count - start)
+        latitude[start:start + size] = CENTRE[0] + lat_offset + rng.normal(0, spread_m / 111000, size)
+        longitude[start:start + size] = CENTRE[1] + lon_offset + rng.normal(
+            0, spread_m / 111000 / np.cos(np.radians(CENTRE[0])), size)
+        start += size
+    return latitude, longitude
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crowd hotspot detection benchmark")
+    parser.add_argument('--tourists', type=int, default=200000)
+    parser.add_argument('--extent-deg', type=float, default=0.05, help="half-width of the site")
+    parser.add_argument('--moves', type=int, default=2000, help="position updates between passes")
+    parser.add_argument('--passes', type=int, default=10)
+    parser.add_argument('--exact', action='store_true', help="also time DBSCAN over every tourist")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    latitude, longitude = synthetic_positions(rng, args.tourists, args.extent_deg)
+
+    monitor = CrowdDensityMonitor(origin=CENTRE)
+    started = time.perf_counter()
+    for tourist, (lat, lon) in enumerate(zip(latitude, longitude)):
+        monitor.update(tourist, lat, lon)
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(args.passes):
+        for tourist in rng.integers(0, args.tourists, args.moves):
+            latitude[tourist] += rng.normal(0, 1e-5)
+            longitude[tourist] += rng.normal(0, 1e-5)
+            monitor.update(int(tourist), latitude[tourist], longitude[tourist])
+        started = time.perf_counter()
+        result = monitor.hotspots()
+        latencies.append(time.perf_counter() - started)
+
+    latencies = np.array(latencies) * 1000
+    print(f"tourists={args.tourists} updates/s={args.tourists / load_seconds:,.0f}")
+    print(f"grid pass p50={np.percentile(latencies, 50):.1f}ms max={latencies.max():.1f}ms "
+          f"cells_clustered={result['cells_clustered']} resolution={result['resolution_m']}m")
+    print("clusters:", [cluster['size'] for cluster in result['clusters']])
+
+    if args.exact:
+        x = (longitude - CENTRE[1]) * monitor.x_scale
+        y = (latitude - CENTRE[0]) * METRES_PER_DEGREE
+        started = time.perf_counter()
+        labels = DBSCAN(eps=monitor.eps_m, min_samples=monitor.min_samples).fit(np.column_stack((x, y))).labels_
+        print(f"exact DBSCAN {(time.perf_counter() - started) * 1000:.1f}ms clusters:",
+              sorted(np.bincount(labels[labels >= 0]).tolist(), reverse=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Latency benchmark for detect_location_dropoff
+Compares the original per-request scaler refit path with the frozen scoring path
+
+Usage: python benchmarks/bench_dropoff.py [--window 50] [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection import AnomalyDetectionEngine
+
+
+def synthetic_window(rng, length, start=datetime(2025, 9, 8, 10, 0, 0)):
+    """Random walk of location points around the Taj Mahal"""
+    latitude = 27.175015 + np.cumsum(rng.normal(0, 1e-4, length))
+    longitude = 78.042155 + np.cumsum(rng.normal(0, 1e-4, length))
+    seconds = np.cumsum(rng.integers(10, 600, length))
+    return [
+        {"latitude": float(lat), "longitude": float(lon),
+         "timestamp": (start + timedelta(seconds=int(offset))).isoformat() + "Z"}
+        for lat, lon, offset in zip(latitude, longitude, seconds)
+    ]
+
+
+def measure(function, windows):
+    latencies = []
+    for window in windows:
+        started = time.perf_counter()
+        function(window)
+        latencies.append(time.perf_counter() - started)
+    return np.array(latencies) * 1e6  # Microseconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--window', type=int, default=50, help="points per request")
+    parser.add_argument('--repeat', type=int, default=200, help="requests per path")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    training = {"location_data": [synthetic_window(rng, args.window) for _ in range(100)]}
+    windows = [synthetic_window(rng, args.window) for _ in range(args.repeat)]
+
+    refit_engine = AnomalyDetectionEngine(scoring_mode='refit')
+    frozen_engine = AnomalyDetectionEngine(scoring_mode='frozen')
+    refit_engine.train_models(training)
+    frozen_engine.train_models(training)
+
+    # The streaming path receives one new point per request, as a live client would
+    stream = synthetic_window(rng, args.repeat + 1)
+    frozen_engine.detect_location_dropoff(stream[:1], tourist_id="bench")
+
+    paths = [
+        ("refit (pandas + fit_transform + sklearn)",
+         refit_engine.detect_location_dropoff, windows),
+        ("frozen (NumPy affine + compiled forest)",
+         frozen_engine.detect_location_dropoff, windows),
+        ("frozen, streaming feature store",
+         lambda w: frozen_engine.detect_location_dropoff(w, tourist_id="bench"),
+         [[point] for point in stream[1:]]),
+    ]
+
+    print(f"window={args.window} points, {args.repeat} requests per path")
+    print(f"{'path':<44}{'p50 us':>12}{'p99 us':>12}{'mean us':>12}")
+    for name, function, requests in paths:
+        latencies = measure(function, requests)
+        print(f"{name:<44}{np.percentile(latencies, 50):>12.1f}"
+              f"{np.percentile(latencies, 99):>12.1f}{latencies.mean():>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
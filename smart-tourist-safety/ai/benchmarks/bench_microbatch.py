@@ -0,0 +1,84 @@
+"""
+Throughput benchmark for the micro-batching ASGI front end
+Fires bursts of concurrent /detect/location-dropoff requests straight at the
+ASGI application (no network) with batching disabled and enabled
+
+Usage: python benchmarks/bench_microbatch.py [--requests 5000] [--concurrency 256]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asgi_app
+from synthetic import dataset
+
+
+async def post(path, body):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": [(b'content-type', b'application/json')]}
+    await asgi_app.application(scope, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+async def burst(bodies, concurrency):
+    """Closed loop: each client sends its next request when the last one returns"""
+    latencies = []
+    queue = list(reversed(bodies))
+
+    async def client():
+        while queue:
+            body = queue.pop()
+            started = time.perf_counter()
+            status, _ = await post('/detect/location-dropoff', body)
+            latencies.append(time.perf_counter() - started)
+            assert status == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching front end benchmark")
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--window', type=int, default=20, help="points per request")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    data = dataset(args.seed, tourists=max(200, args.requests // 10), length=args.window)
+    asgi_app.engine.train_models({"location_data": data['training']})
+    windows = data['trajectories']
+    # Encoded up front so only the server side is measured
+    bodies = [json.dumps({"location_data": windows[index % len(windows)]}).encode()
+              for index in range(args.requests)]
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients, {args.window} points each")
+    print(f"{'max batch':<12}{'throughput/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'mean batch':>12}")
+    for max_batch_size in (1, 8, 32, 64, 128):
+        for batcher in asgi_app.batchers.values():
+            batcher.max_batch_size = max_batch_size
+            batcher.stats = {"requests": 0, "batches": 0, "largest_batch": 0}
+        elapsed, latencies = asyncio.run(burst(bodies, args.concurrency))
+        stats = asgi_app.batchers['dropoff'].stats
+        print(f"{max_batch_size:<12}{args.requests / elapsed:>14,.0f}{np.percentile(latencies, 50):>10.2f}"
+              f"{np.percentile(latencies, 99):>10.2f}{stats['requests'] / stats['batches']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Trajectory simplification benchmark
+Simplifies dense wearable tracks (a point every few seconds) at several error
+bounds and reports how many points are kept, the largest error and gap, the
+history a streaming buffer holds and the cost of refit-mode drop-off scoring
+
+Usage: python benchmarks/bench_simplify.py [--tourists 50] [--minutes 60] [--interval 2]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection import AnomalyDetectionEngine
+from feature_store import TouristTrack, to_epoch_seconds
+from geo_kernels import haversine
+from synthetic import dense_trajectory
+from trajectory_simplifier import StreamingSimplifier, simplify_mask
+
+
+def columns(window):
+    return (np.array([p['latitude'] for p in window]), np.array([p['longitude'] for p in window]),
+            np.array([to_epoch_seconds(p['timestamp']) for p in window]))
+
+
+def max_error(latitude, longitude, seconds, kept):
+    """Largest distance of a dropped point from the time-interpolated simplified track"""
+    kept_lat = np.interp(seconds, seconds[kept], latitude[kept])
+    kept_lon = np.interp(seconds, seconds[kept], longitude[kept])
+    return float(haversine(kept_lat, kept_lon, latitude, longitude).max())
+
+
+def history_minutes(window, tolerance_m, capacity=50):
+    """Minutes of track a streaming feature buffer of capacity points covers"""
+    simplifier = StreamingSimplifier(tolerance_m) if tolerance_m else None
+    track = TouristTrack(capacity, simplifier)
+    for latitude, longitude, epoch in zip(*columns(window)):
+        track.push(latitude, longitude, epoch)
+    oldest = track.epoch[(track.head - track.count) % capacity]
+    return (track.last_epoch - oldest) / 60
+
+
+def scoring_ms(engine, windows):
+    started = time.perf_counter()
+    for window in windows:
+        engine.detect_location_dropoff(window)
+    return (time.perf_counter() - started) * 1000 / len(windows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trajectory simplification benchmark")
+    parser.add_argument('--tourists', type=int, default=50)
+    parser.add_argument('--minutes', type=int, default=60)
+    parser.add_argument('--interval', type=float, default=2, help="seconds between reported points")
+    parser.add_argument('--tolerances', type=float, nargs='+', default=[5, 10, 20])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    training = [dense_trajectory(rng, args.minutes, args.interval) for _ in range(args.tourists)]
+    windows = [dense_trajectory(rng, args.minutes, args.interval) for _ in range(args.tourists)]
+    points = sum(len(window) for window in windows)
+    print(f"{args.tourists} tracks of {args.minutes} min at {args.interval}s, {points:,} points")
+
+    raw_engine = AnomalyDetectionEngine(scoring_mode='refit', cache_size=0)
+    raw_engine.train_models({"location_data": training})
+    raw_ms = scoring_ms(raw_engine, windows)
+    raw_history = np.mean([history_minutes(window, None) for window in windows])
+
+    print(f"{'tolerance m':<13}{'kept':>8}{'max error m':>13}{'max gap s':>11}"
+          f"{'stream batch':>14}{'50-pt history':>15}{'refit ms':>10}")
+    print(f"{'raw':<13}{'100.0%':>8}{0:>13.2f}{'':>11}{'':>14}{raw_history:>13.1f}m{raw_ms:>10.2f}")
+    for tolerance in args.tolerances:
+        kept = errors = 0
+        gaps = []
+        streamed = 0
+        for window in windows:
+            latitude, longitude, seconds = columns(window)
+            mask = simplify_mask(latitude, longitude, seconds, tolerance_m=tolerance)
+            kept += mask.sum()
+            errors = max(errors, max_error(latitude, longitude, seconds, np.flatnonzero(mask)))
+            gaps.append(np.diff(seconds[mask]).max())
+            simplifier = StreamingSimplifier(tolerance)
+            streamed += sum(len(simplifier.push(*point)) for point in zip(latitude, longitude, seconds))
+            streamed += len(simplifier.flush())
+
+        engine = AnomalyDetectionEngine(scoring_mode='refit', cache_size=0, simplify_tolerance_m=tolerance)
+        engine.train_models({"location_data": training})
+        history = np.mean([history_minutes(window, tolerance) for window in windows])
+        print(f"{tolerance:<13g}{kept / points:>8.1%}{errors:>13.2f}{max(gaps):>11.0f}"
+              f"{streamed / points:>14.1%}{history:>13.1f}m{scoring_ms(engine, windows):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Request decoding benchmark: JSON point lists against the columnar wire format
+Times what the service does per request, decoding the body and running the
+detector, for growing window lengths
+
+Usage: python benchmarks/bench_wire_format.py [--lengths 50 500 5000] [--repeat 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format
+from anomaly_detection import AnomalyDetectionEngine
+from synthetic import dataset
+
+
+def timed(function, body, repeat):
+    function(body)
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(body)
+        latencies.append(time.perf_counter() - started)
+    return np.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON against columnar request decoding")
+    parser.add_argument('--lengths', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    data = dataset(args.seed, tourists=200, length=50)
+    engines = {mode: AnomalyDetectionEngine(scoring_mode=mode, cache_size=0) for mode in ('frozen', 'refit')}
+    for engine in engines.values():
+        engine.train_models({"location_data": data['training']})
+
+    detectors = {
+        "dropoff (frozen)": lambda request: engines['frozen'].detect_location_dropoff(request['location_data']),
+        "dropoff (refit)": lambda request: engines['refit'].detect_location_dropoff(request['location_data']),
+        "inactivity": lambda request: engines['frozen'].detect_prolonged_inactivity(request['location_data'])
+    }
+    print(f"{'detector':<20}{'points':>8}{'json bytes':>12}{'columns bytes':>15}"
+          f"{'json ms':>10}{'columns ms':>12}{'speedup':>9}")
+    for length in args.lengths:
+        window = dataset(args.seed, tourists=1, length=length)['trajectories'][0]
+        json_body = json.dumps({"location_data": window}).encode()
+        columns_body = wire_format.encode({"location_data": wire_format.LocationColumns.from_points(window)})
+        for name, detect in detectors.items():
+            json_ms = timed(lambda body: detect(json.loads(body)), json_body, args.repeat)
+            columns_ms = timed(lambda body: detect(wire_format.decode(body)), columns_body, args.repeat)
+            print(f"{name:<20}{length:>8}{len(json_body):>12,}{len(columns_body):>15,}"
+                  f"{json_ms:>10.3f}{columns_ms:>12.3f}{json_ms / columns_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
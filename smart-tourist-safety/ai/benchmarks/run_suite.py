@@ -0,0 +1,195 @@
+"""
+Benchmark suite for the anomaly detectors
+Times detect_location_dropoff, detect_prolonged_inactivity,
+detect_route_deviation, the combined detect_all (per window and streaming per
+point) and train_models
+on seeded synthetic trajectories, writes the results as JSON and exits with
+status 1 when a threshold or the allowed regression against a baseline run
+is exceeded
+
+Usage:
+    python benchmarks/run_suite.py [--tourists 200] [--length 50] [--output results.json]
+    python benchmarks/run_suite.py --baseline results.json --max-regression 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import sklearn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection import AnomalyDetectionEngine
+from synthetic import dataset
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+COMPARED_METRICS = ('p50_ms', 'p99_ms')
+
+
+def summarize(latencies, units=1):
+    """
+    Latency percentiles (milliseconds) and throughput of one benchmark
+    :param units: Items processed per call, for the throughput figure
+    """
+    latencies = np.asarray(latencies) * 1000
+    total_seconds = latencies.sum() / 1000
+    return {
+        "calls": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p90_ms": round(float(np.percentile(latencies, 90)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "max_ms": round(float(latencies.max()), 4),
+        "mean_ms": round(float(latencies.mean()), 4),
+        "throughput_per_s": round(len(latencies) * units / total_seconds, 2) if total_seconds else None
+    }
+
+
+def measure(function, calls, warmup=5):
+    for arguments in calls[:warmup]:
+        function(*arguments)
+    latencies = []
+    for arguments in calls:
+        started = time.perf_counter()
+        function(*arguments)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run(args):
+    data = dataset(args.seed, args.tourists, args.length, args.itineraries)
+    engine = AnomalyDetectionEngine()
+    results = {}
+
+    # Training first, since every detector below needs trained models
+    points = sum(len(window) for window in data['training'])
+    latencies = []
+    for _ in range(args.train_repeat):
+        started = time.perf_counter()
+        engine.train_models({"location_data": data['training']})
+        latencies.append(time.perf_counter() - started)
+    results['train_models'] = summarize(latencies, units=points)
+    results['train_models']['throughput_unit'] = "points"
+
+    windows = [(window,) for window in data['trajectories']]
+    results['detect_location_dropoff'] = summarize(measure(engine.detect_location_dropoff, windows))
+    results['detect_prolonged_inactivity'] = summarize(measure(engine.detect_prolonged_inactivity, windows))
+    route_calls = [(path, data['itineraries'][route]) for route, path in data['paths']]
+    results['detect_route_deviation'] = summarize(measure(engine.detect_route_deviation, route_calls))
+    results['detect_all'] = summarize(measure(engine.detect_all, route_calls))
+
+    # Streaming: every call carries one new point of a known tourist, as a live
+    # client sends them; tourists are interleaved like concurrent traffic
+    stream = [(f"tourist_{index}", index, point) for position in range(args.length)
+              for index, window in enumerate(data['trajectories']) for point in window[position:position + 1]]
+    results['detect_location_dropoff.stream'] = summarize(measure(
+        lambda tourist, _, point: engine.detect_location_dropoff([point], tourist_id=tourist),
+        stream, warmup=0))
+    results['detect_prolonged_inactivity.stream'] = summarize(measure(
+        lambda tourist, _, point: engine.detect_prolonged_inactivity([point], tourist_id=f"{tourist}.idle"),
+        stream, warmup=0))
+    route_stream = [(f"tourist_{index}", route, point) for position in range(args.length)
+                    for index, (route, path) in enumerate(data['paths']) for point in path[position:position + 1]]
+    results['detect_route_deviation.stream'] = summarize(measure(
+        lambda tourist, route, point: engine.detect_route_deviation(
+            [point], data['itineraries'][route], itinerary_id=f"route_{route}", tourist_id=tourist),
+        route_stream, warmup=0))
+    results['detect_all.stream'] = summarize(measure(
+        lambda tourist, route, point: engine.detect_all(
+            [point], data['itineraries'][route], itinerary_id=f"route_{route}", tourist_id=f"{tourist}.all"),
+        route_stream, warmup=0))
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "parameters": vars(args)
+        },
+        "results": results
+    }
+
+
+def check(report, thresholds, baseline, max_regression, noise_floor_ms):
+    """
+    :return: List of human-readable failures (empty when everything passed)
+    """
+    failures = []
+    for name, limits in thresholds.items():
+        result = report['results'].get(name)
+        if result is None:
+            continue
+        for metric, limit in limits.items():
+            if metric.startswith('min_'):
+                if result[metric[4:]] < limit:
+                    failures.append(f"{name} {metric[4:]}={result[metric[4:]]} below the minimum {limit}")
+            elif result[metric] > limit:
+                failures.append(f"{name} {metric}={result[metric]} above the limit {limit}")
+
+    if baseline is not None:
+        for name, result in report['results'].items():
+            previous = baseline['results'].get(name)
+            if previous is None:
+                continue
+            for metric in COMPARED_METRICS:
+                allowed = previous[metric] * (1 + max_regression)
+                if result[metric] > allowed and result[metric] - previous[metric] > noise_floor_ms:
+                    failures.append(f"{name} {metric}={result[metric]} regressed from {previous[metric]} "
+                                    f"(allowed {allowed:.4f})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anomaly detector benchmark suite")
+    parser.add_argument('--tourists', type=int, default=200, help="trajectories per benchmark")
+    parser.add_argument('--length', type=int, default=50, help="points per trajectory")
+    parser.add_argument('--itineraries', type=int, default=20)
+    parser.add_argument('--train-repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the JSON results")
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS,
+                        help="JSON file of absolute limits per benchmark, e.g. {\"train_models\": {\"p50_ms\": 5000}}")
+    parser.add_argument('--baseline', help="results of an earlier run to compare against")
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help="allowed relative slowdown of p50/p99 against the baseline")
+    parser.add_argument('--noise-floor-ms', type=float, default=0.1,
+                        help="slowdowns smaller than this are never reported")
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print(f"{'benchmark':<38}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'throughput/s':>16}")
+    for name, result in report['results'].items():
+        print(f"{name:<38}{result['p50_ms']:>10.3f}{result['p90_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+              f"{result['throughput_per_s']:>16,.1f}")
+    print(f"Results written to {args.output}")
+
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as thresholds_file:
+            thresholds = json.load(thresholds_file)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        for name in ('tourists', 'length', 'itineraries', 'seed'):
+            if baseline['meta']['parameters'].get(name) != getattr(args, name):
+                print(f"Warning: baseline was run with {name}={baseline['meta']['parameters'].get(name)}")
+
+    failures = check(report, thresholds, baseline, args.max_regression, args.noise_floor_ms)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Seeded synthetic trajectories for the benchmarks
+Random walks of tourists around a site with occasional stops and reporting
+gaps, plus planned itineraries that some walks leave
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+CENTRE = (27.175015, 78.042155)  # Taj Mahal
+START = datetime(2025, 9, 8, 10, 0, 0)
+
+
+def trajectory(rng, length, gap_probability=0.02, stop_probability=0.05):
+    """
+    One tourist's location points, oldest first
+    :param gap_probability: Chance that a point follows a 30-90 minute silence
+    :param stop_probability: Chance that a point repeats the previous position
+    """
+    steps = rng.normal(0, 1e-4, (length, 2))
+    steps[rng.random(length) < stop_probability] = 0
+    position = np.array(CENTRE) + rng.normal(0, 0.01, 2) + np.cumsum(steps, axis=0)
+
+    intervals = rng.integers(10, 120, length)
+    gaps = rng.random(length) < gap_probability
+    intervals[gaps] = rng.integers(1800, 5400, gaps.sum())
+    seconds = np.cumsum(intervals)
+    return [
+        {"latitude": float(lat), "longitude": float(lon),
+         "timestamp": (START + timedelta(seconds=int(offset))).isoformat() + "Z"}
+        for (lat, lon), offset in zip(position, seconds)
+    ]
+
+
+def itinerary(rng, stops=12):
+    """Planned route of a few hundred metres between stops"""
+    position = np.array(CENTRE) + rng.normal(0, 0.01, 2) + np.cumsum(rng.normal(0, 1e-3, (stops, 2)), axis=0)
+    return [{"latitude": float(lat), "longitude": float(lon)} for lat, lon in position]
+
+
+def path_along(rng, planned, length, deviation_deg=0.0):
+    """Points walked along a planned route, pushed sideways by deviation_deg"""
+    latitude = np.array([p['latitude'] for p in planned])
+    longitude = np.array([p['longitude'] for p in planned])
+    progress = np.linspace(0, len(planned) - 1, length)
+    lat = np.interp(progress, np.arange(len(planned)), latitude) + rng.normal(0, 2e-5, length) + deviation_deg
+    lon = np.interp(progress, np.arange(len(planned)), longitude) + rng.normal(0, 2e-5, length)
+    return [
+        {"latitude": float(a), "longitude": float(b),
+         "timestamp": (START + timedelta(seconds=60 * index)).isoformat() + "Z"}
+        for index, (a, b) in enumerate(zip(lat, lon))
+    ]
+
+
+def dense_trajectory(rng, minutes=60, interval_seconds=2, noise_m=3.0, stops=2):
+    """
+    A walk reported every interval_seconds, as wearables do: straight legs at
+    walking pace with turns between them, a few stops, and GPS noise
+    :return: List of location points, oldest first
+    """
+    count = int(minutes * 60 / interval_seconds)
+    heading = rng.uniform(0, 2 * np.pi)
+    speed = np.full(count, 1.4)  # m/s
+    for start in rng.integers(0, count, stops):
+        speed[start:start + rng.integers(60, 300)] = 0.0
+    turns = np.zeros(count)
+    turns[rng.integers(0, count, max(1, count // 150))] = rng.uniform(-np.pi, np.pi, max(1, count // 150))
+    headings = heading + np.cumsum(turns)
+    east = np.cumsum(speed * interval_seconds * np.sin(headings)) + rng.normal(0, noise_m, count)
+    north = np.cumsum(speed * interval_seconds * np.cos(headings)) + rng.normal(0, noise_m, count)
+
+    metres_per_degree = 111195.0
+    latitude = CENTRE[0] + north / metres_per_degree
+    longitude = CENTRE[1] + east / (metres_per_degree * np.cos(np.radians(CENTRE[0])))
+    return [
+        {"latitude": float(lat), "longitude": float(lon),
+         "timestamp": (START + timedelta(seconds=int(index * interval_seconds))).isoformat() + "Z"}
+        for index, (lat, lon) in enumerate(zip(latitude, longitude))
+    ]
+
+
+def dataset(seed=42, tourists=200, length=50, itineraries=20):
+    """
+    Everything a benchmark run needs, reproducible from the seed
+    :return: Dict with trajectories, training windows, itineraries and paths
+    """
+    rng = np.random.default_rng(seed)
+    routes = [itinerary(rng) for _ in range(itineraries)]
+    paths = []
+    for index in range(tourists):
+        route = index % itineraries
+        deviation = 0.004 if rng.random() < 0.1 else 0.0
+        paths.append((route, path_along(rng, routes[route], length, deviation)))
+    return {
+        "trajectories": [trajectory(rng, length) for _ in range(tourists)],
+        "training": [trajectory(rng, length) for _ in range(tourists)],
+        "itineraries": routes,
+        "paths": paths
+    }
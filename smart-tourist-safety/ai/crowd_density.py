@@ -0,0 +1,353 @@
+"""
+Crowd Density Monitor for the Anomaly Detection Engine
+This module keeps the latest position of every tourist aggregated into grid
+cells and finds crowd hotspots by running DBSCAN over the occupied cells,
+weighted by their head counts, instead of over every tourist
+"""
+
+import math
+import time
+from collections import OrderedDict
+from itertools import chain
+import numpy as np
+from datetime import datetime
+from threading import Lock
+from geo_kernels import EARTH_RADIUS_M
+
+METRES_PER_DEGREE = np.pi * EARTH_RADIUS_M / 180
+
+
+class CrowdDensityMonitor:
+    """
+    Incremental crowd clustering over the latest positions of all tourists
+
+    A position update moves one tourist between eps/2 grid cells in O(1).
+    Clustering works on cell centroids weighted by head count: cells whose 5x5
+    block (which covers their eps neighbourhood) cannot reach min_samples, and
+    that do not border such a cell, are dropped before DBSCAN; if more than
+    max_cells remain they are merged into coarser cells, so the DBSCAN cost is
+    bounded regardless of the tourist count. Positions not updated for
+    max_age_seconds are dropped on the next update or clustering pass
+    """
+
+    def __init__(self, eps_m=25.0, min_samples=50, hotspot_size=200, max_cells=20000,
+                 max_grid_cells=4000000, origin=None, max_age_seconds=1800):
+        """
+        :param eps_m: DBSCAN neighbourhood radius in metres
+        :param min_samples: Tourists within eps_m that make a dense core
+        :param hotspot_size: Cluster size reported as overcrowded
+        :param max_cells: Most weighted cells handed to DBSCAN in one pass
+        :param max_grid_cells: Size limit of the summed-area table used to prefilter cells
+        :param origin: (latitude, longitude) of the projection; defaults to the first update
+        :param max_age_seconds: Time after its last update a position stops being counted
+        """
+        self.eps_m = eps_m
+        self.min_samples = min_samples
+        self.hotspot_size = hotspot_size
+        self.max_cells = max_cells
+        self.max_grid_cells = max_grid_cells
+        self.cell_size = eps_m / 2
+        self.origin = origin
+        self.x_scale = None if origin is None else METRES_PER_DEGREE * np.cos(np.radians(origin[0]))
+        self.max_age_seconds = max_age_seconds
+        self.positions = OrderedDict()  # tourist_id -> (cell, x, y, updated), least recently updated first
+        self.cells = {}  # cell -> [count, sum_x, sum_y]
+        self.expired = 0
+        self.lock = Lock()
+        self.version = 0
+        self.cached = None
+
+    def _project(self, latitude, longitude):
+        if self.origin is None:
+            self.origin = (latitude, longitude)
+            self.x_scale = METRES_PER_DEGREE * np.cos(np.radians(latitude))
+        return ((longitude - self.origin[1]) * self.x_scale,
+                (latitude - self.origin[0]) * METRES_PER_DEGREE)
+
+    def _remove(self, tourist_id):
+        previous = self.positions.pop(tourist_id, None)
+        if previous is None:
+            return False
+        cell, x, y, _ = previous
+        totals = self.cells[cell]
+        if totals[0] == 1:
+            del self.cells[cell]
+        else:
+            totals[0] -= 1
+            totals[1] -= x
+            totals[2] -= y
+        return True
+
+    def _expire(self, now):
+        cutoff = now - self.max_age_seconds
+        expired = 0
+        while self.positions:
+            tourist_id, (_, _, _, updated) = next(iter(self.positions.items()))
+            if updated > cutoff:
+                break
+            self._remove(tourist_id)
+            expired += 1
+        self.expired += expired
+        self.version += expired
+
+    def update(self, tourist_id, latitude, longitude, now=None):
+        """
+        Move a tourist to its latest position
+        :param now: time.monotonic() of the update (defaults to the current time)
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            x, y = self._project(float(latitude), float(longitude))
+            cell = (int(x // self.cell_size), int(y // self.cell_size))
+            self._remove(tourist_id)
+            self.positions[tourist_id] = (cell, x, y, now)
+            totals = self.cells.get(cell)
+            if totals is None:
+                self.cells[cell] = [1, x, y]
+            else:
+                totals[0] += 1
+                totals[1] += x
+                totals[2] += y
+            self.version += 1
+            self._expire(now)
+
+    def remove(self, tourist_id):
+        """
+        Stop counting a tourist (e.g. when they leave the site)
+        """
+        with self.lock:
+            removed = self._remove(tourist_id)
+            self.version += removed
+            return removed
+
+    def _snapshot(self):
+        with self.lock:
+            if not self.cells:
+                return None, None, self.version
+            count = len(self.cells)
+            keys = np.fromiter(chain.from_iterable(self.cells), dtype=np.int64, count=2 * count)
+            totals = np.fromiter(chain.from_iterable(self.cells.values()), dtype=float, count=3 * count)
+            return keys.reshape(-1, 2), totals.reshape(-1, 3), self.version
+
+    def _window_sums(self, keys, values):
+        """
+        Sum of values over the 5x5 cell block around every cell, read from a
+        summed-area table; when the occupied area is large the table is built
+        on coarser cells, which can only over-count (a safe upper bound)
+        """
+        low = keys.min(axis=0)
+        extent = keys.max(axis=0) - low + 1
+        factor = max(1, int(np.ceil(np.sqrt(extent[0] * extent[1] / self.max_grid_cells))))
+        shape = (extent + 4) // factor + 1
+
+        index = (keys - low + 2) // factor
+        table = np.bincount(index[:, 0] * shape[1] + index[:, 1], weights=values,
+                            minlength=shape[0] * shape[1]).reshape(shape)
+        table = np.pad(table.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+
+        first = (keys - low) // factor
+        last = (keys - low + 4) // factor + 1
+        return (table[last[:, 0], last[:, 1]] - table[first[:, 0], last[:, 1]] -
+                table[last[:, 0], first[:, 1]] + table[first[:, 0], first[:, 1]])
+
+    def _candidate_cells(self, keys, counts):
+        """
+        Cells that can be a core of a cluster, plus the cells next to them that
+        can hold border points
+        """
+        core = self._window_sums(keys, counts) >= self.min_samples
+        return core | (self._window_sums(keys, core.astype(float)) > 0)
+
+    def hotspots(self, min_size=None, now=None):
+        """
+        Cluster the current positions
+        :param min_size: Smallest cluster reported (defaults to min_samples)
+        :param now: time.monotonic() that positions are aged against (defaults to the current time)
+        :return: Dict with the clusters, largest first, and timing details
+        """
+        with self.lock:
+            self._expire(time.monotonic() if now is None else now)
+        cached = self.cached
+        if cached is not None and cached['version'] == self.version and cached['min_size'] == min_size:
+            return cached['result']
+
+        started = time.perf_counter()
+        keys, totals, version = self._snapshot()
+        clusters = []
+        resolution = self.cell_size
+        cells_clustered = 0
+        if keys is not None:
+            counts = totals[:, 0]
+            keep = self._candidate_cells(keys, counts)
+            keys, counts, sums = keys[keep], counts[keep], totals[keep, 1:]
+
+            # Merge into coarser cells when the candidates exceed the budget
+            if len(counts) > self.max_cells:
+                factor = int(np.ceil(np.sqrt(len(counts) / self.max_cells)))
+                _, group = np.unique(keys // factor, axis=0, return_inverse=True)
+                group = group.ravel()
+                counts = np.bincount(group, weights=counts)
+                sums = np.column_stack((np.bincount(group, weights=sums[:, 0]),
+                                        np.bincount(group, weights=sums[:, 1])))
+                resolution = self.cell_size * factor
+            cells_clustered = len(counts)
+
+            if cells_clustered:
+                from sklearn.cluster import DBSCAN
+
+                centroids = sums / counts[:, None]
+                labels = DBSCAN(eps=self.eps_m, min_samples=self.min_samples).fit(
+                    centroids, sample_weight=counts).labels_
+
+                clustered = labels >= 0
+                if clustered.any():
+                    labels, counts, sums = labels[clustered], counts[clustered], sums[clustered]
+                    sizes = np.bincount(labels, weights=counts)
+                    centre_x = np.bincount(labels, weights=sums[:, 0]) / sizes
+                    centre_y = np.bincount(labels, weights=sums[:, 1]) / sizes
+                    spread = np.sqrt(
+                        (centroids[clustered][:, 0] - centre_x[labels])**2 +
+                        (centroids[clustered][:, 1] - centre_y[labels])**2)
+                    radius = np.zeros(len(sizes))
+                    np.maximum.at(radius, labels, spread)
+                    smallest = self.min_samples if min_size is None else min_size
+
+                    for label in np.argsort(-sizes):
+                        if sizes[label] < smallest:
+                            continue
+                        radius_m = float(radius[label] + resolution)
+                        clusters.append({
+                            "centroid": {
+                                "latitude": float(self.origin[0] + centre_y[label] / METRES_PER_DEGREE),
+                                "longitude": float(self.origin[1] + centre_x[label] / self.x_scale)
+                            },
+                            "size": int(sizes[label]),
+                            "radius_m": radius_m,
+                            "density_per_1000m2": float(sizes[label] / (np.pi * radius_m**2) * 1000),
+                            "overcrowded": bool(sizes[label] >= self.hotspot_size)
+                        })
+
+        result = {
+            "clusters": clusters,
+            "hotspots": sum(cluster['overcrowded'] for cluster in clusters),
+            "tourists": len(self.positions),
+            "cells_clustered": cells_clustered,
+            "resolution_m": float(resolution),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+            "timestamp": datetime.now().isoformat(),
+            "type": "crowd_density"
+        }
+        self.cached = {"version": version, "min_size": min_size, "result": result}
+        return result
+
+
+class SiteCrowdMonitors:
+    """
+    One CrowdDensityMonitor per site, a site being a site_size_deg square tile
+
+    Each monitor projects around the centre of its tile, so distances stay
+    accurate wherever the tourists are and do not depend on which position
+    arrived first. A tourist who moves to another tile is taken out of the
+    previous site's monitor
+    """
+
+    def __init__(self, site_size_deg=0.5, max_age_seconds=1800, **options):
+        """
+        :param site_size_deg: Side of a site tile in degrees
+        :param max_age_seconds: Time after its last update a position stops being counted
+        :param options: CrowdDensityMonitor options shared by every site
+        """
+        self.site_size_deg = site_size_deg
+        self.max_age_seconds = max_age_seconds
+        self.options = options
+        self.monitors = {}  # site -> CrowdDensityMonitor
+        self.sites = OrderedDict()  # tourist_id -> (site, updated), least recently updated first
+        self.lock = Lock()
+
+    def site_of(self, latitude, longitude):
+        return (math.floor(latitude / self.site_size_deg), math.floor(longitude / self.site_size_deg))
+
+    def _monitor(self, site):
+        monitor = self.monitors.get(site)
+        if monitor is None:
+            origin = ((site[0] + 0.5) * self.site_size_deg, (site[1] + 0.5) * self.site_size_deg)
+            monitor = CrowdDensityMonitor(origin=origin, max_age_seconds=self.max_age_seconds, **self.options)
+            self.monitors[site] = monitor
+        return monitor
+
+    def _expire(self, now):
+        # The monitors drop the positions themselves; this only forgets which site they were at
+        cutoff = now - self.max_age_seconds
+        while self.sites:
+            tourist_id, (_, updated) = next(iter(self.sites.items()))
+            if updated > cutoff:
+                break
+            del self.sites[tourist_id]
+
+    def update(self, tourist_id, latitude, longitude, now=None):
+        """
+        Move a tourist to its latest position, in the monitor of the site it is in
+        :param now: time.monotonic() of the update (defaults to the current time)
+        """
+        now = time.monotonic() if now is None else now
+        latitude, longitude = float(latitude), float(longitude)
+        site = self.site_of(latitude, longitude)
+        with self.lock:
+            previous = self.sites.pop(tourist_id, None)
+            if previous is not None and previous[0] != site and previous[0] in self.monitors:
+                self.monitors[previous[0]].remove(tourist_id)
+            self.sites[tourist_id] = (site, now)
+            self._monitor(site).update(tourist_id, latitude, longitude, now)
+            self._expire(now)
+
+    def remove(self, tourist_id):
+        """
+        Stop counting a tourist (e.g. when they leave the site)
+        """
+        with self.lock:
+            previous = self.sites.pop(tourist_id, None)
+            monitor = None if previous is None else self.monitors.get(previous[0])
+            return monitor is not None and monitor.remove(tourist_id)
+
+    def hotspots(self, min_size=None, now=None):
+        """
+        Cluster the current positions of every site
+        :param min_size: Smallest cluster reported (defaults to min_samples)
+        :param now: time.monotonic() that positions are aged against (defaults to the current time)
+        :return: Dict with the clusters of all sites, largest first, and timing details
+        """
+        now = time.monotonic() if now is None else now
+        started = time.perf_counter()
+        with self.lock:
+            self._expire(now)
+            monitors = list(self.monitors.items())
+
+        clusters = []
+        tourists = cells_clustered = 0
+        resolution = None
+        for site, monitor in monitors:
+            result = monitor.hotspots(min_size, now)
+            if not result['tourists']:
+                with self.lock:
+                    if not monitor.positions and self.monitors.get(site) is monitor:
+                        del self.monitors[site]  # nobody left at the site
+                continue
+            for cluster in result['clusters']:
+                clusters.append({**cluster, "site": {"latitude": monitor.origin[0], "longitude": monitor.origin[1]}})
+            tourists += result['tourists']
+            cells_clustered += result['cells_clustered']
+            resolution = max(resolution or 0.0, result['resolution_m'])
+        clusters.sort(key=lambda cluster: -cluster['size'])
+
+        return {
+            "clusters": clusters,
+            "hotspots": sum(cluster['overcrowded'] for cluster in clusters),
+            "tourists": tourists,
+            "sites": len(self.monitors),
+            "cells_clustered": cells_clustered,
+            "resolution_m": float(resolution if resolution is not None else
+                                  self.options.get('eps_m', 25.0) / 2),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+            "timestamp": datetime.now().isoformat(),
+            "type": "crowd_density"
+        }
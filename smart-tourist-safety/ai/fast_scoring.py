@@ -0,0 +1,99 @@
+"""
+Fast Scoring Primitives for the Anomaly Detection Engine
+This module freezes fitted scikit-learn objects into plain NumPy arrays so a
+request can be scored without refitting and without sklearn call overhead
+"""
+
+import numpy as np
+
+EULER_GAMMA = 0.5772156649015329
+
+
+def average_path_length(n_samples):
+    """
+    Expected path length of an unsuccessful BST search over n samples
+    (the c(n) normalisation term of Isolation Forest)
+    """
+    n_samples = np.asarray(n_samples, dtype=float)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    mask = n_samples > 2
+    n = n_samples[mask]
+    result[mask] = 2.0 * (np.log(n - 1.0) + EULER_GAMMA) - 2.0 * (n - 1.0) / n
+    return result
+
+
+class FrozenScaler:
+    """
+    Precomputed affine form (x * scale + offset) of a fitted StandardScaler
+    """
+
+    def __init__(self, scaler):
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+        scale = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+        self.scale = 1.0 / scale
+        self.offset = -mean / scale
+
+    def transform(self, features):
+        return features * self.scale + self.offset
+
+
+class CompiledForest:
+    """
+    Fitted IsolationForest flattened into padded node arrays, scored with a
+    vectorized traversal of all trees at once
+    """
+
+    def __init__(self, model):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        max_nodes = max(tree.node_count for tree in trees)
+        size = len(trees) * max_nodes
+
+        # Nodes are addressed by a flat index (tree * max_nodes + node); leaves
+        # point to themselves so the traversal can run a fixed number of steps
+        self.left = np.arange(size)
+        self.right = np.arange(size)
+        self.feature = np.zeros(size, dtype=np.intp)
+        self.threshold = np.zeros(size)
+        self.path_length = np.zeros(size)
+        self.roots = np.arange(len(trees)) * max_nodes
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        for root, tree, features in zip(self.roots, trees, model.estimators_features_):
+            count = tree.node_count
+            internal = tree.children_left != -1
+            nodes = slice(root, root + count)
+            self.left[nodes] = np.where(internal, tree.children_left + root, self.left[nodes])
+            self.right[nodes] = np.where(internal, tree.children_right + root, self.right[nodes])
+            self.feature[nodes] = np.asarray(features)[np.maximum(tree.feature, 0)]
+            self.threshold[nodes] = tree.threshold
+
+            # Depth of every node, then depth + c(n) at leaves as sklearn does
+            depth = np.zeros(count)
+            for node in range(count):
+                if internal[node]:
+                    depth[tree.children_left[node]] = depth[node] + 1
+                    depth[tree.children_right[node]] = depth[node] + 1
+            self.path_length[nodes] = depth + average_path_length(tree.n_node_samples)
+
+        self.normaliser = len(trees) * average_path_length([model.max_samples_])[0]
+        self.offset = model.offset_
+
+    def decision_function(self, features):
+        """
+        Same values as IsolationForest.decision_function for a 2-D feature array
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds
+        features = np.asarray(features, dtype=np.float32).astype(float)
+        n_rows, n_features = features.shape
+        values = features.ravel()
+        row_base = (np.arange(n_rows) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots)))
+
+        for _ in range(self.max_depth):
+            go_left = values.take(row_base + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = np.where(go_left, self.left.take(nodes), self.right.take(nodes))
+
+        depths = self.path_length.take(nodes).sum(axis=1)
+        scores = -(2.0 ** (-depths / self.normaliser))
+        return scores - self.offset
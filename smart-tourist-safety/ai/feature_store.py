@@ -0,0 +1,253 @@
+"""
+Streaming Feature Store for the Anomaly Detection Engine
+This module keeps a fixed-size ring buffer of recent points for every tourist
+so movement features are updated per point instead of rebuilt per request
+"""
+
+import time
+import numpy as np
+from collections import OrderedDict
+from threading import Lock
+from geo_kernels import haversine
+from timestamps import parse_epoch_ms, to_epoch_ms
+from wire_format import LocationColumns
+from trajectory_simplifier import StreamingSimplifier
+
+def to_epoch_seconds(timestamp):
+    """
+    Convert an ISO 8601 timestamp (or epoch milliseconds/seconds) to float epoch seconds
+    :param timestamp: ISO string, datetime or number (see timestamps.py)
+    :return: Seconds since the Unix epoch
+    """
+    return to_epoch_ms(timestamp) / 1000.0
+
+
+class TouristTrack:
+    """
+    Ring buffer of the most recent location points of a single tourist. With a
+    simplifier, the buffer holds the simplified track and the newest point is
+    kept aside as pending until the simplifier decides on it
+    """
+
+    def __init__(self, capacity=50, simplifier=None):
+        self.capacity = capacity
+        self.simplifier = simplifier
+        self.latitude = np.zeros(capacity)
+        self.longitude = np.zeros(capacity)
+        self.epoch = np.zeros(capacity)
+        self.time_diff = np.zeros(capacity)
+        self.distance = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.head = 0  # Slot the next point is written to
+        self.count = 0
+        self.touched = time.monotonic()  # Last update, for idle eviction
+        self.lock = Lock()
+
+    def __len__(self):
+        return self.count + (self.pending is not None)
+
+    @property
+    def pending(self):
+        return self.simplifier.pending if self.simplifier is not None else None
+
+    @property
+    def last_epoch(self):
+        if self.pending is not None:
+            return self.pending[2]
+        if self.count == 0:
+            return None
+        return self.epoch[(self.head - 1) % self.capacity]
+
+    @property
+    def last_position(self):
+        if self.pending is not None:
+            return self.pending[0], self.pending[1]
+        if self.count == 0:
+            return None
+        last = (self.head - 1) % self.capacity
+        return self.latitude[last], self.longitude[last]
+
+    def push(self, latitude, longitude, epoch):
+        """Add one point, through the simplifier when the track has one"""
+        if self.simplifier is None:
+            return self.append(latitude, longitude, epoch)
+        for point in self.simplifier.push(latitude, longitude, epoch):
+            self.append(*point[:3])
+        return True
+
+    def append(self, latitude, longitude, epoch):
+        """
+        Add one point and derive its features from the previous point in O(1)
+        :return: False if the point is older than the latest stored point
+        """
+        if self.count:
+            last = (self.head - 1) % self.capacity
+            time_diff = epoch - self.epoch[last]
+            if time_diff < 0:
+                return False
+            distance = haversine(self.latitude[last], self.longitude[last], latitude, longitude)
+        else:
+            time_diff = 0.0
+            distance = 0.0
+
+        slot = self.head
+        self.latitude[slot] = latitude
+        self.longitude[slot] = longitude
+        self.epoch[slot] = epoch
+        self.time_diff[slot] = time_diff
+        self.distance[slot] = distance
+        self.speed[slot] = distance / (time_diff + 1e-6)  # Avoid division by zero
+
+        self.head = (slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return True
+
+    def _order(self):
+        """Buffer slots in chronological order, skipping the oldest point"""
+        start = (self.head - self.count) % self.capacity
+        return np.arange(start + 1, start + self.count) % self.capacity
+
+    def _pending_row(self):
+        """Features of the pending point against the newest buffered one"""
+        latitude, longitude, epoch, _ = self.pending
+        last = (self.head - 1) % self.capacity
+        time_diff = epoch - self.epoch[last]
+        distance = haversine(self.latitude[last], self.longitude[last], latitude, longitude)
+        return np.array([latitude, longitude, time_diff, distance, distance / (time_diff + 1e-6)])
+
+    def features(self):
+        """
+        Feature matrix equivalent to preprocess_location_data over the buffered window
+        :return: Array of shape (len - 1, 5) or None with fewer than two points
+        """
+        with self.lock:
+            if len(self) < 2:
+                return None
+            order = self._order()
+            features = np.column_stack((
+                self.latitude[order], self.longitude[order], self.time_diff[order],
+                self.distance[order], self.speed[order]
+            ))
+            if self.pending is not None:
+                features = np.vstack((features, self._pending_row()))
+            return features
+
+    def latest_features(self):
+        """
+        Feature row of the newest point only, read in O(1)
+        :return: Array of shape (5,) or None with fewer than two points
+        """
+        with self.lock:
+            if len(self) < 2:
+                return None
+            if self.pending is not None:
+                return self._pending_row()
+            slot = (self.head - 1) % self.capacity
+            return np.array([
+                self.latitude[slot], self.longitude[slot], self.time_diff[slot],
+                self.distance[slot], self.speed[slot]
+            ])
+
+    def max_time_gap(self):
+        """
+        Longest interval between consecutive buffered points, in seconds
+        """
+        with self.lock:
+            if len(self) < 2:
+                return 0.0
+            gaps = self.time_diff[self._order()]
+            if self.pending is not None:
+                gaps = np.append(gaps, self.pending[2] - self.epoch[(self.head - 1) % self.capacity])
+            return float(gaps.max())
+
+
+class TouristFeatureStore:
+    """
+    Per-tourist streaming feature state for the anomaly detectors. Tracks are
+    kept in least recently updated order; tourists idle for idle_seconds, and
+    the least recently updated beyond max_tourists, are dropped on update
+    """
+
+    def __init__(self, window_size=50, simplify_tolerance_m=None, simplify_max_gap_seconds=300.0,
+                 max_tourists=100000, idle_seconds=6 * 3600):
+        """
+        :param window_size: Points buffered per tourist
+        :param simplify_tolerance_m: When set, tracks keep a simplified history
+                                     with this error bound, so the same buffer
+                                     covers a much longer stretch of a dense track
+        :param max_tourists: Tracks kept at most
+        :param idle_seconds: Time without updates after which a track is dropped
+        """
+        self.window_size = window_size
+        self.simplify_tolerance_m = simplify_tolerance_m
+        self.simplify_max_gap_seconds = simplify_max_gap_seconds
+        self.max_tourists = max_tourists
+        self.idle_seconds = idle_seconds
+        self.tracks = OrderedDict()  # Least recently updated first
+        self.evictions = 0
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def update(self, tourist_id, location_data):
+        """
+        Append the points of a location window that are newer than the stored state
+        :param tourist_id: Tourist identifier
+        :param location_data: List of location points or LocationColumns (may
+                              repeat already-seen points)
+        :return: The tourist's track
+        """
+        if isinstance(location_data, LocationColumns):
+            points = sorted(
+                zip(location_data.seconds.tolist(), location_data.latitude.tolist(),
+                    location_data.longitude.tolist()),
+                key=lambda point: point[0]
+            )
+        else:
+            epochs = (parse_epoch_ms([p['timestamp'] for p in location_data]) / 1000.0).tolist()
+            points = sorted(
+                zip(epochs, [p['latitude'] for p in location_data], [p['longitude'] for p in location_data]),
+                key=lambda point: point[0]
+            )
+
+        now = time.monotonic()
+        with self.lock:
+            track = self.tracks.get(tourist_id)
+            if track is None:
+                simplifier = None
+                if self.simplify_tolerance_m is not None:
+                    simplifier = StreamingSimplifier(self.simplify_tolerance_m, self.simplify_max_gap_seconds)
+                track = TouristTrack(self.window_size, simplifier)
+                self.tracks[tourist_id] = track
+            else:
+                self.tracks.move_to_end(tourist_id)
+            track.touched = now
+            self._evict(now)
+
+        with track.lock:
+            last_epoch = track.last_epoch
+            for epoch, latitude, longitude in points:
+                if last_epoch is None or epoch > last_epoch:
+                    track.push(latitude, longitude, epoch)
+                    last_epoch = epoch
+
+        return track
+
+    def get(self, tourist_id):
+        """Return the track of a tourist, or None if unknown"""
+        return self.tracks.get(tourist_id)
+
+    def remove(self, tourist_id):
+        """Forget the state of a tourist"""
+        with self.lock:
+            return self.tracks.pop(tourist_id, None) is not None
+
+    def _evict(self, now):
+        """Drop idle tracks and the least recently updated ones over capacity"""
+        while self.tracks:
+            oldest = next(iter(self.tracks.values()))
+            if len(self.tracks) <= self.max_tourists and now - oldest.touched < self.idle_seconds:
+                break
+            self.tracks.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,95 @@
+"""
+Vectorized Geodesic Kernels for trajectory features
+This module computes great-circle distances, bearings, speeds and accelerations
+for whole arrays of points, and for many trajectories at once
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8  # Mean Earth radius in metres
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between points, in metres (broadcasts over arrays)
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """
+    Initial bearing from the first point to the second, in degrees [0, 360)
+    """
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    x = np.sin(dlon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(x, y)) % 360
+
+
+def trajectory_features(latitude, longitude, seconds, starts=None):
+    """
+    Per-point movement features for one trajectory or a ragged batch of them
+    :param latitude: 1-D array of latitudes in degrees
+    :param longitude: 1-D array of longitudes in degrees
+    :param seconds: 1-D array of times in seconds, sorted within each trajectory
+    :param starts: Optional index of the first point of every trajectory when
+                   several trajectories are concatenated (ragged batch)
+    :return: Dict of arrays (time_diff s, distance m, speed m/s, acceleration m/s²,
+             bearing deg) aligned with the input points; features that need a
+             previous point are 0 at the start of every trajectory
+    """
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    seconds = np.asarray(seconds, dtype=float)
+    if len(latitude) == 0:
+        return {name: np.zeros(0) for name in ("time_diff", "distance", "speed", "acceleration", "bearing")}
+
+    first = np.zeros(len(latitude), dtype=bool)
+    first[0 if starts is None else starts] = True
+    previous = np.arange(len(latitude)) - 1
+    previous[first] = np.flatnonzero(first)  # First points compare with themselves
+
+    time_diff = seconds - seconds[previous]
+    distance = haversine(latitude[previous], longitude[previous], latitude, longitude)
+    speed = distance / (time_diff + 1e-6)  # Avoid division by zero
+    acceleration = (speed - speed[previous]) / (time_diff + 1e-6)
+    acceleration[first | first[previous]] = 0.0  # Needs two earlier points
+    heading = bearing(latitude[previous], longitude[previous], latitude, longitude)
+    heading[first] = 0.0
+
+    return {
+        "time_diff": time_diff,
+        "distance": distance,
+        "speed": speed,
+        "acceleration": acceleration,
+        "bearing": heading
+    }
+
+
+def padded_trajectory_features(latitude, longitude, seconds, lengths):
+    """
+    Movement features for a padded batch of trajectories
+    :param latitude: 2-D array (trajectories x max length) of latitudes
+    :param longitude: 2-D array of longitudes
+    :param seconds: 2-D array of times in seconds
+    :param lengths: Number of valid points in every row
+    :return: Dict of 2-D arrays as in trajectory_features; padding is 0
+    """
+    latitude = np.asarray(latitude, dtype=float)
+    lengths = np.asarray(lengths)
+    valid = np.arange(latitude.shape[1]) < lengths[:, None]
+
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    flat = trajectory_features(latitude[valid], np.asarray(longitude)[valid],
+                               np.asarray(seconds)[valid], starts[lengths > 0])
+
+    features = {}
+    for name, values in flat.items():
+        padded = np.zeros(latitude.shape)
+        padded[valid] = values
+        features[name] = padded
+    return features
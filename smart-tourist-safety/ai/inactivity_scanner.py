@@ -0,0 +1,186 @@
+"""
+Server-side Inactivity Scanner for the Anomaly Detection Engine
+This module keeps the last-seen time of every active tourist in a min-heap of
+deadlines, so a scan tick only touches the tourists whose deadline has passed
+and silent tourists are flagged without anyone posting their history
+"""
+
+import heapq
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+
+
+def mqtt_publisher(broker, topic="iot/alerts/inactivity"):
+    """
+    Publisher that sends alerts to the MQTT broker next to the IoT service's
+    alert topics (needs paho-mqtt)
+    :param broker: "host" or "host:port"
+    """
+    import paho.mqtt.client as mqtt
+
+    host, _, port = broker.partition(':')
+    client = mqtt.Client()
+    client.connect(host, int(port or 1883), 60)
+    client.loop_start()
+
+    def publish(alert):
+        client.publish(topic, json.dumps(alert))
+    return publish
+
+
+class InactivityScanner:
+    """
+    Flags tourists that have not been seen for longer than a threshold
+
+    Every tracked tourist has at most one heap entry, keyed by the deadline
+    computed when it was pushed. Newer sightings only update last_seen; a stale
+    entry is pushed back with its real deadline when it reaches the top, so the
+    heap stays at N entries and each tick costs O((expired + rescheduled) log N).
+    A flagged tourist still silent forget_after_minutes after the last
+    sighting is no longer tracked
+    """
+
+    def __init__(self, threshold_minutes=30, tick_seconds=10, publisher=None, max_alerts=10000,
+                 forget_after_minutes=24 * 60):
+        """
+        :param threshold_minutes: Silence after which a tourist is flagged
+        :param tick_seconds: Time between background scans
+        :param publisher: Optional callable receiving every alert dict
+        :param max_alerts: Number of recent alerts kept for polling
+        :param forget_after_minutes: Silence after which a flagged tourist is
+                                     dropped, e.g. one who left without checkout
+        """
+        self.threshold_seconds = threshold_minutes * 60
+        self.forget_seconds = max(forget_after_minutes * 60, self.threshold_seconds)
+        self.tick_seconds = tick_seconds
+        self.publisher = publisher
+        self.last_seen = {}  # tourist_id -> epoch seconds of the latest point
+        self.heap = []  # (deadline, tourist_id), one entry per scheduled tourist
+        self.forget_heap = []  # (time to drop, tourist_id) of flagged tourists
+        self.scheduled = set()
+        self.flagged = {}  # tourist_id -> alert, while the tourist stays silent
+        self.alerts = deque(maxlen=max_alerts)
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.stats = {"ticks": 0, "expired": 0, "rescheduled": 0, "forgotten": 0, "last_tick_seconds": None}
+
+    def touch(self, tourist_id, epoch):
+        """
+        Record that a tourist was seen at a given time (epoch seconds)
+        """
+        with self.lock:
+            previous = self.last_seen.get(tourist_id)
+            if previous is not None and epoch <= previous:
+                return
+            self.last_seen[tourist_id] = epoch
+            self.flagged.pop(tourist_id, None)
+            if tourist_id not in self.scheduled:
+                self.scheduled.add(tourist_id)
+                heapq.heappush(self.heap, (epoch + self.threshold_seconds, tourist_id))
+
+    def forget(self, tourist_id):
+        """
+        Stop tracking a tourist (e.g. at checkout); its heap entry is dropped lazily
+        """
+        with self.lock:
+            self.flagged.pop(tourist_id, None)
+            return self.last_seen.pop(tourist_id, None) is not None
+
+    def scan(self, now=None):
+        """
+        Pop every expired deadline and flag the tourists that are really silent
+        :param now: Epoch seconds to scan at (defaults to the current time)
+        :return: List of new alerts
+        """
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        threshold_minutes = self.threshold_seconds / 60
+        timestamp = datetime.now().isoformat()
+        alerts = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, tourist_id = heapq.heappop(self.heap)
+                last_seen = self.last_seen.get(tourist_id)
+                if last_seen is None:
+                    self.scheduled.discard(tourist_id)
+                    continue
+
+                deadline = last_seen + self.threshold_seconds
+                if deadline > now:
+                    # Seen again since this entry was pushed
+                    heapq.heappush(self.heap, (deadline, tourist_id))
+                    self.stats['rescheduled'] += 1
+                    continue
+
+                # Flagged once per silence; the next touch schedules it again
+                self.scheduled.discard(tourist_id)
+                heapq.heappush(self.forget_heap, (last_seen + self.forget_seconds, tourist_id))
+                inactive_minutes = (now - last_seen) / 60
+                score = max(0, (inactive_minutes - threshold_minutes) / threshold_minutes)
+                alert = {
+                    "alert_type": "PROLONGED_INACTIVITY",
+                    "tourist_id": tourist_id,
+                    "last_seen": datetime.fromtimestamp(last_seen, timezone.utc).isoformat(),
+                    "inactive_minutes": round(inactive_minutes, 2),
+                    "threshold_minutes": threshold_minutes,
+                    "score": float(score),
+                    "timestamp": timestamp,
+                    "type": "prolonged_inactivity"
+                }
+                self.flagged[tourist_id] = alert
+                self.alerts.append(alert)
+                alerts.append(alert)
+
+            # Drop tourists still silent forget_seconds after their last sighting
+            while self.forget_heap and self.forget_heap[0][0] <= now:
+                _, tourist_id = heapq.heappop(self.forget_heap)
+                last_seen = self.last_seen.get(tourist_id)
+                if tourist_id in self.flagged and last_seen + self.forget_seconds <= now:
+                    del self.last_seen[tourist_id], self.flagged[tourist_id]
+                    self.stats['forgotten'] += 1
+
+            self.stats['ticks'] += 1
+            self.stats['expired'] += len(alerts)
+            self.stats['last_tick_seconds'] = round(time.perf_counter() - started, 6)
+
+        if self.publisher is not None:
+            for alert in alerts:
+                try:
+                    self.publisher(alert)
+                except Exception as e:
+                    print(f"Failed to publish inactivity alert: {e}")
+        return alerts
+
+    def inactive(self):
+        """Tourists currently flagged as inactive"""
+        with self.lock:
+            return list(self.flagged.values())
+
+    def recent_alerts(self, limit=100):
+        with self.lock:
+            return list(self.alerts)[-limit:]
+
+    def status(self):
+        with self.lock:
+            return {"tracked": len(self.last_seen), "scheduled": len(self.heap),
+                    "flagged": len(self.flagged), **self.stats}
+
+    def _run(self):
+        while not self.stop_event.wait(self.tick_seconds):
+            self.scan()
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
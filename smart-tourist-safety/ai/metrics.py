@@ -0,0 +1,58 @@
+"""
+Prometheus Metrics for the AI service
+This module defines the request latency and per-stage timing histograms, the
+throughput counters and the queue depth gauges exposed at GET /metrics.
+iot/metrics.py copies the buckets and helpers below the metric definitions,
+since each service is built into its own image; iot/tests/test_shared_copies.py
+checks that the two stay identical.
+"""
+
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# 100 microseconds to 10 seconds; frozen scoring stages sit at the low end
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram('ai_request_duration_seconds', "HTTP request latency",
+                            ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter('ai_requests_total', "HTTP requests served", ['endpoint', 'method', 'status'])
+STAGE_SECONDS = Histogram('ai_stage_duration_seconds', "Time spent in one processing stage",
+                          ['stage'], buckets=LATENCY_BUCKETS)
+SCORED_ROWS = Counter('ai_scored_rows_total', "Feature rows scored, per detector", ['detector'])
+QUEUE_DEPTH = Gauge('ai_queue_depth', "Items waiting in an internal queue", ['queue'])
+
+# Label children bound once, so the hot paths skip the label lookup
+PARSE = STAGE_SECONDS.labels('parse')
+FEATURE_EXTRACTION = STAGE_SECONDS.labels('feature_extraction')
+SCALING = STAGE_SECONDS.labels('scaling')
+MODEL_SCORING = STAGE_SECONDS.labels('model_scoring')
+ROUTE_MATCHING = STAGE_SECONDS.labels('route_matching')
+DROPOFF_ROWS = SCORED_ROWS.labels('location_dropoff')
+INACTIVITY_ROWS = SCORED_ROWS.labels('prolonged_inactivity')
+ROUTE_ROWS = SCORED_ROWS.labels('route_deviation')
+
+
+def lap(stage, started):
+    """
+    Record the time since started against a stage
+    :param stage: Bound STAGE_SECONDS child, e.g. PARSE
+    :param started: time.perf_counter() value the stage began at
+    :return: Current perf_counter value, to start the next stage from
+    """
+    now = time.perf_counter()
+    stage.observe(now - started)
+    return now
+
+
+def track_queue(name, depth):
+    """
+    Report a queue depth, read only when /metrics is scraped
+    :param depth: Callable returning the current number of waiting items
+    """
+    QUEUE_DEPTH.labels(name).set_function(depth)
+
+
+def exposition():
+    """:return: (body, content type) of the Prometheus text format"""
+    return generate_latest(), CONTENT_TYPE_LATEST
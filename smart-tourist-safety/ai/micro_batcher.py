@@ -0,0 +1,68 @@
+"""
+Micro-batching of concurrent requests for the Anomaly Detection Engine
+This module collects payloads submitted from an asyncio event loop into small
+batches and scores each batch with one call in an executor
+"""
+
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Collects submitted payloads until max_batch_size are waiting or the oldest
+    has waited max_wait_ms, then hands the whole batch to batch_fn in the
+    executor and resolves every caller with its own result
+    """
+
+    def __init__(self, batch_fn, executor, max_batch_size=64, max_wait_ms=2.0):
+        """
+        :param batch_fn: Callable taking a list of payloads and returning a list
+                         of results (an exception instance fails only its caller)
+        """
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending = []  # (payload, future)
+        self.flush_handle = None
+        self.stats = {"requests": 0, "batches": 0, "largest_batch": 0}
+
+    async def submit(self, payload):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((payload, future))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        self.stats['requests'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+        done = asyncio.get_running_loop().run_in_executor(
+            self.executor, self.batch_fn, [payload for payload, _ in batch])
+        done.add_done_callback(lambda finished: self._deliver(batch, finished))
+
+    @staticmethod
+    def _deliver(batch, finished):
+        if finished.exception() is not None:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(finished.exception())
+            return
+        for (_, future), result in zip(batch, finished.result()):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
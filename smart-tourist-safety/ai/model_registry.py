@@ -0,0 +1,196 @@
+"""
+Model Registry for the Anomaly Detection Engine
+This module stores trained model sets as versioned directories with metadata
+and checksums, and loads them memory-mapped so reloads are fast and worker
+processes share the same pages
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from threading import Lock
+import numpy as np
+from fast_scoring import FrozenScaler, CompiledForest
+
+
+class ModelBundle:
+    """
+    A complete, consistent set of models; the engine swaps whole bundles so
+    scoring never sees a half-loaded set
+    """
+
+    COMPONENTS = ('location_dropoff_model', 'inactivity_model', 'route_deviation_model',
+                  'scaler', 'frozen_scaler', 'compiled_dropoff_model')
+    # Everything the frozen scoring path needs; plain NumPy, no sklearn import
+    SCORING_COMPONENTS = ('frozen_scaler', 'compiled_dropoff_model')
+
+    def __init__(self, location_dropoff_model, inactivity_model, route_deviation_model, scaler,
+                 is_trained=False, version=None, metadata=None,
+                 frozen_scaler=None, compiled_dropoff_model=None):
+        self.location_dropoff_model = location_dropoff_model
+        self.inactivity_model = inactivity_model
+        self.route_deviation_model = route_deviation_model
+        self.scaler = scaler
+        self.is_trained = is_trained
+        self.version = version
+        self.metadata = metadata or {}
+
+        # Precompute the NumPy scoring form unless it was loaded ready-made
+        if compiled_dropoff_model is None and hasattr(scaler, 'mean_') and \
+                hasattr(location_dropoff_model, 'estimators_'):
+            frozen_scaler = FrozenScaler(scaler)
+            compiled_dropoff_model = CompiledForest(location_dropoff_model)
+        self.frozen_scaler = frozen_scaler
+        self.compiled_dropoff_model = compiled_dropoff_model
+
+    @classmethod
+    def untrained(cls):
+        # No model objects until training or loading, so starting the service
+        # does not have to import sklearn
+        return cls(None, None, None, None)
+
+    def replace(self, **components):
+        """Copy of this bundle with some components replaced (and refrozen)"""
+        values = {name: getattr(self, name) for name in
+                  ('location_dropoff_model', 'inactivity_model', 'route_deviation_model', 'scaler', 'is_trained')}
+        values.update(components)
+        return ModelBundle(**values)
+
+
+def file_checksum(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as model_file:
+        for chunk in iter(lambda: model_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """
+    Directory of immutable model versions:
+        <root>/v000001/<component>.joblib + metadata.json
+        <root>/LATEST  (name of the newest published version)
+    """
+
+    def __init__(self, root='models/registry'):
+        self.root = root
+        self.publish_lock = Lock()  # Serializes version numbering and LATEST within a process
+
+    def versions(self):
+        """Published versions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if name.startswith('v') and os.path.isfile(os.path.join(self.root, name, 'metadata.json')))
+
+    def latest_version(self):
+        try:
+            with open(os.path.join(self.root, 'LATEST')) as latest_file:
+                return latest_file.read().strip() or None
+        except FileNotFoundError:
+            versions = self.versions()
+            return versions[-1] if versions else None
+
+    def metadata(self, version):
+        with open(os.path.join(self.root, version, 'metadata.json')) as metadata_file:
+            return json.load(metadata_file)
+
+    def publish(self, bundle, metadata=None):
+        """
+        Write a bundle as a new version; the version directory appears atomically.
+        Concurrent publishes in this process take turns; one from another
+        process that claims the same number first makes this one take the next
+        :return: The new version name
+        """
+        import joblib
+        import sklearn
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+
+        try:
+            files = {}
+            for name in ModelBundle.COMPONENTS:
+                component = getattr(bundle, name)
+                if component is None:
+                    continue
+                filepath = os.path.join(staging, f"{name}.joblib")
+                joblib.dump(component, filepath)  # Uncompressed so arrays can be memory-mapped
+                files[name] = {"file": f"{name}.joblib", "sha256": file_checksum(filepath),
+                               "bytes": os.path.getsize(filepath)}
+
+            with self.publish_lock:
+                existing = self.versions()
+                number = int(existing[-1][1:]) + 1 if existing else 1
+                while True:
+                    version = f"v{number:06d}"
+                    with open(os.path.join(staging, 'metadata.json'), 'w') as metadata_file:
+                        json.dump({
+                            "version": version,
+                            "created_at": datetime.now().isoformat(),
+                            "is_trained": bool(bundle.is_trained),
+                            "sklearn_version": sklearn.__version__,
+                            "numpy_version": np.__version__,
+                            "files": files,
+                            **(metadata or {})
+                        }, metadata_file, indent=2)
+                    try:
+                        os.rename(staging, os.path.join(self.root, version))
+                        break
+                    except OSError:
+                        # Renaming onto an existing version fails; anything else is a real error
+                        if not os.path.exists(os.path.join(self.root, version)):
+                            raise
+                        number += 1
+
+                # Never move LATEST back behind a version published meanwhile
+                latest = self.latest_version()
+                if latest is None or latest < version:
+                    latest_tmp = os.path.join(self.root, f".LATEST-{uuid.uuid4().hex}")
+                    with open(latest_tmp, 'w') as latest_file:
+                        latest_file.write(version)
+                    os.replace(latest_tmp, os.path.join(self.root, 'LATEST'))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return version
+
+    def load(self, version=None, mmap_mode='r', verify=True, components=None):
+        """
+        Load a version (the latest by default) into a new bundle
+        :param mmap_mode: joblib mmap mode for the stored arrays, None to copy
+        :param verify: Check every file against its recorded checksum first
+        :param components: Names of the components to load (all by default);
+                           the NumPy scoring components alone load without sklearn
+        """
+        import joblib
+
+        version = version or self.latest_version()
+        if version is None:
+            raise FileNotFoundError(f"No model versions in {self.root}")
+
+        metadata = self.metadata(version)
+        loaded = {}
+        for name, entry in metadata['files'].items():
+            if components is not None and name not in components:
+                continue
+            filepath = os.path.join(self.root, version, entry['file'])
+            if verify and file_checksum(filepath) != entry['sha256']:
+                raise ValueError(f"Checksum mismatch for {name} in model version {version}")
+            loaded[name] = joblib.load(filepath, mmap_mode=mmap_mode)
+
+        return ModelBundle(
+            loaded.get('location_dropoff_model'),
+            loaded.get('inactivity_model'),
+            loaded.get('route_deviation_model'),
+            loaded.get('scaler'),
+            is_trained=metadata.get('is_trained', False),
+            version=version,
+            metadata=metadata,
+            frozen_scaler=loaded.get('frozen_scaler'),
+            compiled_dropoff_model=loaded.get('compiled_dropoff_model')
+        )
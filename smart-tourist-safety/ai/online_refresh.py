@@ -0,0 +1,201 @@
+"""
+Online Model Refresh for the Anomaly Detection Engine
+This module keeps a bounded, time-bucketed reservoir of recently scored feature
+vectors and periodically refits the location dropoff scaler and forest on it
+in a background thread, hot-swapping the result into the engine. Rows the
+reference model (the trained or activated one the refreshes started from)
+flags as anomalous are left out of each refit, so sustained anomalies do not
+become part of the normal baseline. The reference never changes between
+refreshes, and each refit's alert threshold is placed at the reference's
+quantile of the whole sample (or at the share of it the reference flags, if
+larger), so the alert rate on normal traffic stays where training put it
+instead of growing with every refresh
+"""
+
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from threading import Event, Lock, Thread
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+from training_pipeline import ReservoirSample
+
+
+class SlidingReservoir:
+    """
+    Reservoir samples of fixed size per time bucket; buckets older than the
+    window are dropped, so the sample tracks recent behaviour in bounded memory
+    """
+
+    def __init__(self, window_seconds=86400, buckets=24, capacity=48000, seed=42):
+        self.bucket_seconds = window_seconds / buckets
+        self.max_buckets = buckets
+        self.bucket_capacity = max(1, capacity // buckets)
+        self.seed = seed
+        self.buckets = OrderedDict()  # bucket number -> ReservoirSample
+
+    def add(self, rows, now=None):
+        bucket = int((time.time() if now is None else now) // self.bucket_seconds)
+        reservoir = self.buckets.get(bucket)
+        if reservoir is None:
+            reservoir = ReservoirSample(self.bucket_capacity, self.seed + bucket)
+            self.buckets[bucket] = reservoir
+            while self.buckets and next(iter(self.buckets)) <= bucket - self.max_buckets:
+                self.buckets.popitem(last=False)
+        reservoir.add(rows)
+
+    def sample(self):
+        samples = [reservoir.sample() for reservoir in self.buckets.values() if reservoir.size]
+        return np.vstack(samples) if samples else None
+
+    @property
+    def size(self):
+        return sum(reservoir.size for reservoir in self.buckets.values())
+
+
+class OnlineRefresher:
+    """
+    Background refresh of the location dropoff model from recent traffic
+    """
+
+    def __init__(self, engine, interval_seconds=3600, window_seconds=86400, buckets=24,
+                 reservoir_size=48000, min_rows=1000, pending_limit=100000, n_estimators=100,
+                 drain_seconds=5.0):
+        """
+        :param engine: AnomalyDetectionEngine whose models are refreshed
+        :param interval_seconds: Time between refits
+        :param window_seconds: How far back the reservoir reaches
+        :param reservoir_size: Feature rows kept across all buckets
+        :param min_rows: Rows required before a refit is attempted
+        :param pending_limit: Rows buffered between drains; older rows are dropped
+        :param drain_seconds: How often buffered rows are folded into the reservoir
+        """
+        self.engine = engine
+        self.interval_seconds = interval_seconds
+        self.min_rows = min_rows
+        self.drain_seconds = drain_seconds
+        self.n_estimators = n_estimators
+        self.reservoir = SlidingReservoir(window_seconds, buckets, reservoir_size)
+        self.pending = deque(maxlen=pending_limit)  # Appended from request threads
+        self.reference = None  # Models whose alert threshold decides the rows left out
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.thread = None
+        self.status = {"refreshes": 0, "last_refresh": None, "last_duration_seconds": None,
+                       "last_rows": 0, "last_excluded_rows": 0, "last_version": None, "last_error": None}
+
+    def observe(self, features):
+        """
+        Record feature rows seen while scoring (cheap; safe from any thread)
+        """
+        self.pending.extend(np.atleast_2d(features))
+
+    def _drain(self):
+        rows = []
+        while self.pending:
+            try:
+                rows.append(self.pending.popleft())
+            except IndexError:
+                break
+        if rows:
+            self.reservoir.add(np.vstack(rows))
+
+    def refresh_now(self):
+        """
+        Refit the scaler and forest on the current reservoir and swap them in
+        :return: Status dict of the refresh
+        """
+        with self.lock:
+            started = time.perf_counter()
+            self._drain()
+            sample = self.reservoir.sample()
+            if sample is None or len(sample) < self.min_rows:
+                return {"status": "skipped",
+                        "message": f"Only {0 if sample is None else len(sample)} rows, need {self.min_rows}"}
+
+            base = self.engine.models
+            if self.reference is None or 'refreshed_from' not in base.metadata:
+                self.reference = base
+            total = len(sample)
+            try:
+                anomalous = self._anomalous(self.reference, sample)
+                everything, sample = sample, sample[~anomalous]
+                if len(sample) < self.min_rows:
+                    return {"status": "skipped",
+                            "message": f"Only {len(sample)} of {total} rows are not anomalous, need {self.min_rows}"}
+
+                scaler = StandardScaler().fit(sample)
+                model = IsolationForest(n_estimators=self.n_estimators, contamination='auto',
+                                        random_state=42, n_jobs=1)
+                model.fit(scaler.transform(sample))
+                contamination = getattr(self.reference.location_dropoff_model, 'contamination', 0.1)
+                if contamination != 'auto':
+                    # As fit does with contamination, but over all recent rows
+                    share = max(contamination, anomalous.mean())
+                    model.offset_ = np.percentile(model.score_samples(scaler.transform(everything)), 100 * share)
+
+                # Swap under the reload lock, and only over the models the refit
+                # started from, so an activation in between is never overwritten
+                with self.engine.reload_lock:
+                    if self.engine.models is not base:
+                        return {"status": "skipped", "message": "Models changed during the refresh"}
+                    source = base.metadata.get('refreshed_from', base.version)
+                    refresh = base.metadata.get('refresh', 0) + 1
+                    version = f"{source or 'local'}+refresh{refresh}"
+                    self.engine.swap_models(base.replace(
+                        location_dropoff_model=model, scaler=scaler, is_trained=True, version=version,
+                        metadata={"refreshed_from": source, "refresh": refresh, "rows": len(sample)}))
+            except Exception as e:
+                self.status['last_error'] = str(e)
+                return {"status": "error", "message": f"Online refresh failed: {str(e)}"}
+
+            self.status.update({
+                "refreshes": self.status['refreshes'] + 1,
+                "last_refresh": datetime.now().isoformat(),
+                "last_duration_seconds": round(time.perf_counter() - started, 4),
+                "last_rows": len(sample),
+                "last_excluded_rows": total - len(sample),
+                "last_version": version,
+                "last_error": None
+            })
+            return {"status": "success", "rows": len(sample), "excluded_rows": total - len(sample),
+                    "version": version, "message": f"Models refreshed as {version}"}
+
+    @staticmethod
+    def _anomalous(models, sample):
+        """
+        Rows of the sample the live dropoff model scores at or past its alert
+        threshold; none without a trained model
+        """
+        if models.compiled_dropoff_model is not None:
+            scores = models.compiled_dropoff_model.decision_function(models.frozen_scaler.transform(sample))
+        elif models.location_dropoff_model is not None and models.scaler is not None:
+            scores = models.location_dropoff_model.decision_function(models.scaler.transform(sample))
+        else:
+            return np.zeros(len(sample), dtype=bool)
+        return scores < 0
+
+    def _run(self):
+        # Fold pending rows into the reservoir often, so the bounded buffer only
+        # has to absorb a few seconds of traffic; refit on the longer interval
+        next_refresh = time.monotonic() + self.interval_seconds
+        while not self.stop_event.wait(min(self.drain_seconds, self.interval_seconds)):
+            if time.monotonic() >= next_refresh:
+                self.refresh_now()
+                next_refresh = time.monotonic() + self.interval_seconds
+            else:
+                with self.lock:
+                    self._drain()
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
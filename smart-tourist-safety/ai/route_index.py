@@ -0,0 +1,247 @@
+"""
+Route Index for itinerary deviation detection
+This module compiles a planned itinerary once into a uniform grid over its
+polyline segments, so the exact distance from a location to the route can be
+found by visiting only the nearby cells
+"""
+
+import hashlib
+import math
+import time
+import numpy as np
+from collections import OrderedDict
+from threading import Lock
+from geo_kernels import EARTH_RADIUS_M, haversine
+from wire_format import coordinates
+
+METRES_PER_DEGREE = np.pi * EARTH_RADIUS_M / 180
+
+
+def route_digest(latitude, longitude):
+    """Hash of a route's coordinates, to tell an edited itinerary from the cached one"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(latitude, dtype=float).tobytes())
+    digest.update(np.ascontiguousarray(longitude, dtype=float).tobytes())
+    return digest.digest()
+
+
+class RouteIndex:
+    """
+    Grid of the segments of one planned route, in a local metric projection
+    """
+
+    def __init__(self, planned_itinerary, cell_size_m=250.0, max_rings=8):
+        """
+        :param planned_itinerary: List of planned location points (at least two)
+        :param cell_size_m: Edge length of a grid cell in metres
+        :param max_rings: Rings searched around a query cell before falling back
+                          to scanning every segment
+        """
+        self.latitude, self.longitude = coordinates(planned_itinerary)
+        self.digest = route_digest(self.latitude, self.longitude)
+        self.centroid = (self.latitude.mean(), self.longitude.mean())
+        self.length_m = float(np.sum(haversine(self.latitude[:-1], self.longitude[:-1],
+                                               self.latitude[1:], self.longitude[1:])))
+        self.cell_size = cell_size_m
+        self.max_rings = max_rings
+
+        # Equirectangular projection around the route; accurate to well under a
+        # metre over the extent of a tourist itinerary
+        self.origin = self.centroid
+        self.x_scale = METRES_PER_DEGREE * np.cos(np.radians(self.origin[0]))
+        x, y = self.project(self.latitude, self.longitude)
+        self.start = np.column_stack((x[:-1], y[:-1]))
+        self.delta = np.column_stack((x[1:], y[1:])) - self.start
+        self.length_sq = np.maximum(np.einsum('ij,ij->i', self.delta, self.delta), 1e-12)
+
+        # Register every segment in each cell its bounding box overlaps
+        self.cells = {}
+        low = np.floor(np.minimum(self.start, self.start + self.delta) / cell_size_m).astype(int)
+        high = np.floor(np.maximum(self.start, self.start + self.delta) / cell_size_m).astype(int)
+        for segment, ((x0, y0), (x1, y1)) in enumerate(zip(low, high)):
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.cells.setdefault((cx, cy), []).append(segment)
+        self.cells = {cell: np.array(segments) for cell, segments in self.cells.items()}
+        self.cell_low = low.min(axis=0)
+        self.cell_high = high.max(axis=0)
+
+    def project(self, latitude, longitude):
+        """Project degrees to metres east/north of the route origin"""
+        x = (np.asarray(longitude) - self.origin[1]) * self.x_scale
+        y = (np.asarray(latitude) - self.origin[0]) * METRES_PER_DEGREE
+        return x, y
+
+    def _segment_distances(self, x, y, segments):
+        start = self.start[segments]
+        delta = self.delta[segments]
+        offset = np.array([x, y]) - start
+        t = np.clip(np.einsum('ij,ij->i', offset, delta) / self.length_sq[segments], 0.0, 1.0)
+        offset -= t[:, None] * delta
+        return np.sqrt(np.einsum('ij,ij->i', offset, offset))
+
+    def distance(self, latitude, longitude):
+        """
+        Exact distance in metres from a point to the nearest route segment
+        """
+        x = (longitude - self.origin[1]) * self.x_scale
+        y = (latitude - self.origin[0]) * METRES_PER_DEGREE
+        cx, cy = math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+        # Rings closer than the grid's bounding box are empty
+        first_ring = max(0, self.cell_low[0] - cx, cx - self.cell_high[0],
+                         self.cell_low[1] - cy, cy - self.cell_high[1])
+        best = np.inf
+
+        for ring in range(first_ring, self.max_rings + 1):
+            candidates = [self.cells[cell] for cell in self._ring(cx, cy, ring) if cell in self.cells]
+            if candidates:
+                best = min(best, self._segment_distances(x, y, np.concatenate(candidates)).min())
+            # Segments in cells outside this ring are at least ring * cell_size away
+            if best <= ring * self.cell_size:
+                return float(best)
+
+        return float(self._segment_distances(x, y, slice(None)).min())
+
+    def distances(self, latitude, longitude):
+        """Exact route distance in metres for every point of a path"""
+        return np.array([self.distance(lat, lon) for lat, lon in zip(latitude, longitude)])
+
+    @staticmethod
+    def _ring(cx, cy, ring):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
+
+
+class RouteIndexCache:
+    """
+    Bounded LRU of compiled route indexes keyed by itinerary id; a cached
+    index is recompiled when the planned points passed with it change
+    """
+
+    def __init__(self, max_size=1024, cell_size_m=250.0):
+        self.max_size = max_size
+        self.cell_size_m = cell_size_m
+        self.indexes = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, itinerary_id, planned_itinerary=None):
+        """
+        Return the index of an itinerary, compiling it on first use or when
+        the planned points differ from the cached ones
+        :param itinerary_id: Itinerary identifier
+        :param planned_itinerary: Planned points; only needed the first time
+        :return: RouteIndex, or None if the itinerary is unknown and not given
+        """
+        planned = planned_itinerary is not None and len(planned_itinerary) >= 2
+        digest = route_digest(*coordinates(planned_itinerary)) if planned else None
+        with self.lock:
+            index = self.indexes.get(itinerary_id)
+            if index is not None and (digest is None or digest == index.digest):
+                self.indexes.move_to_end(itinerary_id)
+                return index
+
+        if not planned:
+            return None
+
+        index = RouteIndex(planned_itinerary, self.cell_size_m)
+        with self.lock:
+            self.indexes[itinerary_id] = index
+            self.indexes.move_to_end(itinerary_id)
+            while len(self.indexes) > self.max_size:
+                self.indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, itinerary_id):
+        """Drop a compiled itinerary, e.g. after the plan was edited"""
+        with self.lock:
+            return self.indexes.pop(itinerary_id, None) is not None
+
+
+class CorridorTracker:
+    """
+    Incremental corridor-exit state per tourist, fed with route distances as
+    new points arrive. States idle for idle_seconds, and the least recently
+    updated beyond max_tourists, are dropped on update
+    """
+
+    def __init__(self, corridor_m=200.0, min_exit_points=2, max_tourists=100000, idle_seconds=6 * 3600):
+        """
+        :param corridor_m: Half-width of the allowed corridor around the route
+        :param min_exit_points: Consecutive outside points that count as an exit
+        :param max_tourists: States kept at most
+        :param idle_seconds: Time without updates after which a state is dropped
+        """
+        self.corridor_m = corridor_m
+        self.min_exit_points = min_exit_points
+        self.max_tourists = max_tourists
+        self.idle_seconds = idle_seconds
+        self.states = OrderedDict()  # Least recently updated first
+        self.lock = Lock()
+
+    def evaluate(self, distances):
+        """
+        Stateless corridor check of a single window of route distances
+        :return: Corridor state at the end of the window
+        """
+        inside = np.flatnonzero(np.asarray(distances) <= self.corridor_m)
+        trailing = len(distances) - 1 - inside[-1] if len(inside) else len(distances)
+        return {
+            "outside_corridor": bool(trailing >= self.min_exit_points),
+            "consecutive_outside": int(trailing),
+            "exited_at": None
+        }
+
+    def update(self, tourist_id, itinerary_id, epochs, distances):
+        """
+        Feed the route distances of points newer than the last seen point
+        :return: Current corridor state of the tourist
+        """
+        now = time.monotonic()
+        with self.lock:
+            state = self.states.get(tourist_id)
+            if state is None or state['itinerary_id'] != itinerary_id:
+                state = {"itinerary_id": itinerary_id, "last_epoch": None,
+                         "consecutive_outside": 0, "exited_at": None}
+                self.states[tourist_id] = state
+            self.states.move_to_end(tourist_id)
+            state['touched'] = now
+            self._evict(now)
+
+            for epoch, distance in sorted(zip(epochs, distances)):
+                if state['last_epoch'] is not None and epoch <= state['last_epoch']:
+                    continue
+                state['last_epoch'] = epoch
+                if distance > self.corridor_m:
+                    state['consecutive_outside'] += 1
+                    if state['consecutive_outside'] == self.min_exit_points:
+                        state['exited_at'] = epoch
+                else:
+                    state['consecutive_outside'] = 0
+                    state['exited_at'] = None
+
+            return {
+                "outside_corridor": state['consecutive_outside'] >= self.min_exit_points,
+                "consecutive_outside": state['consecutive_outside'],
+                "exited_at": state['exited_at']
+            }
+
+    def remove(self, tourist_id):
+        """Forget the corridor state of a tourist"""
+        with self.lock:
+            return self.states.pop(tourist_id, None) is not None
+
+    def _evict(self, now):
+        """Drop idle states and the least recently updated ones over capacity"""
+        while self.states:
+            oldest = next(iter(self.states.values()))
+            if len(self.states) <= self.max_tourists and now - oldest['touched'] < self.idle_seconds:
+                break
+            self.states.popitem(last=False)
@@ -0,0 +1,57 @@
+"""
+Startup Timing for the AI service
+This module records how long each startup phase of a replica takes, from the
+first import to the moment it can take traffic
+"""
+
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """
+    Ordered record of named startup stages and when the service became ready
+    """
+
+    def __init__(self, budget_seconds=None):
+        """
+        :param budget_seconds: Time a replica may take to become ready
+        """
+        self.started = time.perf_counter()
+        self.budget_seconds = budget_seconds
+        self.stages = []  # (name, seconds) in completion order
+        self.ready_seconds = None
+        self.error = None
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, round(time.perf_counter() - started, 4)))
+
+    def mark_ready(self):
+        self.ready_seconds = round(time.perf_counter() - self.started, 4)
+        print(f"Service ready in {self.ready_seconds:.3f}s: " +
+              ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.stages))
+        if self.budget_seconds is not None and self.ready_seconds > self.budget_seconds:
+            print(f"Warning: startup exceeded its budget of {self.budget_seconds}s")
+
+    def mark_failed(self, error):
+        self.error = str(error)
+
+    @property
+    def ready(self):
+        return self.ready_seconds is not None
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "ready_seconds": self.ready_seconds,
+            "budget_seconds": self.budget_seconds,
+            "within_budget": None if self.budget_seconds is None or not self.ready
+            else self.ready_seconds <= self.budget_seconds,
+            "stages": [{"name": name, "seconds": seconds} for name, seconds in self.stages],
+            "error": self.error
+        }
@@ -0,0 +1,49 @@
+"""
+Shared fixtures for the AI engine tests
+The AI modules import each other by module name, as when run from ai/
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly_detection import AnomalyDetectionEngine
+from benchmarks.synthetic import trajectory
+
+
+@pytest.fixture(scope='session')
+def training_data():
+    rng = np.random.default_rng(7)
+    return {"location_data": [trajectory(rng, 60) for _ in range(40)]}
+
+
+@pytest.fixture
+def windows():
+    """Twelve tourists' recent windows, of varying length"""
+    rng = np.random.default_rng(11)
+    return [trajectory(rng, int(length)) for length in rng.integers(2, 40, 12)]
+
+
+@pytest.fixture
+def make_engine(tmp_path, training_data):
+    """Factory of engines trained on the shared data, with the result cache off unless asked for"""
+    def make(name='engine', **options):
+        options.setdefault('cache_size', 0)
+        engine = AnomalyDetectionEngine(registry_dir=str(tmp_path / name / 'registry'), **options)
+        engine.train_models(training_data)
+        return engine
+    return make
+
+
+@pytest.fixture
+def frozen_engine(make_engine):
+    return make_engine(scoring_mode='frozen')
+
+
+@pytest.fixture
+def refit_engine(make_engine):
+    return make_engine(scoring_mode='refit')
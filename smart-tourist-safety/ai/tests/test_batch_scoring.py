@@ -0,0 +1,141 @@
+"""
+Batched drop-off scoring gives the same results as scoring each window alone
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import itinerary, path_along, trajectory
+
+
+@pytest.mark.parametrize('engine_fixture', ['frozen_engine', 'refit_engine'])
+def test_detect_batch_matches_single_calls(request, engine_fixture, windows):
+    engine = request.getfixturevalue(engine_fixture)
+    batch = [{"tourist_id": f"tourist_{index}", "location_data": window} for index, window in enumerate(windows)]
+    batch.append({"tourist_id": "tourist_short", "location_data": windows[0][:1]})
+
+    results = engine.detect_batch(batch)
+
+    assert [result["tourist_id"] for result in results] == [entry["tourist_id"] for entry in batch]
+    for entry, result in zip(batch, results):
+        single = engine.detect_location_dropoff(entry["location_data"])
+        assert result["anomaly"] == single["anomaly"]
+        assert result["score"] == pytest.approx(single["score"], abs=1e-9)
+
+
+def test_detect_batch_sorts_each_window(frozen_engine, windows):
+    shuffled = [list(reversed(window)) for window in windows]
+
+    results = frozen_engine.detect_batch([{"location_data": window} for window in shuffled])
+
+    for window, result in zip(windows, results):
+        assert result["score"] == pytest.approx(frozen_engine.detect_location_dropoff(window)["score"], abs=1e-9)
+
+
+def test_many_requests_match_single_calls(frozen_engine, windows):
+    requests = [{"location_data": window} for window in windows]
+
+    results = frozen_engine.detect_location_dropoff_many(requests)
+
+    for window, result in zip(windows, results):
+        assert result == {**frozen_engine.detect_location_dropoff(window), "timestamp": result["timestamp"]}
+
+
+def test_streaming_requests_match_single_calls(make_engine):
+    window = trajectory(np.random.default_rng(3), 30)
+    batched, single = make_engine('batched'), make_engine('single')
+
+    for end in range(5, 31, 5):
+        chunk = window[end - 5:end]
+        expected = single.detect_location_dropoff(chunk, tourist_id="tourist_1")
+        result = batched.detect_location_dropoff_many([{"location_data": chunk, "tourist_id": "tourist_1"}])[0]
+        assert result["score"] == pytest.approx(expected["score"], abs=1e-12)
+
+
+def without_timestamps(result):
+    if isinstance(result, dict):
+        return {key: without_timestamps(value) for key, value in result.items() if key != "timestamp"}
+    return result
+
+
+BAD_WINDOW = [{"latitude": 27.17, "longitude": 78.04, "timestamp": "not a time"}] * 2
+
+
+def test_many_inactivity_requests_match_single_calls(frozen_engine, windows):
+    requests = [{"location_data": list(reversed(window)) if index % 2 else window, "threshold_minutes": 10 + index}
+                for index, window in enumerate(windows)]
+    requests += [{"location_data": windows[0][:1]}, {"location_data": BAD_WINDOW}]
+
+    results = frozen_engine.detect_prolonged_inactivity_many(requests)
+
+    assert isinstance(results[-1], ValueError)
+    for entry, result in zip(requests[:-1], results):
+        single = frozen_engine.detect_prolonged_inactivity(entry["location_data"], entry.get("threshold_minutes", 30))
+        assert without_timestamps(result) == without_timestamps(single)
+
+
+def test_many_route_requests_match_single_calls_and_compile_each_plan_once(frozen_engine, monkeypatch):
+    import anomaly_detection
+
+    rng = np.random.default_rng(5)
+    plans = [itinerary(rng) for _ in range(2)]
+    requests = [{"current_path": path_along(rng, planned, 20, deviation_deg=deviation), "planned_itinerary": planned}
+                for planned in plans for deviation in (0.0, 0.003)]
+    requests += [{"current_path": requests[0]["current_path"], "itinerary_id": "unknown"},
+                 {"current_path": BAD_WINDOW[:1], "planned_itinerary": plans[0]}]
+    compiled = []
+
+    class CountingRouteIndex(anomaly_detection.RouteIndex):
+        def __init__(self, *args, **kwargs):
+            compiled.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(anomaly_detection, 'RouteIndex', CountingRouteIndex)
+    results = frozen_engine.detect_route_deviation_many(requests)
+
+    assert len(compiled) == 2
+    for entry, result in zip(requests, results):
+        single = frozen_engine.detect_route_deviation(entry["current_path"], entry.get("planned_itinerary"),
+                                                      entry.get("itinerary_id"))
+        assert without_timestamps(result) == without_timestamps(single)
+
+
+@pytest.mark.parametrize('engine_fixture', ['frozen_engine', 'refit_engine'])
+def test_many_detect_all_requests_match_single_calls(request, engine_fixture, windows):
+    engine = request.getfixturevalue(engine_fixture)
+    rng = np.random.default_rng(9)
+    planned = itinerary(rng)
+    requests = [{"location_data": window, "threshold_minutes": 20} for window in windows]
+    requests += [{"location_data": path_along(rng, planned, 30, deviation_deg=deviation), "planned_itinerary": planned}
+                 for deviation in (0.0, 0.002)]
+    requests.append({"location_data": BAD_WINDOW})
+
+    results = engine.detect_all_many(requests)
+
+    assert isinstance(results[-1], ValueError)
+    for entry, result in zip(requests[:-1], results):
+        single = engine.detect_all(entry["location_data"], entry.get("planned_itinerary"),
+                                   threshold_minutes=entry.get("threshold_minutes", 30))
+        assert without_timestamps(result) == without_timestamps(single)
+
+
+def test_many_detect_all_streaming_requests_match_single_calls(make_engine):
+    window = trajectory(np.random.default_rng(3), 30)
+    batched, single = make_engine('batched'), make_engine('single')
+
+    for end in range(5, 31, 5):
+        chunk = window[end - 5:end]
+        expected = single.detect_all(chunk, tourist_id="tourist_1")
+        result = batched.detect_all_many([{"location_data": chunk, "tourist_id": "tourist_1"}])[0]
+        assert without_timestamps(result) == without_timestamps(expected)
+
+
+def test_many_detect_all_requests_use_the_result_cache(make_engine, windows):
+    engine = make_engine(scoring_mode='frozen', cache_size=100)
+    requests = [{"location_data": window} for window in windows]
+
+    first = engine.detect_all_many(requests)
+    second = engine.detect_all_many(requests)
+
+    assert engine.result_cache.counters['hits'] == len(windows)
+    assert [without_timestamps(result) for result in second] == [without_timestamps(result) for result in first]
@@ -0,0 +1,80 @@
+"""
+Crowd positions expire, and every site is clustered around its own origin
+"""
+
+import numpy as np
+import pytest
+
+from crowd_density import CrowdDensityMonitor, METRES_PER_DEGREE, SiteCrowdMonitors
+
+TAJ_MAHAL = (27.175015, 78.042155)
+GATEWAY_OF_INDIA = (18.921984, 72.834654)
+
+
+def gather(monitor, centre, size, prefix, now=0.0, spread_m=5.0, seed=0):
+    rng = np.random.default_rng(seed)
+    for index in range(size):
+        monitor.update(f"{prefix}_{index}",
+                       centre[0] + rng.normal(0, spread_m / METRES_PER_DEGREE),
+                       centre[1] + rng.normal(0, spread_m / METRES_PER_DEGREE), now=now)
+
+
+def test_stale_positions_expire_on_update():
+    monitor = CrowdDensityMonitor(max_age_seconds=60)
+    gather(monitor, TAJ_MAHAL, 80, "early", now=0.0)
+    gather(monitor, TAJ_MAHAL, 10, "late", now=30.0)
+
+    monitor.update("early_0", *TAJ_MAHAL, now=70.0)
+
+    assert sorted(monitor.positions)[:2] == ["early_0", "late_0"]
+    assert len(monitor.positions) == 11
+    assert monitor.expired == 79
+    assert sum(totals[0] for totals in monitor.cells.values()) == 11
+
+
+def test_stale_positions_expire_before_clustering():
+    monitor = CrowdDensityMonitor(max_age_seconds=60)
+    gather(monitor, TAJ_MAHAL, 80, "tourist", now=0.0)
+
+    assert monitor.hotspots(now=30.0)['clusters'][0]['size'] == 80
+    result = monitor.hotspots(now=61.0)
+
+    assert result['clusters'] == []
+    assert result['tourists'] == 0
+    assert not monitor.cells
+
+
+def test_each_site_clusters_around_its_own_origin():
+    sites = SiteCrowdMonitors()
+    gather(sites, GATEWAY_OF_INDIA, 60, "mumbai")
+    gather(sites, TAJ_MAHAL, 120, "agra", seed=1)
+
+    result = sites.hotspots(now=1.0)
+
+    assert result['sites'] == 2
+    assert [cluster['size'] for cluster in result['clusters']] == [120, 60]
+    for cluster, centre in zip(result['clusters'], (TAJ_MAHAL, GATEWAY_OF_INDIA)):
+        assert cluster['centroid']['latitude'] == pytest.approx(centre[0], abs=1e-5)
+        assert cluster['centroid']['longitude'] == pytest.approx(centre[1], abs=1e-5)
+        assert abs(cluster['site']['latitude'] - centre[0]) <= 0.25
+
+
+def test_tourist_moving_site_leaves_the_previous_one():
+    sites = SiteCrowdMonitors()
+    sites.update("tourist_1", *TAJ_MAHAL, now=0.0)
+    sites.update("tourist_1", *GATEWAY_OF_INDIA, now=1.0)
+
+    assert sites.hotspots(now=2.0)['tourists'] == 1
+    assert len(sites.monitors) == 1
+    assert sites.remove("tourist_1")
+    assert not sites.remove("tourist_1")
+
+
+def test_expired_sites_are_dropped():
+    sites = SiteCrowdMonitors(max_age_seconds=60)
+    gather(sites, TAJ_MAHAL, 10, "tourist", now=0.0)
+
+    result = sites.hotspots(now=61.0)
+
+    assert result['tourists'] == 0
+    assert not sites.monitors and not sites.sites
@@ -0,0 +1,89 @@
+"""
+The single-pass /detect/all gives the same results as calling each detector
+"""
+
+import numpy as np
+import pytest
+
+from anomaly_detection import combined_risk
+from benchmarks.synthetic import itinerary, path_along, trajectory
+
+
+def assert_same(result, single):
+    assert result["anomaly"] == single["anomaly"]
+    assert result["score"] == pytest.approx(single["score"], abs=1e-9)
+    assert result["confidence"] == pytest.approx(single["confidence"], abs=1e-9)
+
+
+def single_calls(engine, window, planned=None, tourist_id=None, threshold_minutes=30):
+    results = {
+        "location_dropoff": engine.detect_location_dropoff(window, tourist_id=tourist_id),
+        "prolonged_inactivity": engine.detect_prolonged_inactivity(window, threshold_minutes, tourist_id=tourist_id),
+        "route_deviation": None,
+    }
+    if planned is not None:
+        results["route_deviation"] = engine.detect_route_deviation(window, planned, tourist_id=tourist_id)
+    return results
+
+
+@pytest.mark.parametrize('engine_fixture', ['frozen_engine', 'refit_engine'])
+@pytest.mark.parametrize('with_route', [False, True])
+def test_detect_all_matches_single_calls(request, engine_fixture, with_route):
+    engine = request.getfixturevalue(engine_fixture)
+    rng = np.random.default_rng(13)
+    planned = itinerary(rng)
+    windows = [path_along(rng, planned, 30, deviation_deg=deviation) for deviation in (0.0, 0.002)]
+    windows += [trajectory(rng, 40, gap_probability=0.1), trajectory(rng, 1)]
+
+    for window in windows:
+        result = engine.detect_all(window, planned if with_route else None, threshold_minutes=20)
+        singles = single_calls(engine, window, planned if with_route else None, threshold_minutes=20)
+
+        for name, single in singles.items():
+            if single is None:
+                assert result[name] is None
+            else:
+                assert_same(result[name], single)
+        expected = combined_risk(singles)
+        assert result["risk_score"] == pytest.approx(expected["risk_score"], abs=1e-9)
+        assert result["risk_level"] == expected["risk_level"]
+        assert result["anomalies"] == expected["anomalies"]
+
+
+def test_detect_all_sorts_the_window(frozen_engine):
+    rng = np.random.default_rng(17)
+    planned = itinerary(rng)
+    window = path_along(rng, planned, 30, deviation_deg=0.001)
+
+    result = frozen_engine.detect_all(list(reversed(window)), planned)
+
+    for name, single in single_calls(frozen_engine, window, planned).items():
+        assert_same(result[name], single)
+
+
+def test_simplified_detect_all_matches_single_calls(make_engine):
+    engine = make_engine(simplify_tolerance_m=10.0)
+    window = trajectory(np.random.default_rng(19), 50)
+
+    result = engine.detect_all(window)
+
+    for name, single in single_calls(engine, window).items():
+        if single is not None:
+            assert_same(result[name], single)
+
+
+def test_streaming_detect_all_matches_single_calls(make_engine):
+    rng = np.random.default_rng(23)
+    planned = itinerary(rng)
+    window = path_along(rng, planned, 30, deviation_deg=0.002)
+    combined, single = make_engine('combined'), make_engine('single')
+
+    for end in range(5, 31, 5):
+        chunk = window[end - 5:end]
+        result = combined.detect_all(chunk, planned, itinerary_id="route_1", tourist_id="tourist_1")
+        expected = single_calls(single, chunk, None, tourist_id="tourist_1")
+        expected["route_deviation"] = single.detect_route_deviation(chunk, planned, itinerary_id="route_1",
+                                                                    tourist_id="tourist_1")
+
+        for name, value in expected.items():
+            assert_same(result[name], value)
@@ -0,0 +1,56 @@
+"""
+Frozen scaler and compiled forest against the fitted scikit-learn objects
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from fast_scoring import CompiledForest, FrozenScaler
+
+
+@pytest.fixture(scope='module')
+def data():
+    rng = np.random.default_rng(1)
+    train = rng.normal(0, 1, (2000, 5)) * [1e-3, 1e-3, 300, 50, 2] + [27.17, 78.04, 120, 40, 1]
+    test = np.vstack((rng.normal(0, 1, (500, 5)) * [1e-3, 1e-3, 300, 50, 2] + [27.17, 78.04, 120, 40, 1],
+                      rng.normal(0, 10, (100, 5)) * [1e-3, 1e-3, 300, 50, 2] + [27.17, 78.04, 120, 40, 1]))
+    return train, test
+
+
+@pytest.mark.parametrize('with_mean, with_std', [(True, True), (False, True), (True, False)])
+def test_frozen_scaler_matches_standard_scaler(data, with_mean, with_std):
+    train, test = data
+    scaler = StandardScaler(with_mean=with_mean, with_std=with_std).fit(train)
+
+    # x * scale + offset rounds differently from (x - mean) / scale near the mean
+    np.testing.assert_allclose(FrozenScaler(scaler).transform(test), scaler.transform(test), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {"max_samples": 64, "n_estimators": 50},
+    {"max_features": 3, "contamination": 0.05},
+])
+def test_compiled_forest_matches_isolation_forest(data, options):
+    train, test = data
+    scaler = StandardScaler().fit(train)
+    model = IsolationForest(random_state=42, **options).fit(scaler.transform(train))
+    scaled = FrozenScaler(scaler).transform(test)
+
+    compiled = CompiledForest(model)
+
+    np.testing.assert_allclose(compiled.decision_function(scaled), model.decision_function(scaled), atol=1e-12)
+    np.testing.assert_allclose(compiled.decision_function(scaled) + model.offset_, model.score_samples(scaled),
+                               atol=1e-12)
+
+
+def test_compiled_forest_scores_single_rows(data):
+    train, test = data
+    model = IsolationForest(random_state=0).fit(train)
+    compiled = CompiledForest(model)
+
+    for row in test[:20]:
+        assert compiled.decision_function(row[None, :])[0] == pytest.approx(model.decision_function(row[None, :])[0],
+                                                                           abs=1e-12)
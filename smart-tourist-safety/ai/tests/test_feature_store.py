@@ -0,0 +1,73 @@
+"""
+Streaming ring-buffer features against the DataFrame preprocessing they replace
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import trajectory
+from feature_store import TouristFeatureStore
+from geo_kernels import haversine
+
+
+def dataframe_features(location_data):
+    """preprocess_location_data as it was built on pandas, with great-circle distances"""
+    df = pd.DataFrame(location_data)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.sort_values('timestamp')
+    df['time_diff'] = df['timestamp'].diff().dt.total_seconds().fillna(0)
+    df['distance'] = pd.Series(haversine(df['latitude'].shift(), df['longitude'].shift(),
+                                         df['latitude'], df['longitude']), index=df.index).fillna(0)
+    df['speed'] = df['distance'] / (df['time_diff'] + 1e-6)
+    df = df.iloc[1:].reset_index(drop=True)
+    return df[['latitude', 'longitude', 'time_diff', 'distance', 'speed']].values
+
+
+@pytest.fixture
+def window():
+    return trajectory(np.random.default_rng(5), 40)
+
+
+def test_track_matches_dataframe_features(window):
+    track = TouristFeatureStore().update("tourist_1", window)
+
+    np.testing.assert_allclose(track.features(), dataframe_features(window), rtol=1e-9)
+    np.testing.assert_allclose(track.latest_features(), dataframe_features(window)[-1], rtol=1e-9)
+    assert track.max_time_gap() == pytest.approx(dataframe_features(window)[:, 2].max())
+
+
+def test_overlapping_chunks_match_one_update(window):
+    store = TouristFeatureStore()
+    for end in range(10, 41, 10):
+        track = store.update("tourist_1", list(reversed(window[max(0, end - 15):end])))
+
+    np.testing.assert_allclose(track.features(), dataframe_features(window), rtol=1e-9)
+
+
+def test_full_buffer_keeps_the_latest_points(window):
+    track = TouristFeatureStore(window_size=16).update("tourist_1", window)
+
+    np.testing.assert_allclose(track.features(), dataframe_features(window[-16:]), rtol=1e-9)
+
+
+def test_least_recently_updated_tracks_are_evicted(window):
+    store = TouristFeatureStore(max_tourists=3)
+    for tourist in range(4):
+        store.update(f"tourist_{tourist}", window[:2])
+    store.update("tourist_1", window[2:3])
+    store.update("tourist_4", window[:2])
+
+    assert sorted(store.tracks) == ["tourist_1", "tourist_3", "tourist_4"]
+    assert store.evictions == 2
+
+
+def test_idle_tracks_are_evicted(window):
+    store = TouristFeatureStore(idle_seconds=60)
+    store.update("tourist_1", window[:2])
+    store.get("tourist_1").touched -= 61
+
+    store.update("tourist_2", window[:2])
+
+    assert store.get("tourist_1") is None
+    assert len(store) == 1
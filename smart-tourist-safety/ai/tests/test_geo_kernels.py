@@ -0,0 +1,51 @@
+"""
+The padded batch kernel gives every trajectory the features it gets alone,
+and leaves the padding at zero
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import trajectory
+from geo_kernels import EARTH_RADIUS_M, haversine, padded_trajectory_features, trajectory_features
+from timestamps import parse_epoch_ms
+
+
+def test_haversine_matches_known_distances():
+    assert haversine(0.0, 0.0, 1.0, 0.0) == pytest.approx(math.pi * EARTH_RADIUS_M / 180)
+    assert haversine(27.175, 78.042, 27.175, 78.042) == 0.0
+    assert haversine(0.0, 0.0, 0.0, 180.0) == pytest.approx(math.pi * EARTH_RADIUS_M)
+
+
+def test_padded_batch_matches_each_trajectory_alone():
+    rng = np.random.default_rng(5)
+    lengths = np.array([5, 1, 0, 12, 2, 7])
+    windows = [trajectory(rng, length) if length else [] for length in lengths]
+
+    # Padding holds garbage, which must not leak into the features
+    shape = (len(lengths), lengths.max())
+    latitude, longitude, seconds = np.full(shape, np.nan), np.full(shape, 1e9), np.full(shape, -1.0)
+    for row, window in enumerate(windows):
+        latitude[row, :len(window)] = [p['latitude'] for p in window]
+        longitude[row, :len(window)] = [p['longitude'] for p in window]
+        if window:
+            seconds[row, :len(window)] = parse_epoch_ms([p['timestamp'] for p in window]) / 1000.0
+
+    features = padded_trajectory_features(latitude, longitude, seconds, lengths)
+
+    padding = np.arange(shape[1]) >= lengths[:, None]
+    for name, values in features.items():
+        assert values.shape == shape
+        assert not values[padding].any(), name
+    for row, length in enumerate(lengths):
+        if not length:
+            continue
+        lat, lon, sec = latitude[row, :length], longitude[row, :length], seconds[row, :length]
+        expected_distance = [0.0] + [haversine(lat[i - 1], lon[i - 1], lat[i], lon[i]) for i in range(1, length)]
+        np.testing.assert_allclose(features["distance"][row, :length], expected_distance, rtol=1e-12, atol=1e-9)
+        np.testing.assert_allclose(features["time_diff"][row, :length], np.diff(sec, prepend=sec[0]))
+        alone = trajectory_features(lat, lon, sec)
+        for name, values in alone.items():
+            np.testing.assert_allclose(features[name][row, :length], values, rtol=1e-12, atol=1e-9, err_msg=name)
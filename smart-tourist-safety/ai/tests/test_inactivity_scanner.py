@@ -0,0 +1,48 @@
+"""
+Inactivity scanner flagging and forgetting
+"""
+
+import numpy as np
+
+from benchmarks.synthetic import trajectory
+from inactivity_scanner import InactivityScanner
+
+
+def test_silent_tourists_are_flagged_once():
+    scanner = InactivityScanner(threshold_minutes=30)
+    scanner.touch("tourist_1", 0.0)
+    scanner.touch("tourist_2", 0.0)
+    scanner.touch("tourist_2", 1500.0)
+
+    assert [alert["tourist_id"] for alert in scanner.scan(now=1900.0)] == ["tourist_1"]
+    assert scanner.scan(now=2000.0) == []
+    assert [alert["tourist_id"] for alert in scanner.scan(now=3400.0)] == ["tourist_2"]
+
+    scanner.touch("tourist_1", 4000.0)
+    assert [alert["tourist_id"] for alert in scanner.inactive()] == ["tourist_2"]
+    assert [alert["tourist_id"] for alert in scanner.scan(now=5900.0)] == ["tourist_1"]
+
+
+def test_flagged_tourists_are_forgotten_after_a_long_silence():
+    scanner = InactivityScanner(threshold_minutes=30, forget_after_minutes=120)
+    scanner.touch("tourist_1", 0.0)
+    scanner.touch("tourist_2", 0.0)
+    scanner.scan(now=1900.0)
+    scanner.touch("tourist_2", 3000.0)
+
+    scanner.scan(now=7300.0)
+
+    assert list(scanner.last_seen) == ["tourist_2"]
+    assert [alert["tourist_id"] for alert in scanner.inactive()] == ["tourist_2"]
+    assert scanner.status()["forgotten"] == 1
+
+
+def test_engine_forgets_all_state_of_a_tourist(frozen_engine):
+    scanner = frozen_engine.enable_inactivity_scanner(tick_seconds=3600)
+    frozen_engine.detect_location_dropoff(trajectory(np.random.default_rng(4), 10), tourist_id="tourist_1")
+
+    assert frozen_engine.forget_tourist("tourist_1")
+    assert frozen_engine.feature_store.get("tourist_1") is None
+    assert "tourist_1" not in scanner.last_seen
+    assert not frozen_engine.forget_tourist("tourist_1")
+    scanner.stop()
@@ -0,0 +1,97 @@
+"""
+The micro-batcher groups concurrent requests within its size and wait caps
+and resolves every caller with its own result
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        yield pool
+
+
+def recording(batches):
+    def batch_fn(payloads):
+        batches.append(list(payloads))
+        return [payload * 10 for payload in payloads]
+    return batch_fn
+
+
+def test_concurrent_requests_are_scored_in_one_batch(executor):
+    batches = []
+    batcher = MicroBatcher(recording(batches), executor, max_batch_size=64, max_wait_ms=20)
+
+    async def burst():
+        return await asyncio.gather(*(batcher.submit(payload) for payload in range(5)))
+
+    assert asyncio.run(burst()) == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2, 3, 4]]
+    assert batcher.stats == {"requests": 5, "batches": 1, "largest_batch": 5}
+
+
+def test_batches_never_exceed_the_size_cap(executor):
+    batches = []
+    batcher = MicroBatcher(recording(batches), executor, max_batch_size=4, max_wait_ms=300)
+
+    async def burst():
+        return await asyncio.gather(*(batcher.submit(payload) for payload in range(10)))
+
+    started = time.monotonic()
+    assert asyncio.run(burst()) == [payload * 10 for payload in range(10)]
+
+    # Full batches go at once; only the two left over wait for the timer
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert batcher.stats['largest_batch'] == 4
+    assert time.monotonic() - started >= 0.25
+
+
+def test_a_lone_request_is_flushed_after_the_wait_cap(executor):
+    batches = []
+    batcher = MicroBatcher(recording(batches), executor, max_batch_size=64, max_wait_ms=50)
+
+    async def alone():
+        started = time.monotonic()
+        result = await batcher.submit(7)
+        return result, time.monotonic() - started
+
+    result, waited = asyncio.run(alone())
+
+    assert result == 70
+    assert 0.04 <= waited < 1.0
+    assert batches == [[7]]
+    assert batcher.flush_handle is None
+
+
+def test_an_error_fails_only_its_own_caller(executor):
+    def batch_fn(payloads):
+        return [ValueError(f"bad {payload}") if payload == 2 else payload for payload in payloads]
+
+    batcher = MicroBatcher(batch_fn, executor, max_batch_size=4, max_wait_ms=20)
+
+    async def burst():
+        return await asyncio.gather(*(batcher.submit(payload) for payload in range(4)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+
+    assert results[:2] == [0, 1] and results[3] == 3
+    assert isinstance(results[2], ValueError) and str(results[2]) == "bad 2"
+
+
+def test_a_failed_batch_call_fails_every_caller_of_that_batch(executor):
+    def batch_fn(payloads):
+        raise RuntimeError("engine down")
+
+    batcher = MicroBatcher(batch_fn, executor, max_batch_size=2, max_wait_ms=20)
+
+    async def burst():
+        return await asyncio.gather(*(batcher.submit(payload) for payload in range(2)), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(burst())] == ["engine down", "engine down"]
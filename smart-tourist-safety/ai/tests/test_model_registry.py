@@ -0,0 +1,135 @@
+"""
+Registry versions are numbered without collisions, verified on load, loaded
+memory-mapped, and swapped into the engine as whole bundles
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import model_registry
+from benchmarks.synthetic import trajectory
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def trained(frozen_engine):
+    return frozen_engine.models
+
+
+def test_versions_count_up_and_latest_follows(tmp_path, trained):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+
+    assert registry.latest_version() is None
+    assert [registry.publish(trained) for _ in range(3)] == ['v000001', 'v000002', 'v000003']
+    assert registry.versions() == ['v000001', 'v000002', 'v000003']
+    assert registry.latest_version() == 'v000003'
+    assert registry.load().version == 'v000003'
+
+
+def test_latest_falls_back_to_the_newest_version_and_is_honoured_when_older(tmp_path, trained):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    registry.publish(trained)
+    registry.publish(trained)
+
+    with open(os.path.join(registry.root, 'LATEST'), 'w') as latest_file:
+        latest_file.write('v000001')
+    assert registry.load().version == 'v000001'
+
+    os.remove(os.path.join(registry.root, 'LATEST'))
+    assert registry.latest_version() == 'v000002'
+
+
+def test_concurrent_publishes_get_distinct_versions(tmp_path, trained):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        versions = list(pool.map(lambda _: registry.publish(trained), range(6)))
+
+    assert sorted(versions) == [f"v{number:06d}" for number in range(1, 7)]
+    assert registry.latest_version() == 'v000006'
+    assert [registry.metadata(version)['version'] for version in versions] == versions
+
+
+def test_a_version_claimed_by_another_process_is_skipped(tmp_path, trained, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    registry.publish(trained)
+    # Another process renamed its v000002 into place after this one listed the versions
+    os.makedirs(os.path.join(registry.root, 'v000002'))
+    with open(os.path.join(registry.root, 'v000002', 'other'), 'w'):
+        pass
+    monkeypatch.setattr(registry, 'versions', lambda: ['v000001'])
+
+    assert registry.publish(trained) == 'v000003'
+    assert registry.metadata('v000003')['version'] == 'v000003'
+    assert os.listdir(os.path.join(registry.root, 'v000002')) == ['other']
+    assert not [name for name in os.listdir(registry.root) if name.startswith('.')]
+
+
+def test_a_failed_publish_leaves_no_version_behind(tmp_path, trained, monkeypatch):
+    import joblib
+
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+
+    def broken_dump(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(joblib, 'dump', broken_dump)
+    with pytest.raises(OSError):
+        registry.publish(trained)
+
+    assert os.listdir(registry.root) == []
+    assert registry.latest_version() is None
+
+
+def test_corrupted_files_fail_the_checksum(tmp_path, trained):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    version = registry.publish(trained)
+    with open(os.path.join(registry.root, version, 'scaler.joblib'), 'ab') as model_file:
+        model_file.write(b'\0')
+
+    with pytest.raises(ValueError, match="Checksum mismatch for scaler"):
+        registry.load(version)
+    assert registry.load(version, components=model_registry.ModelBundle.SCORING_COMPONENTS).version == version
+
+
+def test_arrays_load_memory_mapped_and_score_the_same(tmp_path, trained):
+    registry = ModelRegistry(str(tmp_path / 'registry'))
+    version = registry.publish(trained)
+
+    mapped = registry.load(version)
+    copied = registry.load(version, mmap_mode=None)
+
+    assert isinstance(mapped.compiled_dropoff_model.threshold, np.memmap)
+    assert not isinstance(copied.compiled_dropoff_model.threshold, np.memmap)
+    rows = np.random.default_rng(0).normal(size=(20, 5))
+    np.testing.assert_array_equal(mapped.compiled_dropoff_model.decision_function(rows),
+                                  trained.compiled_dropoff_model.decision_function(rows))
+
+
+def test_activation_swaps_the_whole_bundle(frozen_engine):
+    window = trajectory(np.random.default_rng(4), 20)
+    expected = frozen_engine.detect_location_dropoff(window)['score']
+    before = frozen_engine.models
+
+    version = frozen_engine.publish_models({"note": "test"})['version']
+    result = frozen_engine.activate_models(version)
+
+    assert result['status'] == 'success'
+    assert frozen_engine.models is not before
+    assert frozen_engine.model_version == version
+    assert frozen_engine.models.metadata['note'] == 'test'
+    assert all(getattr(frozen_engine.models, name) is not None for name in model_registry.ModelBundle.COMPONENTS)
+    assert frozen_engine.detect_location_dropoff(window)['score'] == pytest.approx(expected, abs=1e-12)
+
+
+def test_a_failed_activation_keeps_the_current_bundle(frozen_engine):
+    before = frozen_engine.models
+
+    result = frozen_engine.activate_models('v999999')
+
+    assert result['status'] == 'error'
+    assert frozen_engine.models is before
+    assert frozen_engine.reload_status['state'] == 'failed'
@@ -0,0 +1,79 @@
+"""
+Online refresh: anomalous rows stay out of the refit, and swaps are versioned
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import trajectory
+from online_refresh import OnlineRefresher
+
+
+@pytest.fixture
+def normal_rows(frozen_engine, training_data):
+    return np.vstack([frozen_engine.preprocess_location_data(window)
+                      for window in training_data['location_data']])
+
+
+def outliers(normal_rows, count):
+    rows = normal_rows[:count].copy()
+    rows[:, 2] = 50000.0  # Hours without a report
+    rows[:, 3] = 20000.0  # Tens of kilometres away
+    return rows
+
+
+def test_anomalous_rows_are_left_out_of_the_refit(frozen_engine, normal_rows):
+    refresher = OnlineRefresher(frozen_engine, reservoir_size=24 * 5000, min_rows=100)
+    refresher.observe(normal_rows)
+    refresher.observe(outliers(normal_rows, 500))
+
+    result = refresher.refresh_now()
+
+    assert result['status'] == 'success'
+    assert result['excluded_rows'] >= 500
+    assert result['rows'] + result['excluded_rows'] == len(normal_rows) + 500
+    assert frozen_engine.models.scaler.mean_[2] < 1000
+
+
+def test_refreshed_models_are_versioned(frozen_engine, normal_rows):
+    frozen_engine.publish_models()
+    frozen_engine.activate_models()
+    refresher = OnlineRefresher(frozen_engine, min_rows=100)
+    refresher.observe(normal_rows)
+
+    first = refresher.refresh_now()
+    second = refresher.refresh_now()
+
+    assert first['version'] == 'v000001+refresh1'
+    assert second['version'] == frozen_engine.model_version == 'v000001+refresh2'
+    assert refresher.status['last_version'] == 'v000001+refresh2'
+
+
+def test_refresh_does_not_overwrite_an_activation(frozen_engine, normal_rows):
+    frozen_engine.publish_models()
+    refresher = OnlineRefresher(frozen_engine, min_rows=100)
+    refresher.observe(normal_rows)
+
+    def activate_meanwhile(models, sample):
+        frozen_engine.activate_models()
+        return np.zeros(len(sample), dtype=bool)
+    refresher._anomalous = activate_meanwhile
+
+    assert refresher.refresh_now()['status'] == 'skipped'
+    assert frozen_engine.model_version == 'v000001'
+
+
+def test_refreshes_on_unchanged_traffic_keep_the_flag_rate(frozen_engine):
+    def traffic(seed):
+        rng = np.random.default_rng(seed)
+        return np.vstack([frozen_engine.preprocess_location_data(trajectory(rng, 60)) for _ in range(40)])
+
+    fresh = traffic(1000)
+    refresher = OnlineRefresher(frozen_engine, min_rows=100)
+    rates = [OnlineRefresher._anomalous(frozen_engine.models, fresh).mean()]
+    for cycle in range(6):
+        refresher.observe(traffic(cycle))
+        assert refresher.refresh_now()['status'] == 'success'
+        rates.append(OnlineRefresher._anomalous(frozen_engine.models, fresh).mean())
+
+    assert all(abs(rate - rates[0]) < 0.05 for rate in rates), rates
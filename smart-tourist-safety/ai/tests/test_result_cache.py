@@ -0,0 +1,89 @@
+"""
+The result cache counts hits and misses, expires and evicts entries, hands out
+independent copies, and is cleared when the models change
+"""
+
+import numpy as np
+
+import result_cache
+from benchmarks.synthetic import trajectory
+from result_cache import ResultCache, content_key
+
+
+RESULT = {"anomaly": False, "score": 0.1, "timestamp": "2025-09-08T10:00:00",
+          "route_deviation": {"score": 0.2, "timestamp": "2025-09-08T10:00:00"}, "anomalies": ["a"]}
+
+
+def test_hits_and_misses_are_counted():
+    cache = ResultCache(max_size=10)
+
+    assert cache.get("key") is None
+    cache.put("key", RESULT)
+    assert cache.get("key")["score"] == 0.1
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    cache = ResultCache(max_size=10, ttl_seconds=30)
+    cache.put("key", RESULT)
+
+    now[0] += 29
+    assert cache.get("key") is not None
+    now[0] += 2
+    assert cache.get("key") is None
+    assert cache.counters["expired"] == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_the_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_size=2)
+    cache.put("a", RESULT)
+    cache.put("b", RESULT)
+    cache.get("a")
+    cache.put("c", RESULT)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.counters["evictions"] == 1
+
+
+def test_hits_are_deep_copies_with_fresh_timestamps():
+    cache = ResultCache(max_size=10)
+    stored = {**RESULT, "route_deviation": dict(RESULT["route_deviation"]), "anomalies": list(RESULT["anomalies"])}
+    cache.put("key", stored)
+    stored["route_deviation"]["score"] = 9.0
+
+    hit = cache.get("key")
+    hit["route_deviation"]["score"] = 5.0
+    hit["anomalies"].append("b")
+
+    again = cache.get("key")
+    assert again["route_deviation"]["score"] == 0.2
+    assert again["anomalies"] == ["a"]
+    assert again["timestamp"] != RESULT["timestamp"]
+    assert again["route_deviation"]["timestamp"] == again["timestamp"]
+
+
+def test_swapping_models_invalidates_the_cache(make_engine):
+    engine = make_engine(scoring_mode='frozen', cache_size=100)
+    window = trajectory(np.random.default_rng(2), 20)
+
+    engine.detect_location_dropoff(window)
+    engine.detect_location_dropoff(window)
+    assert engine.result_cache.counters["hits"] == 1
+
+    engine.swap_models(engine.models)
+    assert engine.result_cache.stats()["size"] == 0
+    assert engine.result_cache.counters["invalidations"] >= 1
+
+    engine.detect_location_dropoff(window)
+    assert engine.result_cache.counters["hits"] == 1
+
+
+def test_keys_depend_on_content_not_key_order():
+    assert content_key({"a": 1, "b": 2}) == content_key({"b": 2, "a": 1})
+    assert content_key("route", [1, 2]) != content_key("route", [2, 1])
@@ -0,0 +1,76 @@
+"""
+Route index cache and corridor state bookkeeping
+"""
+
+import numpy as np
+
+from benchmarks.synthetic import itinerary, path_along
+from route_index import CorridorTracker, RouteIndex, RouteIndexCache
+
+
+def test_cached_route_is_reused_until_its_points_change():
+    rng = np.random.default_rng(2)
+    planned, edited = itinerary(rng), itinerary(rng)
+    cache = RouteIndexCache()
+
+    first = cache.get("itinerary_1", planned)
+    assert cache.get("itinerary_1") is first
+    assert cache.get("itinerary_1", [dict(point) for point in planned]) is first
+
+    rebuilt = cache.get("itinerary_1", edited)
+    assert rebuilt is not first
+    assert cache.get("itinerary_1") is rebuilt
+    path = path_along(rng, edited, 20)
+    latitude = np.array([p['latitude'] for p in path])
+    longitude = np.array([p['longitude'] for p in path])
+    np.testing.assert_allclose(rebuilt.distances(latitude, longitude),
+                               RouteIndex(edited).distances(latitude, longitude))
+
+
+def test_corridor_states_are_evicted():
+    tracker = CorridorTracker(max_tourists=2, idle_seconds=60)
+    for tourist in range(3):
+        tracker.update(f"tourist_{tourist}", "itinerary_1", [0.0], [10.0])
+    assert list(tracker.states) == ["tourist_1", "tourist_2"]
+
+    tracker.states["tourist_1"]['touched'] -= 61
+    tracker.update("tourist_2", "itinerary_1", [1.0], [10.0])
+    assert list(tracker.states) == ["tourist_2"]
+
+
+def walked_off(rng, planned):
+    """A path along the route whose last three points are a kilometre off it"""
+    path = path_along(rng, planned, 20)
+    for point in path[-3:]:
+        point['latitude'] += 0.01
+    return path
+
+
+def test_route_deviation_reads_a_shuffled_path_in_time_order(frozen_engine):
+    rng = np.random.default_rng(21)
+    planned = itinerary(rng)
+    path = walked_off(rng, planned)
+    shuffled = [path[index] for index in rng.permutation(len(path))]
+
+    ordered = frozen_engine.detect_route_deviation(path, planned)
+    result = frozen_engine.detect_route_deviation(shuffled, planned)
+
+    assert ordered["route_distance_m"] > 500 and ordered["outside_corridor"]
+    for key in ("score", "length_deviation", "centroid_deviation", "route_distance_m", "consecutive_outside"):
+        assert result[key] == ordered[key], key
+
+
+def test_streaming_route_deviation_counts_exits_in_time_order(make_engine):
+    rng = np.random.default_rng(22)
+    planned = itinerary(rng)
+    path = walked_off(rng, planned)
+    ordered_engine, shuffled_engine = make_engine('ordered'), make_engine('shuffled')
+
+    for start in range(0, 20, 5):
+        chunk = path[start:start + 5]
+        expected = ordered_engine.detect_route_deviation(chunk, planned, "itinerary_1", tourist_id="tourist_1")
+        result = shuffled_engine.detect_route_deviation(chunk[::-1], planned, "itinerary_1", tourist_id="tourist_1")
+        assert result["route_distance_m"] == expected["route_distance_m"]
+        assert result["consecutive_outside"] == expected["consecutive_outside"]
+        assert result["outside_corridor"] == expected["outside_corridor"]
+    assert result["consecutive_outside"] == 3
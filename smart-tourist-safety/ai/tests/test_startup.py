@@ -0,0 +1,90 @@
+"""
+Lazy warm-up: a replica reports ready once the frozen scoring models are
+loaded, before the full models, and never before
+"""
+
+from threading import Event, Thread
+
+import pytest
+
+from anomaly_detection import AnomalyDetectionEngine
+from startup import StartupTimer
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    """GET /health/ready against the given engine and timer"""
+    import app
+
+    def get(engine, timer):
+        monkeypatch.setattr(app, 'engine', engine)
+        monkeypatch.setattr(app, 'startup', timer)
+        response = app.app.test_client().get('/health/ready')
+        return response.status_code, response.get_json()
+    return get
+
+
+@pytest.fixture
+def published(frozen_engine):
+    """Registry directory holding one published version"""
+    version = frozen_engine.publish_models()['version']
+    return frozen_engine.registry.root, version
+
+
+def gated(engine):
+    """Make the engine's registry loads wait: scoring-only loads, then full loads"""
+    gates = {"scoring": Event(), "full": Event()}
+    load = engine.registry.load
+
+    def wait_then_load(version=None, components=None, **options):
+        gates["full" if components is None else "scoring"].wait(10)
+        return load(version, components=components, **options)
+    engine.registry.load = wait_then_load
+    return gates
+
+
+def test_ready_only_once_the_scoring_models_are_loaded(published, readiness):
+    root, version = published
+    engine = AnomalyDetectionEngine(registry_dir=root, cache_size=0)
+    timer = StartupTimer(budget_seconds=10)
+    gates = gated(engine)
+    warm_up = Thread(target=engine.warm_up, args=(timer,))
+    warm_up.start()
+
+    try:
+        status, body = readiness(engine, timer)
+        assert status == 503 and body["status"] == "warming_up"
+        assert not body["startup"]["ready"]
+
+        gates["scoring"].set()
+        for _ in range(1000):
+            if timer.ready:
+                break
+            warm_up.join(0.01)
+        status, body = readiness(engine, timer)
+        assert status == 200 and body["status"] == "ready"
+        assert body["model_version"] == version
+        names = [stage["name"] for stage in body["startup"]["stages"]]
+        assert "first_score" in names and "load_full_models" not in names
+        assert engine.models.location_dropoff_model is None  # Still loading
+    finally:
+        gates["scoring"].set()
+        gates["full"].set()
+        warm_up.join(10)
+
+    status, body = readiness(engine, timer)
+    assert status == 200
+    assert [stage["name"] for stage in body["startup"]["stages"]][-2:] == ["load_full_models", "deferred_imports"]
+    assert engine.models.location_dropoff_model is not None
+
+
+def test_a_failed_warm_up_is_not_ready(published, readiness):
+    root, _ = published
+    engine = AnomalyDetectionEngine(registry_dir=root, cache_size=0)
+    timer = StartupTimer()
+
+    engine.warm_up(timer, version='v999999')
+
+    status, body = readiness(engine, timer)
+    assert status == 503 and body["status"] == "failed"
+    assert body["startup"]["error"]
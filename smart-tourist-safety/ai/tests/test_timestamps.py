@@ -0,0 +1,71 @@
+"""
+The vectorized ISO parser against to_epoch_ms, one string at a time
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from timestamps import VECTOR_MIN, parse_epoch_ms, to_epoch_ms
+
+
+@pytest.fixture(params=['UTC', 'Asia/Kolkata', 'America/New_York'])
+def local_zone(request, monkeypatch):
+    monkeypatch.setenv('TZ', request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def column(layout, start, count=200, step=timedelta(minutes=7, seconds=13, microseconds=250)):
+    return [(start + step * index).strftime(layout) for index in range(count)]
+
+
+# Across the 2025 US daylight saving changes, so naive local times change offset mid-column
+LAYOUTS = ['%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%fZ',
+           '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S+05:30', '%Y-%m-%dT%H:%M:%S-04:00']
+
+
+@pytest.mark.parametrize('layout', LAYOUTS)
+@pytest.mark.parametrize('start', [datetime(2025, 3, 9, 0, 0), datetime(2025, 11, 1, 23, 0)])
+def test_vectorized_parser_matches_to_epoch_ms(local_zone, layout, start):
+    timestamps = column(layout, start)
+
+    np.testing.assert_array_equal(parse_epoch_ms(timestamps), [to_epoch_ms(value) for value in timestamps])
+
+
+def test_offset_strings_match_pandas():
+    timestamps = column('%Y-%m-%dT%H:%M:%S.%f+05:30', datetime(2025, 9, 8)) + \
+        column('%Y-%m-%dT%H:%M:%SZ', datetime(2025, 9, 8))
+
+    expected = pd.to_datetime(timestamps, utc=True, format='ISO8601').as_unit('ms').asi8
+    np.testing.assert_array_equal(parse_epoch_ms(timestamps), expected)
+
+
+def test_naive_strings_are_local_time(local_zone):
+    offset = {'UTC': '+00:00', 'Asia/Kolkata': '+05:30', 'America/New_York': '-04:00'}[local_zone]
+    naive = column('%Y-%m-%dT%H:%M:%S', datetime(2025, 9, 8))
+
+    np.testing.assert_array_equal(parse_epoch_ms(naive), parse_epoch_ms([value + offset for value in naive]))
+
+
+def test_mixed_and_odd_columns_match_to_epoch_ms(local_zone):
+    timestamps = column('%Y-%m-%dT%H:%M:%S', datetime(2025, 9, 8), VECTOR_MIN)
+    timestamps[3] = '2025-09-08T10:00'
+    timestamps[5] = '2025-09-08T10:00:00.5+01:00'
+    timestamps[7] = 1757325600000
+    timestamps[9] = 1757325600.5
+
+    np.testing.assert_array_equal(parse_epoch_ms(timestamps), [to_epoch_ms(value) for value in timestamps])
+
+
+def test_invalid_dates_still_raise():
+    timestamps = column('%Y-%m-%dT%H:%M:%SZ', datetime(2025, 2, 1), VECTOR_MIN)
+    timestamps[-1] = '2025-02-30T10:00:00Z'
+
+    with pytest.raises(ValueError):
+        parse_epoch_ms(timestamps)
@@ -0,0 +1,91 @@
+"""
+Training from the IoT device_data table decrypts rows as the processor does
+"""
+
+import base64
+import json
+import sqlite3
+
+import pytest
+from cryptography.fernet import Fernet
+
+from training_pipeline import DeviceDataSource, TrainingPipeline, extract_chunk_features
+
+KEYS = [Fernet.generate_key().decode() for _ in range(3)]  # Versions 1 to 3 of device_1
+
+
+def token(key, latitude=27.175, minute=0, **data):
+    payload = {"data": {"latitude": latitude, "longitude": 78.042, "timestamp": 1757325600000 + minute * 60000,
+                        **data}}
+    return Fernet(key).encrypt(json.dumps(payload).encode()).decode()
+
+
+def location_rows():
+    rows = []
+    for minute in range(20):
+        # Alternately base64 of the token, as devices send it, and the bare token
+        data = token(KEYS[2 - minute % 2], 27.175 + minute * 1e-4, minute)
+        rows.append(('device_1', 'tourist_1', base64.b64encode(data.encode()).decode() if minute % 2 else data))
+    rows.append(('device_1', 'tourist_1', token(KEYS[0], minute=30)))  # Version 1, no longer accepted
+    rows.append(('device_1', 'tourist_1', 'not a token'))
+    rows.append(('device_1', 'tourist_1', Fernet(KEYS[2]).encrypt(b'{"data": {"heart_rate": 80}}').decode()))
+    rows.append(('device_2', 'tourist_2', token(Fernet.generate_key().decode())))
+    return rows
+
+
+@pytest.fixture
+def device_db(tmp_path):
+    path = tmp_path / 'iot_data.db'
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE device_registry (device_id TEXT PRIMARY KEY, tourist_id TEXT, encryption_key TEXT,
+                    registered_at INTEGER, key_version INTEGER DEFAULT 1, revision INTEGER DEFAULT 0)''')
+    conn.execute('''CREATE TABLE device_keys (device_id TEXT, version INTEGER, encryption_key TEXT,
+                    created_at INTEGER, PRIMARY KEY (device_id, version))''')
+    conn.execute('''CREATE TABLE device_data (id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT, tourist_id TEXT,
+                    data_type TEXT, data TEXT, timestamp INTEGER, processed BOOLEAN DEFAULT FALSE)''')
+    conn.execute("INSERT INTO device_registry VALUES ('device_1', 'tourist_1', ?, 0, 3, 3)", (KEYS[2],))
+    conn.executemany('INSERT INTO device_keys VALUES (?, ?, ?, 0)',
+                     [('device_1', version + 1, key) for version, key in enumerate(KEYS)])
+    conn.executemany("INSERT INTO device_data (device_id, tourist_id, data_type, data) VALUES (?, ?, 'location', ?)",
+                     location_rows())
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_rotated_keys_decrypt_and_skipped_rows_are_counted(device_db):
+    chunk = next(DeviceDataSource(device_db).chunks())
+
+    features, points, skipped = extract_chunk_features(chunk)
+
+    assert points == 20
+    assert len(features['location_dropoff']) == 19
+    assert skipped == {"unknown_device": 1, "undecryptable": 2, "incomplete": 1}
+
+
+def test_older_key_versions_can_be_accepted(device_db):
+    chunk = next(DeviceDataSource(device_db, key_versions_accepted=3).chunks())
+
+    _, points, skipped = extract_chunk_features(chunk)
+
+    assert points == 21
+    assert skipped["undecryptable"] == 1
+
+
+def test_database_before_versioned_keys_uses_the_registered_key(device_db):
+    conn = sqlite3.connect(device_db)
+    conn.execute('DROP TABLE device_keys')
+    conn.commit()
+    conn.close()
+
+    _, points, skipped = extract_chunk_features(next(DeviceDataSource(device_db).chunks()))
+
+    assert points == 10
+    assert skipped["undecryptable"] == 12
+
+
+def test_report_counts_skipped_rows(device_db):
+    _, report = TrainingPipeline(workers=1, n_jobs=1).run(DeviceDataSource(device_db, chunk_rows=10))
+
+    assert report["points"] == 20
+    assert report["skipped_rows"] == {"unknown_device": 1, "undecryptable": 2, "incomplete": 1}
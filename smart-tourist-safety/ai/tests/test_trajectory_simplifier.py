@@ -0,0 +1,108 @@
+"""
+Simplified tracks stay within the metre bound, keep stops, sharp turns and
+long gaps, and the streaming simplifier honours the same bound
+"""
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import dense_trajectory
+from geo_kernels import haversine
+from timestamps import parse_epoch_ms
+from trajectory_simplifier import METRES_PER_DEGREE, StreamingSimplifier, simplify_mask
+
+TOLERANCE_M = 10.0
+
+
+def columns(points):
+    return (np.array([p['latitude'] for p in points]), np.array([p['longitude'] for p in points]),
+            parse_epoch_ms([p['timestamp'] for p in points]) / 1000.0)
+
+
+def sed_errors(latitude, longitude, seconds, keep):
+    """Distance in metres of every point from the kept track interpolated at its time"""
+    kept = np.flatnonzero(keep)
+    interpolated_latitude = np.interp(seconds, seconds[kept], latitude[kept])
+    interpolated_longitude = np.interp(seconds, seconds[kept], longitude[kept])
+    return haversine(latitude, longitude, interpolated_latitude, interpolated_longitude)
+
+
+def walk(legs, interval_seconds=10.0, start=(27.175, 78.042)):
+    """
+    Straight legs at constant speed; each leg is (seconds, metres east, metres
+    north), and a leg of no movement is a stop
+    """
+    latitude, longitude, seconds = [start[0]], [start[1]], [0.0]
+    x_scale = np.cos(np.radians(start[0])) * METRES_PER_DEGREE
+    for duration, east, north in legs:
+        steps = int(duration / interval_seconds)
+        for step in range(1, steps + 1):
+            latitude.append(latitude[-1] + north / steps / METRES_PER_DEGREE)
+            longitude.append(longitude[-1] + east / steps / x_scale)
+            seconds.append(seconds[-1] + interval_seconds)
+    return np.array(latitude), np.array(longitude), np.array(seconds)
+
+
+def streamed(latitude, longitude, seconds, **options):
+    simplifier = StreamingSimplifier(**options)
+    emitted = []
+    for index, point in enumerate(zip(latitude, longitude, seconds)):
+        emitted += simplifier.push(*point, item=index)
+    emitted += simplifier.flush()
+    keep = np.zeros(len(latitude), dtype=bool)
+    keep[[point[3] for point in emitted]] = True
+    return keep
+
+
+@pytest.mark.parametrize('simplify', [
+    lambda *track: simplify_mask(*track, tolerance_m=TOLERANCE_M),
+    lambda *track: streamed(*track, tolerance_m=TOLERANCE_M),
+], ids=['batch', 'streaming'])
+def test_dropped_points_stay_within_the_bound(simplify):
+    for seed in range(5):
+        latitude, longitude, seconds = columns(dense_trajectory(np.random.default_rng(seed)))
+
+        keep = simplify(latitude, longitude, seconds)
+
+        assert keep[0] and keep[-1]
+        assert keep.sum() < len(keep) / 3
+        assert sed_errors(latitude, longitude, seconds, keep).max() <= TOLERANCE_M * 1.001
+
+
+@pytest.mark.parametrize('simplify', [simplify_mask, streamed], ids=['batch', 'streaming'])
+def test_stops_and_sharp_turns_are_kept(simplify):
+    # 300 m east, a ten minute stop, then 300 m north
+    latitude, longitude, seconds = walk([(300, 300, 0), (600, 0, 0), (300, 0, 300)])
+    stop_start, stop_end = 30, 90
+
+    keep = simplify(latitude, longitude, seconds, tolerance_m=TOLERANCE_M, max_gap_seconds=3600)
+
+    # The streaming simplifier may keep the next report from the same spot
+    assert keep[stop_start:stop_start + 2].any() and keep[stop_end:stop_end + 2].any()
+    assert keep.sum() <= 6
+    assert sed_errors(latitude, longitude, seconds, keep).max() <= TOLERANCE_M * 1.001
+
+
+@pytest.mark.parametrize('simplify', [simplify_mask, streamed], ids=['batch', 'streaming'])
+def test_no_kept_gap_exceeds_max_gap_seconds_and_long_gaps_are_kept(simplify):
+    # A straight walk with a 15 minute silence in the middle
+    latitude, longitude, seconds = walk([(1800, 2000, 0)])
+    seconds[100:] += 900
+
+    keep = simplify(latitude, longitude, seconds, tolerance_m=TOLERANCE_M, max_gap_seconds=300)
+
+    kept = seconds[keep]
+    gaps = np.diff(kept)
+    assert keep[99] and keep[100]
+    assert gaps[gaps != 900 + 10].max() <= 300
+
+
+def test_a_ragged_batch_matches_each_trajectory_alone():
+    tracks = [columns(dense_trajectory(np.random.default_rng(seed), minutes=minutes))
+              for seed, minutes in ((1, 20), (2, 45), (3, 5))]
+    starts = np.cumsum([0] + [len(track[0]) for track in tracks[:-1]])
+
+    keep = simplify_mask(*(np.concatenate(column) for column in zip(*tracks)), starts, tolerance_m=TOLERANCE_M)
+
+    expected = np.concatenate([simplify_mask(*track, tolerance_m=TOLERANCE_M) for track in tracks])
+    np.testing.assert_array_equal(keep, expected)
@@ -0,0 +1,91 @@
+"""
+Columnar request bodies decode to the arrays they were encoded from, and
+malformed bodies fail with a clear ValueError
+"""
+
+import json
+import struct
+
+import numpy as np
+import pytest
+
+import wire_format
+from benchmarks.synthetic import trajectory
+from wire_format import HEADER, LocationColumns, decode, encode
+
+
+@pytest.fixture
+def columns():
+    return LocationColumns.from_points(trajectory(np.random.default_rng(1), 25))
+
+
+def test_round_trip_keeps_params_and_arrays(columns):
+    other = LocationColumns([27.1], [78.0], [1757325600000])
+    request = {"tourist_id": "tourist_1", "threshold_minutes": 20,
+               "location_data": columns, "history": [other, {"nested": columns}]}
+
+    body = encode(request)
+    decoded = decode(body)
+
+    assert len(body) % 8 == 0
+    assert decoded["tourist_id"] == "tourist_1" and decoded["threshold_minutes"] == 20
+    for original, result in ((columns, decoded["location_data"]), (other, decoded["history"][0]),
+                             (columns, decoded["history"][1]["nested"])):
+        np.testing.assert_array_equal(result.latitude, original.latitude)
+        np.testing.assert_array_equal(result.longitude, original.longitude)
+        np.testing.assert_array_equal(result.timestamp_ms, original.timestamp_ms)
+
+
+def test_decoded_arrays_are_views_into_the_body(columns):
+    body = bytearray(encode({"location_data": columns}))
+
+    decoded = decode(body)["location_data"]
+
+    assert not decoded.latitude.flags.owndata
+    assert np.shares_memory(decoded.latitude, np.frombuffer(body, np.uint8))
+
+
+def test_an_empty_window_round_trips():
+    decoded = decode(encode({"location_data": LocationColumns([], [], [])}))
+
+    assert len(decoded["location_data"]) == 0
+
+
+def test_engine_scores_decoded_columns_like_points(frozen_engine):
+    points = trajectory(np.random.default_rng(2), 30)
+    decoded = decode(encode({"location_data": LocationColumns.from_points(points)}))
+
+    assert frozen_engine.detect_location_dropoff(decoded["location_data"])["score"] == \
+        pytest.approx(frozen_engine.detect_location_dropoff(points)["score"], abs=1e-12)
+
+
+@pytest.mark.parametrize('mangle, message', [
+    (lambda body: b'JSON' + body[4:], "LCOL magic"),
+    (lambda body: body[:4] + bytes([wire_format.VERSION + 1]) + body[5:], "version 2"),
+    (lambda body: body[:HEADER.size - 1], "shorter than its header"),
+    (lambda body: body[:HEADER.size + 4], "params need"),
+    (lambda body: body[:-8], "truncated"),
+    (lambda body: body[:HEADER.size + HEADER.unpack_from(body)[2] + 4], "truncated"),
+], ids=['magic', 'version', 'header', 'params', 'arrays', 'block-header'])
+def test_malformed_bodies_are_rejected(columns, mangle, message):
+    body = encode({"location_data": LocationColumns.from_points(trajectory(np.random.default_rng(3), 30))})
+
+    with pytest.raises(ValueError, match=message):
+        decode(mangle(body))
+
+
+def test_params_length_beyond_the_body_is_truncation(columns):
+    body = bytearray(encode({"location_data": columns}))
+    struct.pack_into('<I', body, 8, 1 << 20)
+
+    with pytest.raises(ValueError, match="truncated"):
+        decode(bytes(body))
+
+
+def test_a_reference_to_a_missing_block_is_rejected():
+    params = json.dumps({"location_data": {"$columns": 1}}).encode()
+    params += b' ' * (-len(params) % 8)
+    body = HEADER.pack(wire_format.MAGIC, wire_format.VERSION, len(params), 0) + params
+
+    with pytest.raises(ValueError, match="block 1 of 0"):
+        decode(body)
@@ -0,0 +1,234 @@
+"""
+Timestamp Conversion for the Anomaly Detection Engine
+The engine represents time as int64 epoch milliseconds. ISO 8601 strings are
+converted once, where requests and training data come in. parse_epoch_ms
+parses a whole column of them with NumPy digit arithmetic instead of one
+datetime or pandas parse per string. It falls back to datetime.fromisoformat
+only for strings outside the common layouts:
+    YYYY-MM-DD[T ]HH:MM:SS[.fraction][Z|+HH:MM|-HH:MM]
+
+Timestamps without a UTC offset are local wall-clock time, as the devices
+wrote them with datetime.now().isoformat(), and are converted with the
+local time zone like datetime.astimezone does. Numbers are epoch
+milliseconds, or epoch seconds below EPOCH_MS_CUTOFF (any date before 1973 in
+milliseconds, or before the year 5138 in seconds), as older clients send.
+
+iot/timestamps.py holds a copy of to_epoch_ms and its constants, since each
+service is built into its own image; iot/tests/test_shared_copies.py checks
+that the two stay identical.
+"""
+
+import numbers
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_MS_CUTOFF = 10 ** 11
+NAIVE_EPOCH = datetime(1970, 1, 1)
+VECTOR_MIN = 32  # Below this many strings, per-string parsing is cheaper
+
+# Ranges of (year, month, day, hour, minute, second, millisecond, offset minutes)
+FIELD_MIN = np.array([1, 1, 1, 0, 0, 0, 0, 0])
+FIELD_MAX = np.array([9999, 12, 31, 23, 59, 59, 999, 23 * 60 + 59])
+DATE_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+
+
+def to_epoch_ms(timestamp):
+    """
+    Convert one timestamp to epoch milliseconds
+    :param timestamp: ISO 8601 string, datetime, or epoch milliseconds/seconds
+    :return: int milliseconds since the Unix epoch (sub-millisecond parts are floored)
+    """
+    if isinstance(timestamp, numbers.Real) and not isinstance(timestamp, bool):
+        if abs(timestamp) >= EPOCH_MS_CUTOFF:
+            return int(round(timestamp))
+        return int(round(timestamp * 1000))
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.astimezone(timezone.utc)  # Naive: local wall-clock time
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def parse_epoch_ms(timestamps):
+    """
+    Vectorized to_epoch_ms over a column of timestamps
+    :param timestamps: Sequence or array of ISO strings, numbers or datetimes
+    :return: int64 array of epoch milliseconds
+    """
+    if isinstance(timestamps, np.ndarray) and timestamps.dtype.kind in 'iuf':
+        return _numbers_to_ms(timestamps)
+    timestamps = list(timestamps)
+    if not timestamps:
+        return np.zeros(0, dtype=np.int64)
+    if type(timestamps[0]) is str and len(timestamps) >= VECTOR_MIN:
+        epoch_ms = _parse_iso(timestamps)
+        if epoch_ms is not None:
+            return epoch_ms
+    elif all(isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool) for timestamp in timestamps):
+        return _numbers_to_ms(np.array(timestamps, dtype=float))
+
+    # Mixed columns, e.g. stored rows from before and after devices sent epoch milliseconds
+    strings = np.fromiter((type(timestamp) is str for timestamp in timestamps), dtype=bool, count=len(timestamps))
+    if strings.any() and not strings.all():
+        epoch_ms = np.empty(len(timestamps), dtype=np.int64)
+        for selected in (strings, ~strings):
+            epoch_ms[selected] = parse_epoch_ms([timestamps[row] for row in np.flatnonzero(selected)])
+        return epoch_ms
+    return np.array([to_epoch_ms(timestamp) for timestamp in timestamps], dtype=np.int64)
+
+
+def _numbers_to_ms(values):
+    values = values.astype(float)
+    return np.where(np.abs(values) >= EPOCH_MS_CUTOFF, np.round(values), np.round(values * 1000)).astype(np.int64)
+
+
+def _parse_iso(timestamps):
+    """
+    Parse ISO strings in the common layouts; strings of any other shape, or
+    with out-of-range fields, go through to_epoch_ms
+    :return: int64 array, or None if not every timestamp is a string
+    """
+    count = len(timestamps)
+    try:
+        text = ''.join(timestamps)
+        lengths = np.fromiter(map(len, timestamps), dtype=np.int64, count=count)
+    except TypeError:
+        return None
+    epoch_ms = np.zeros(count, dtype=np.int64)
+    parsed = np.zeros(count, dtype=bool)
+    for length in np.unique(lengths):
+        # Equally long strings are one uint8 matrix; usually they share a layout
+        if len(text) == count * length:
+            rows, group = None, text
+        else:
+            rows = np.flatnonzero(lengths == length)
+            group = ''.join([timestamps[row] for row in rows])
+        try:
+            chars = np.frombuffer(group.encode('ascii'), dtype=np.uint8).reshape(-1, length)
+        except UnicodeEncodeError:
+            continue
+        if rows is None:
+            epoch_ms, parsed = _parse_layout(chars)
+        else:
+            epoch_ms[rows], parsed[rows] = _parse_layout(chars)
+    for row in np.flatnonzero(~parsed):
+        epoch_ms[row] = to_epoch_ms(timestamps[row])
+    return epoch_ms
+
+
+def _layout(text):
+    """
+    :return: (fraction digit count, has '+HH:MM' offset) of one ISO string, or
+             None if it is not in a layout the fast path reads
+    """
+    if len(text) < 19 or text[4] != '-' or text[7] != '-' or text[10] not in 'T ' \
+            or text[13] != ':' or text[16] != ':':
+        return None
+    rest = text[19:]
+    signed_offset = len(rest) >= 6 and rest[-6] in '+-' and rest[-3] == ':'
+    if rest.endswith('Z'):
+        rest = rest[:-1]
+    elif signed_offset:
+        rest = rest[:-6]
+    if rest and not (len(rest) >= 2 and rest[0] == '.'):
+        return None
+    return max(len(rest) - 1, 0), signed_offset
+
+
+def _plan(length, fraction_digits, signed_offset):
+    """
+    Positions to check and the weights that turn one layout's digits into
+    (year, month, day, hour, minute, second, millisecond, offset minutes)
+    """
+    key = (length, fraction_digits, signed_offset)
+    plan = _PLANS.get(key)
+    if plan is not None:
+        return plan
+
+    weights = np.zeros((length, 8), dtype=np.float32)
+    fields = [(0, 4, 0), (5, 2, 1), (8, 2, 2), (11, 2, 3), (14, 2, 4), (17, 2, 5)]
+    fields.append((20, min(fraction_digits, 3), 6))
+    for start, width, field in fields:
+        for place, position in enumerate(range(start + width - 1, start - 1, -1)):
+            weights[position, field] = 10 ** place
+    weights[20:20 + min(fraction_digits, 3), 6] *= 10 ** (3 - min(fraction_digits, 3))
+    digit_positions = DATE_DIGITS + list(range(20, 20 + fraction_digits))
+    if signed_offset:
+        for position, weight in zip((length - 5, length - 4, length - 2, length - 1), (600, 60, 10, 1)):
+            weights[position, 7] = weight
+            digit_positions.append(position)
+    literal_positions = [position for position in range(length)
+                         if position not in digit_positions and not (signed_offset and position == length - 6)]
+    plan = (np.array(digit_positions), np.array(literal_positions), weights[digit_positions])
+    _PLANS[key] = plan
+    return plan
+
+
+_PLANS = {}
+
+
+def _parse_layout(chars):
+    """
+    :param chars: uint8 array (rows x length) of equally long ISO strings
+    :return: (epoch milliseconds, parsed) arrays; parsed is False for rows
+             that differ from the layout of the first row
+    """
+    count, length = chars.shape
+    layout = _layout(chars[0].tobytes().decode())
+    if layout is None:
+        return np.zeros(count, dtype=np.int64), np.zeros(count, dtype=bool)
+    digit_positions, literal_positions, weights = _plan(length, *layout)
+
+    # Every row must have digits and separators where the first row has them
+    digits = chars[:, digit_positions] - np.uint8(ord('0'))
+    ok = (digits <= 9).all(axis=1)  # uint8 wraps below '0'
+    ok &= (chars[:, literal_positions] == chars[0, literal_positions]).all(axis=1)
+
+    # All fields in one product of the digits (exact: every field is below 2**24)
+    fields = (digits.astype(np.float32) @ weights).astype(np.int64)
+    ok &= ((fields >= FIELD_MIN) & (fields <= FIELD_MAX)).all(axis=1)
+    year, month, day = fields[:, 0], fields[:, 1], fields[:, 2]
+    offset_minutes = fields[:, 7]
+    if layout[1]:
+        sign = chars[:, length - 6]
+        ok &= (sign == ord('+')) | (sign == ord('-'))
+        offset_minutes = np.where(sign == ord('-'), -offset_minutes, offset_minutes)
+
+    # Days since the epoch of every month start via datetime64, which knows the leap years
+    months = (year - 1970) * 12 + np.clip(month, 1, 12) - 1
+    month_starts = np.stack((months, months + 1)).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    days = month_starts[0] + day - 1
+    ok &= day <= month_starts[1] - month_starts[0]
+
+    milliseconds = (((days * 24 + fields[:, 3]) * 60 + fields[:, 4] - offset_minutes) * 60 + fields[:, 5]) * 1000
+    milliseconds += fields[:, 6]
+    if not layout[1] and chars[0, -1] != ord('Z') and (time.timezone or time.daylight) and ok.any():
+        # Naive layout: local wall-clock time
+        milliseconds[ok], ok[ok] = _local_to_utc(milliseconds[ok])
+    return milliseconds, ok
+
+
+def _local_to_utc(wall_ms):
+    """
+    Shift naive local wall-clock times, parsed as if they were UTC, to UTC as
+    datetime.astimezone does. The offset is looked up once per distinct
+    minute, since time zones only change offset on whole minutes
+    :return: (epoch milliseconds, known) arrays; known is False for times
+             whose offset cannot be looked up, which are left to to_epoch_ms
+    """
+    minutes, inverse = np.unique(wall_ms // 60000, return_inverse=True)
+    offsets = np.zeros(len(minutes), dtype=np.int64)
+    known = np.ones(len(minutes), dtype=bool)
+    for index, minute in enumerate(minutes.tolist()):
+        try:
+            # Via the UTC instant, so times skipped by a DST change map as in to_epoch_ms
+            wall = NAIVE_EPOCH + timedelta(minutes=minute)
+            offsets[index] = (wall - wall.astimezone(timezone.utc).replace(tzinfo=None)) // timedelta(milliseconds=1)
+        except (OverflowError, ValueError, OSError):
+            known[index] = False
+    inverse = inverse.ravel()
+    return wall_ms - offsets[inverse], known[inverse]
@@ -0,0 +1,430 @@
+"""
+Training Pipeline for the Anomaly Detection Engine
+This module trains all three Isolation Forests from historical trajectories
+that do not fit in memory: trajectories are read in chunks (from CSV files or
+the IoT device_data store), features are extracted in a process pool, the
+scaler is fitted incrementally on every row and the forests are fitted on a
+bounded reservoir sample
+
+Usage:
+    python training_pipeline.py --csv history/*.csv --workers 8 --publish
+    python training_pipeline.py --device-db ../iot/iot_data.db --publish
+"""
+
+import argparse
+import base64
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+from geo_kernels import trajectory_features
+from trajectory_simplifier import simplify_mask
+from timestamps import parse_epoch_ms
+
+DROPOFF_COLUMNS = ['latitude', 'longitude', 'time_diff', 'distance', 'speed']
+INACTIVITY_COLUMNS = ['time_diff', 'distance', 'speed']
+ROUTE_DEVIATION_COLUMNS = ['speed', 'acceleration', 'turn_rate']
+SKIP_REASONS = ('unknown_device', 'undecryptable', 'incomplete')
+
+# As the IoT processor reads them; payload_token is a copy of iot/ciphers.py,
+# checked by iot/tests/test_shared_copies.py
+FERNET_TOKEN_PREFIX = 'gAAAAA'  # Version byte 0x80 and a timestamp high word of 0
+SELECT_ACCEPTED_KEYS = '''
+    SELECT k.device_id, k.encryption_key
+    FROM device_registry r JOIN device_keys k ON k.device_id = r.device_id
+    WHERE k.version > r.key_version - ?
+    ORDER BY k.device_id, k.version DESC
+'''
+SELECT_REGISTERED_KEYS = 'SELECT device_id, encryption_key FROM device_registry WHERE encryption_key IS NOT NULL'
+
+
+def timestamps_to_seconds(timestamps):
+    """Vectorized conversion of ISO strings or epoch milliseconds/seconds to float seconds"""
+    return parse_epoch_ms(timestamps) / 1000.0
+
+
+def payload_token(encrypted_data):
+    """
+    Fernet token of a message payload. Payloads are normally the base64 of
+    the token; a bare token, which is already base64, is accepted too
+    """
+    if encrypted_data.startswith(FERNET_TOKEN_PREFIX):
+        return encrypted_data
+    return base64.b64decode(encrypted_data)
+
+
+def decrypt_location_rows(rows, keys):
+    """
+    Decode encrypted device_data location rows into point columns, with each
+    device's accepted keys as the IoT processor decrypts them
+    :param rows: List of (device_id, tourist_id, encrypted data) tuples
+    :param keys: Dict of device_id -> accepted Fernet keys, newest first
+    :return: Point columns, plus the number of rows skipped for each of SKIP_REASONS
+    """
+    from cryptography.fernet import Fernet, MultiFernet
+
+    ciphers = {device_id: MultiFernet([Fernet(key) for key in accepted]) for device_id, accepted in keys.items()}
+    chunk = {"tourist": [], "latitude": [], "longitude": [], "timestamp": []}
+    skipped = dict.fromkeys(SKIP_REASONS, 0)
+    for device_id, tourist_id, encrypted_data in rows:
+        cipher = ciphers.get(device_id)
+        if cipher is None:
+            skipped["unknown_device"] += 1
+            continue
+        try:
+            payload = json.loads(cipher.decrypt(payload_token(encrypted_data)))
+        except Exception:
+            skipped["undecryptable"] += 1  # Corrupt, or encrypted with a key no longer accepted
+            continue
+        location = payload.get("data", {}) if isinstance(payload, dict) else {}
+        if location.get("latitude") is None or location.get("timestamp") is None:
+            skipped["incomplete"] += 1
+            continue
+        chunk["tourist"].append(tourist_id)
+        chunk["latitude"].append(location["latitude"])
+        chunk["longitude"].append(location["longitude"])
+        chunk["timestamp"].append(location["timestamp"])
+    chunk["skipped"] = skipped
+    return chunk
+
+
+def extract_chunk_features(chunk, simplify=None):
+    """
+    Feature rows for every model from one chunk of trajectory points
+    (runs in a worker process)
+    :param chunk: Dict with tourist, latitude, longitude and timestamp columns,
+                  or with encrypted device_data rows and their device keys
+    :param simplify: Optional (tolerance_m, max_gap_seconds) to simplify every
+                     trajectory with before extracting features
+    :return: (dict of model name -> feature array, number of points, dict of
+             skip reason -> encrypted rows that could not be used)
+    """
+    skipped = dict.fromkeys(SKIP_REASONS, 0)
+    if "encrypted" in chunk:
+        chunk = decrypt_location_rows(chunk["encrypted"], chunk["keys"])
+        skipped = chunk["skipped"]
+
+    tourist_codes = pd.factorize(pd.Series(chunk["tourist"]))[0]
+    latitude = np.asarray(chunk["latitude"], dtype=float)
+    longitude = np.asarray(chunk["longitude"], dtype=float)
+    seconds = timestamps_to_seconds(chunk["timestamp"])
+
+    # Group each tourist's points together in time order
+    order = np.lexsort((seconds, tourist_codes))
+    tourist_codes, latitude, longitude, seconds = (
+        tourist_codes[order], latitude[order], longitude[order], seconds[order])
+    starts = np.flatnonzero(np.diff(tourist_codes, prepend=-1))
+    points = len(latitude)
+    if simplify is not None:
+        simplified = simplify_mask(latitude, longitude, seconds, starts, *simplify)
+        tourist_codes, latitude, longitude, seconds = (
+            tourist_codes[simplified], latitude[simplified], longitude[simplified], seconds[simplified])
+        starts = np.flatnonzero(np.diff(tourist_codes, prepend=-1))
+
+    movement = trajectory_features(latitude, longitude, seconds, starts)
+    heading_change = np.abs((np.diff(movement['bearing'], prepend=0.0) + 180) % 360 - 180)
+    turn_rate = heading_change / (movement['time_diff'] + 1e-6)
+
+    # Rows without a previous point (and, for turn rate, two) carry no movement
+    keep = np.ones(len(latitude), dtype=bool)
+    keep[starts] = False
+    turn_rate[~keep] = 0.0
+    turn_rate[np.minimum(starts + 1, len(turn_rate) - 1)] = 0.0
+
+    features = {
+        "location_dropoff": np.column_stack((latitude, longitude, movement['time_diff'],
+                                             movement['distance'], movement['speed']))[keep],
+        "inactivity": np.column_stack((movement['time_diff'], movement['distance'],
+                                       movement['speed']))[keep],
+        "route_deviation": np.column_stack((movement['speed'], movement['acceleration'],
+                                            turn_rate))[keep],
+    }
+    return features, points, skipped
+
+
+class WindowSource:
+    """
+    In-memory list of location windows (the train_models input format)
+    """
+
+    def __init__(self, windows, chunk_windows=10000):
+        self.windows = windows
+        self.chunk_windows = chunk_windows
+
+    def chunks(self):
+        for start in range(0, len(self.windows), self.chunk_windows):
+            batch = self.windows[start:start + self.chunk_windows]
+            points = [(index, p) for index, window in enumerate(batch) for p in window]
+            yield {
+                "tourist": [index for index, _ in points],
+                "latitude": [p['latitude'] for _, p in points],
+                "longitude": [p['longitude'] for _, p in points],
+                "timestamp": [p['timestamp'] for _, p in points]
+            }
+
+
+class CsvSource:
+    """
+    CSV files with tourist_id, latitude, longitude and timestamp columns, read
+    in bounded chunks; a trajectory cut by a chunk boundary loses one pair
+    """
+
+    def __init__(self, paths, chunk_rows=500000):
+        self.paths = paths
+        self.chunk_rows = chunk_rows
+
+    def chunks(self):
+        for path in self.paths:
+            for frame in pd.read_csv(path, chunksize=self.chunk_rows,
+                                     usecols=['tourist_id', 'latitude', 'longitude', 'timestamp']):
+                yield {
+                    "tourist": frame['tourist_id'].to_numpy(),
+                    "latitude": frame['latitude'].to_numpy(),
+                    "longitude": frame['longitude'].to_numpy(),
+                    "timestamp": frame['timestamp'].to_numpy()
+                }
+
+
+class DeviceDataSource:
+    """
+    Location rows of the IoT service's device_data table; decryption happens
+    in the worker processes, with the key versions the processor accepts
+    """
+
+    def __init__(self, db_path, chunk_rows=200000, key_versions_accepted=2):
+        """
+        :param key_versions_accepted: Key versions of a device to decrypt with,
+                                      counting the current one, as set on the
+                                      IoT processor; rows encrypted with older
+                                      keys are skipped
+        """
+        self.db_path = db_path
+        self.chunk_rows = chunk_rows
+        self.key_versions_accepted = key_versions_accepted
+
+    def load_keys(self, conn):
+        """:return: Dict of device_id -> accepted keys, newest first"""
+        keys = {}
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'device_keys'").fetchone():
+            rows = conn.execute(SELECT_ACCEPTED_KEYS, (self.key_versions_accepted,))
+        else:
+            rows = conn.execute(SELECT_REGISTERED_KEYS)  # Not yet migrated: one key per device
+        for device_id, key in rows:
+            keys.setdefault(device_id, []).append(key)
+        return keys
+
+    def chunks(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            keys = self.load_keys(conn)
+            cursor = conn.execute('''
+                SELECT device_id, tourist_id, data FROM device_data
+                WHERE data_type = 'location'
+                ORDER BY id
+            ''')
+            while True:
+                rows = cursor.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                chunk_keys = {device_id: keys[device_id] for device_id, _, _ in rows if device_id in keys}
+                yield {"encrypted": rows, "keys": chunk_keys}
+        finally:
+            conn.close()
+
+
+class ReservoirSample:
+    """
+    Uniform fixed-size sample of feature rows from an unbounded stream
+    """
+
+    def __init__(self, capacity, seed=42):
+        self.capacity = capacity
+        self.rows = None
+        self.size = 0
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, rows):
+        if len(rows) == 0:
+            return
+        if self.rows is None:
+            self.rows = np.empty((self.capacity, rows.shape[1]))
+
+        # Fill the free slots first
+        free = min(self.capacity - self.size, len(rows))
+        self.rows[self.size:self.size + free] = rows[:free]
+        self.size += free
+        self.seen += free
+        rows = rows[free:]
+
+        # Then row i of the stream replaces a random slot with probability capacity / i
+        if len(rows):
+            positions = self.seen + 1 + np.arange(len(rows))
+            slots = (self.rng.random(len(rows)) * positions).astype(np.int64)
+            chosen = slots < self.capacity
+            self.rows[slots[chosen]] = rows[chosen]
+            self.seen += len(rows)
+
+    def sample(self):
+        if self.rows is None:
+            return None
+        return self.rows[:self.size]
+
+
+class TrainingPipeline:
+    """
+    Chunked, parallel training of the three anomaly models
+    """
+
+    MODELS = ('location_dropoff', 'inactivity', 'route_deviation')
+
+    def __init__(self, workers=None, reservoir_size=200000, n_jobs=-1, seed=42,
+                 simplify_tolerance_m=None, simplify_max_gap_seconds=300.0):
+        """
+        :param workers: Feature extraction processes; 1 extracts in-process
+        :param reservoir_size: Rows per model kept for fitting the forests
+        :param n_jobs: Parallel jobs for IsolationForest.fit
+        :param simplify_tolerance_m: Simplify trajectories with this error bound
+                                     first, as the engine does before scoring
+        """
+        self.workers = workers or os.cpu_count()
+        self.simplify = None
+        if simplify_tolerance_m is not None:
+            self.simplify = (simplify_tolerance_m, simplify_max_gap_seconds)
+        self.reservoir_size = reservoir_size
+        self.n_jobs = n_jobs
+        self.seed = seed
+
+    def _feature_chunks(self, source, timings):
+        """Yield extracted features in source order, keeping the pool busy but bounded"""
+        if self.workers == 1:
+            for chunk in self._timed_chunks(source, timings):
+                started = time.perf_counter()
+                result = extract_chunk_features(chunk, self.simplify)
+                timings['features'] += time.perf_counter() - started
+                yield result
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk in self._timed_chunks(source, timings):
+                pending.append(executor.submit(extract_chunk_features, chunk, self.simplify))
+                if len(pending) >= 2 * self.workers:
+                    yield self._wait(pending.popleft(), timings)
+            while pending:
+                yield self._wait(pending.popleft(), timings)
+
+    @staticmethod
+    def _timed_chunks(source, timings):
+        iterator = iter(source.chunks())
+        while True:
+            started = time.perf_counter()
+            chunk = next(iterator, None)
+            timings['read'] += time.perf_counter() - started
+            if chunk is None:
+                return
+            yield chunk
+
+    @staticmethod
+    def _wait(future, timings):
+        started = time.perf_counter()
+        result = future.result()
+        timings['features'] += time.perf_counter() - started
+        return result
+
+    def run(self, source):
+        """
+        Train the scaler and all three models from a chunked source
+        :return: (dict of fitted objects, report with per-stage timings)
+        """
+        timings = {"read": 0.0, "features": 0.0, "scaler": 0.0, "sampling": 0.0}
+        scaler = StandardScaler()
+        reservoirs = {name: ReservoirSample(self.reservoir_size, self.seed) for name in self.MODELS}
+        points = rows = chunks = 0
+        skipped = dict.fromkeys(SKIP_REASONS, 0)
+        started = time.perf_counter()
+
+        for features, chunk_points, chunk_skipped in self._feature_chunks(source, timings):
+            chunks += 1
+            points += chunk_points
+            for reason, count in chunk_skipped.items():
+                skipped[reason] += count
+            rows += len(features['location_dropoff'])
+
+            stage = time.perf_counter()
+            if len(features['location_dropoff']):
+                scaler.partial_fit(features['location_dropoff'])
+            timings['scaler'] += time.perf_counter() - stage
+
+            stage = time.perf_counter()
+            for name in self.MODELS:
+                reservoirs[name].add(features[name])
+            timings['sampling'] += time.perf_counter() - stage
+
+        models = {"scaler": scaler if rows else None}
+        for name in self.MODELS:
+            sample = reservoirs[name].sample()
+            if sample is None or len(sample) == 0:
+                models[name] = None
+                continue
+            if name == 'location_dropoff':
+                sample = scaler.transform(sample)
+            stage = time.perf_counter()
+            model = IsolationForest(contamination=0.1, random_state=self.seed, n_jobs=self.n_jobs)
+            models[name] = model.fit(sample)
+            timings[f"fit_{name}"] = time.perf_counter() - stage
+
+        timings['total'] = time.perf_counter() - started
+        report = {
+            "chunks": chunks,
+            "points": points,
+            "feature_rows": rows,
+            "skipped_rows": skipped,
+            "sample_rows": {name: reservoirs[name].size for name in self.MODELS},
+            "workers": self.workers,
+            "simplify_tolerance_m": self.simplify[0] if self.simplify else None,
+            "timings_seconds": {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        }
+        return models, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the anomaly detection models from historical trajectories")
+    parser.add_argument('--csv', nargs='*', default=[], help="CSV files (tourist_id, latitude, longitude, timestamp)")
+    parser.add_argument('--device-db', help="IoT SQLite database with device_data and device_registry")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=500000)
+    parser.add_argument('--key-versions', type=int, default=2,
+                        help="device key versions to decrypt with; match the processor's key_versions_accepted")
+    parser.add_argument('--reservoir-size', type=int, default=200000)
+    parser.add_argument('--registry', default='models/registry')
+    parser.add_argument('--simplify-tolerance-m', type=float, default=None,
+                        help="simplify trajectories first; serve with the same AI_SIMPLIFY_TOLERANCE_M")
+    parser.add_argument('--publish', action='store_true', help="publish the trained models to the registry")
+    args = parser.parse_args()
+
+    if args.device_db:
+        source = DeviceDataSource(args.device_db, args.chunk_rows, args.key_versions)
+    elif args.csv:
+        source = CsvSource(args.csv, args.chunk_rows)
+    else:
+        parser.error("Provide --csv files or --device-db")
+
+    from anomaly_detection import AnomalyDetectionEngine
+
+    engine = AnomalyDetectionEngine(registry_dir=args.registry, simplify_tolerance_m=args.simplify_tolerance_m)
+    pipeline = TrainingPipeline(args.workers, args.reservoir_size, simplify_tolerance_m=args.simplify_tolerance_m)
+    result = engine.train_from_source(source, pipeline)
+    print(json.dumps(result, indent=2))
+    if args.publish:
+        print(json.dumps(engine.publish_models({"training": result.get("report")}), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Trajectory Simplification for the Anomaly Detection Engine
+This module drops redundant points from dense location tracks while bounding
+the error in metres. The error of a dropped point is its synchronized
+Euclidean distance (SED): the distance from where the simplified track,
+interpolated in time between the kept points around it, places the tourist at
+that moment. Stops and sharp turns move the tourist away from that
+interpolated position, so they are kept. Reporting gaps longer than
+max_gap_seconds are kept exactly, and no other gap grows beyond it, so
+inactivity results are unchanged.
+
+Whole windows use a vectorized time-ratio Douglas-Peucker. Point-by-point
+streams use an opening-window filter with the same bound. The IoT processor
+stores tracks through a copy of StreamingSimplifier, since each service is
+built into its own image; iot/tests/test_shared_copies.py checks that the two
+stay identical.
+"""
+
+import math
+import numpy as np
+from geo_kernels import EARTH_RADIUS_M
+
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def simplify_mask(latitude, longitude, seconds, starts=None, tolerance_m=10.0, max_gap_seconds=300.0):
+    """
+    Points to keep from one time-sorted trajectory or a ragged batch of them
+    :param starts: Offsets where each trajectory begins (None for a single one)
+    :param tolerance_m: Largest SED of a dropped point, in metres
+    :param max_gap_seconds: Longest time between kept points, unless the raw
+                            points themselves are further apart
+    :return: Boolean mask; the first and last point of every trajectory are kept
+    """
+    latitude = np.asarray(latitude, dtype=float)
+    longitude = np.asarray(longitude, dtype=float)
+    seconds = np.asarray(seconds, dtype=float)
+    count = len(latitude)
+    keep = np.zeros(count, dtype=bool)
+    if count == 0:
+        return keep
+    starts = np.array([0] if starts is None else starts, dtype=np.int64)
+    ends = np.append(starts[1:], count) - 1
+    keep[starts] = True
+    keep[ends] = True
+
+    # Local metres around each trajectory's first point
+    x_scale = np.repeat(np.cos(np.radians(latitude[starts])), ends - starts + 1) * METRES_PER_DEGREE
+    x = (longitude - np.repeat(longitude[starts], ends - starts + 1)) * x_scale
+    y = latitude * METRES_PER_DEGREE
+
+    # Split every trajectory at once, one level of the recursion per pass
+    left, right = starts, ends
+    while len(left):
+        inner = right - left - 1
+        active = inner > 0
+        left, right, inner = left[active], right[active], inner[active]
+        if not len(left):
+            break
+        segment = np.repeat(np.arange(len(left)), inner)
+        offsets = np.arange(inner.sum()) - np.repeat(np.cumsum(inner) - inner, inner)
+        points = np.repeat(left, inner) + 1 + offsets
+        a, b = left[segment], right[segment]
+
+        span = seconds[b] - seconds[a]
+        ratio = np.divide(seconds[points] - seconds[a], span, out=np.zeros(len(points)), where=span > 0)
+        error = np.hypot(x[a] + ratio * (x[b] - x[a]) - x[points], y[a] + ratio * (y[b] - y[a]) - y[points])
+
+        # Worst point of every segment; ties go to the earliest
+        first = np.cumsum(inner) - inner
+        worst_error = np.maximum.reduceat(error, first)
+        worst = np.minimum.reduceat(np.where(error == worst_error[segment], points, count), first)
+
+        split = (worst_error > tolerance_m) | (seconds[right] - seconds[left] > max_gap_seconds)
+        keep[worst[split]] = True
+        left, right = np.concatenate((left[split], worst[split])), np.concatenate((worst[split], right[split]))
+    return keep
+
+
+class StreamingSimplifier:
+    """
+    Opening-window simplifier for one track fed a point at a time. Each point
+    is held until a later one shows whether it is needed; pending is the
+    newest point that has not been emitted yet
+    """
+
+    def __init__(self, tolerance_m=10.0, max_gap_seconds=300.0, max_buffer=64):
+        """
+        :param tolerance_m: Largest SED of a dropped point, in metres
+        :param max_gap_seconds: Longest time between emitted points, unless the
+                                raw points themselves are further apart
+        :param max_buffer: Points held at most before one is emitted anyway
+        """
+        self.tolerance_m = tolerance_m
+        self.max_gap_seconds = max_gap_seconds
+        self.max_buffer = max_buffer
+        self.anchor = None  # Last emitted (latitude, longitude, epoch, item)
+        self.buffer = []  # Points since the anchor, oldest first
+
+    @property
+    def pending(self):
+        return self.buffer[-1] if self.buffer else None
+
+    def _breaks(self, point):
+        """True when the window from the anchor to point no longer fits the bound"""
+        lat0, lon0, t0, _ = self.anchor
+        if point[2] - t0 > self.max_gap_seconds or len(self.buffer) >= self.max_buffer:
+            return True
+        x_scale = math.cos(math.radians(lat0)) * METRES_PER_DEGREE
+        x1 = (point[1] - lon0) * x_scale
+        y1 = (point[0] - lat0) * METRES_PER_DEGREE
+        span = point[2] - t0
+        for latitude, longitude, epoch, _ in self.buffer:
+            ratio = (epoch - t0) / span if span > 0 else 0.0
+            if math.hypot(ratio * x1 - (longitude - lon0) * x_scale,
+                          ratio * y1 - (latitude - lat0) * METRES_PER_DEGREE) > self.tolerance_m:
+                return True
+        return False
+
+    def push(self, latitude, longitude, epoch, item=None):
+        """
+        Add the next point; epochs must not decrease
+        :param item: Payload carried along with the point, e.g. the raw message
+        :return: List of (latitude, longitude, epoch, item) points now emitted
+        """
+        point = (latitude, longitude, epoch, item)
+        if self.anchor is None:
+            self.anchor = point
+            return [point]
+        emitted = []
+        if self.buffer and self._breaks(point):
+            self.anchor = self.buffer[-1]
+            self.buffer = []
+            emitted.append(self.anchor)
+        self.buffer.append(point)
+        return emitted
+
+    def flush(self):
+        """
+        Emit the pending point, e.g. at shutdown; the track continues from it
+        :return: List with the pending point, or empty
+        """
+        if not self.buffer:
+            return []
+        self.anchor = self.buffer[-1]
+        self.buffer = []
+        return [self.anchor]
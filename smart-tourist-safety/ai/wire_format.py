@@ -0,0 +1,154 @@
+"""
+Columnar Wire Format for location windows
+This module defines a compact binary request encoding for the detection
+endpoints: every location window is sent as parallel little-endian arrays of
+float64 latitude, float64 longitude and int64 epoch milliseconds, which are
+read into NumPy without copying, instead of a JSON list of point objects with
+ISO timestamp strings
+
+Body layout (all integers little-endian):
+    magic  b'LCOL'  | version u8 | 3 reserved bytes | params length u32 | block count u32
+    params          JSON request object, padded with spaces to a multiple of 8
+    per block       point count u32 | 4 reserved bytes
+                    latitude f8[count] | longitude f8[count] | timestamp_ms i8[count]
+
+The params object has the shape of the JSON request; a value {"$columns": k}
+stands for block k, e.g. {"tourist_id": "t1", "location_data": {"$columns": 0}}
+"""
+
+import json
+import struct
+
+import numpy as np
+
+CONTENT_TYPE = 'application/x-location-columns'
+MAGIC = b'LCOL'
+VERSION = 1
+HEADER = struct.Struct('<4sB3xII')
+BLOCK_HEADER = struct.Struct('<I4x')
+
+
+class LocationColumns:
+    """
+    One location window as parallel arrays; stands in for a list of location
+    points wherever the engine accepts location_data
+    """
+
+    def __init__(self, latitude, longitude, timestamp_ms):
+        self.latitude = np.asarray(latitude, dtype='<f8')
+        self.longitude = np.asarray(longitude, dtype='<f8')
+        self.timestamp_ms = np.asarray(timestamp_ms, dtype='<i8')
+        if not len(self.latitude) == len(self.longitude) == len(self.timestamp_ms):
+            raise ValueError("latitude, longitude and timestamp_ms must have the same length")
+
+    @classmethod
+    def from_points(cls, points):
+        """
+        :param points: List of location points; timestamps may be missing
+                       (planned itineraries), which encodes them as 0
+        """
+        from timestamps import parse_epoch_ms
+
+        timestamps = [p.get('timestamp') for p in points]
+        if None in timestamps:
+            timestamp_ms = np.zeros(len(points), dtype=np.int64)
+            timed = [i for i, timestamp in enumerate(timestamps) if timestamp is not None]
+            timestamp_ms[timed] = parse_epoch_ms([timestamps[i] for i in timed])
+        else:
+            timestamp_ms = parse_epoch_ms(timestamps)
+        return cls([p['latitude'] for p in points], [p['longitude'] for p in points], timestamp_ms)
+
+    def __len__(self):
+        return len(self.latitude)
+
+    @property
+    def seconds(self):
+        """Float epoch seconds, as the rest of the engine uses"""
+        return self.timestamp_ms / 1000.0
+
+    def to_bytes(self):
+        return (BLOCK_HEADER.pack(len(self)) + self.latitude.tobytes() +
+                self.longitude.tobytes() + self.timestamp_ms.tobytes())
+
+
+def coordinates(location_data):
+    """
+    :return: (latitude, longitude) arrays of a point list or LocationColumns
+    """
+    if isinstance(location_data, LocationColumns):
+        return location_data.latitude, location_data.longitude
+    return (np.array([p['latitude'] for p in location_data], dtype=float),
+            np.array([p['longitude'] for p in location_data], dtype=float))
+
+
+def encode(data):
+    """
+    Encode a request object, replacing every LocationColumns value with a block
+    :param data: JSON-like request, e.g. {"location_data": LocationColumns(...)}
+    :return: Request body bytes
+    """
+    blocks = []
+
+    def replace(value):
+        if isinstance(value, LocationColumns):
+            blocks.append(value)
+            return {"$columns": len(blocks) - 1}
+        if isinstance(value, dict):
+            return {key: replace(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [replace(item) for item in value]
+        return value
+
+    params = json.dumps(replace(data), separators=(',', ':')).encode()
+    params += b' ' * (-len(params) % 8)  # Keep the arrays 8-byte aligned
+    return b''.join([HEADER.pack(MAGIC, VERSION, len(params), len(blocks)), params] +
+                    [block.to_bytes() for block in blocks])
+
+
+def decode(body):
+    """
+    Decode a request body; the arrays are views into body, not copies
+    :param body: Bytes of an encoded request
+    :return: Request object with LocationColumns in place of its blocks
+    """
+    view = memoryview(body)
+    if len(view) < HEADER.size:
+        raise ValueError("Columnar body is shorter than its header")
+    magic, version, params_length, block_count = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Columnar body does not start with the LCOL magic")
+    if version != VERSION:
+        raise ValueError(f"Unsupported columnar format version {version}")
+
+    offset = HEADER.size + params_length
+    if offset > len(view):
+        raise ValueError(f"Columnar body is truncated: params need {params_length} bytes, "
+                         f"{len(view) - HEADER.size} follow the header")
+    params = json.loads(bytes(view[HEADER.size:offset]))
+    blocks = []
+    for _ in range(block_count):
+        if offset + BLOCK_HEADER.size > len(view):
+            raise ValueError("Columnar body is truncated")
+        count, = BLOCK_HEADER.unpack_from(view, offset)
+        offset += BLOCK_HEADER.size
+        if offset + 24 * count > len(view):
+            raise ValueError("Columnar body is truncated")
+        latitude = np.frombuffer(view, '<f8', count, offset)
+        longitude = np.frombuffer(view, '<f8', count, offset + 8 * count)
+        timestamp_ms = np.frombuffer(view, '<i8', count, offset + 16 * count)
+        blocks.append(LocationColumns(latitude, longitude, timestamp_ms))
+        offset += 24 * count
+
+    def resolve(value):
+        if isinstance(value, dict):
+            if len(value) == 1 and '$columns' in value:
+                index = value['$columns']
+                if not isinstance(index, int) or not 0 <= index < len(blocks):
+                    raise ValueError(f"Columnar params refer to block {index!r} of {len(blocks)}")
+                return blocks[index]
+            return {key: resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [resolve(item) for item in value]
+        return value
+
+    return resolve(params)
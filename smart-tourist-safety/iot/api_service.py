@@ -3,19 +3,40 @@ IoT API Service for Smart Tourist Safety System
 This module provides RESTful APIs for IoT device management and data integration
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from iot.data_processor import IoTDataProcessor
 from iot.device_simulator import IoTDeviceManager
+from iot import metrics
 import json
+import os
+import time
 import base64
 from cryptography.fernet import Fernet
 
 app = Flask(__name__)
 
 # Initialize IoT components
-data_processor = IoTDataProcessor()
+# Set IOT_SIMPLIFY_TOLERANCE_M (metres) to store simplified location tracks,
+# and IOT_GEOFENCE_PATH to a zones JSON file to check locations against
+simplify_tolerance_m = os.environ.get("IOT_SIMPLIFY_TOLERANCE_M")
+data_processor = IoTDataProcessor(
+    geofence_path=os.environ.get("IOT_GEOFENCE_PATH"),
+    simplify_tolerance_m=float(simplify_tolerance_m) if simplify_tolerance_m else None
+)
 device_manager = IoTDeviceManager()
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Latency and count of every request, labelled by route pattern"""
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    metrics.REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - g.request_started)
+    metrics.REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -25,6 +46,12 @@ def health_check():
         "version": "1.0.0"
     })
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request latency, stage timings, message counters and queue depths for Prometheus"""
+    body, content_type = metrics.exposition()
+    return body, 200, {"Content-Type": content_type}
+
 @app.route('/devices', methods=['POST'])
 def register_device():
     """Register a new IoT device"""
@@ -58,6 +85,25 @@ def register_device():
             "error": f"Failed to register device: {str(e)}"
         }), 500
 
+@app.route('/devices/<device_id>/keys', methods=['POST'])
+def rotate_device_key(device_id):
+    """Rotate a device's encryption key; the previous key keeps working until the next rotation"""
+    try:
+        data = request.get_json(silent=True) or {}
+        encryption_key, key_version = data_processor.rotate_device_key(device_id, data.get('encryption_key'))
+
+        return jsonify({
+            "status": "success",
+            "device_id": device_id,
+            "encryption_key": encryption_key,
+            "key_version": key_version
+        })
+
+    except Exception as e:
+        return jsonify({
+            "error": f"Failed to rotate device key: {str(e)}"
+        }), 500
+
 @app.route('/devices/<device_id>', methods=['DELETE'])
 def unregister_device(device_id):
     """Unregister an IoT device"""
@@ -0,0 +1,91 @@
+"""
+Throughput benchmark for the geofence engine
+Loads synthetic polygon zones around Delhi and replays random-walk location
+updates from many devices through GeofenceEngine.update
+
+Usage (from the smart-tourist-safety directory):
+    python -m iot.benchmarks.bench_geofence [--zones 10000] [--updates 50000]
+"""
+
+import argparse
+import math
+import random
+import time
+
+from iot.geofence import GeofenceEngine
+
+CENTRE = (28.6139, 77.2090)  # New Delhi
+EXTENT_DEG = 0.5
+
+
+def synthetic_zones(rng, count):
+    """Irregular polygons of 6-16 vertices, 50-500 m across"""
+    zones = []
+    for index in range(count):
+        lat = CENTRE[0] + rng.uniform(-EXTENT_DEG, EXTENT_DEG)
+        lon = CENTRE[1] + rng.uniform(-EXTENT_DEG, EXTENT_DEG)
+        radius = rng.uniform(0.0005, 0.0045)
+        vertices = rng.randint(6, 16)
+        polygon = []
+        for vertex in range(vertices):
+            angle = 2 * math.pi * vertex / vertices
+            scale = radius * rng.uniform(0.6, 1.0)
+            polygon.append((lat + scale * math.sin(angle), lon + scale * math.cos(angle)))
+        zones.append({
+            "zone_id": f"zone_{index:05d}",
+            "zone_type": rng.choice(["restricted", "unsafe", "site_perimeter"]),
+            "polygon": polygon
+        })
+    return zones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geofence engine throughput benchmark")
+    parser.add_argument('--zones', type=int, default=10000)
+    parser.add_argument('--updates', type=int, default=50000)
+    parser.add_argument('--devices', type=int, default=5000)
+    parser.add_argument('--step-m', type=float, default=15.0, help="movement per update in metres")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    zones = synthetic_zones(rng, args.zones)
+
+    engine = GeofenceEngine()
+    started = time.perf_counter()
+    engine.load_zones(zones)
+    build_seconds = time.perf_counter() - started
+
+    positions = [
+        [CENTRE[0] + rng.uniform(-EXTENT_DEG, EXTENT_DEG), CENTRE[1] + rng.uniform(-EXTENT_DEG, EXTENT_DEG)]
+        for _ in range(args.devices)
+    ]
+    step = args.step_m / 111000.0
+    updates = []
+    for number in range(args.updates):
+        device = number % args.devices
+        position = positions[device]
+        position[0] += rng.uniform(-step, step)
+        position[1] += rng.uniform(-step, step)
+        updates.append((f"device_{device:05d}", position[0], position[1]))
+
+    events = 0
+    latencies = []
+    started = time.perf_counter()
+    for device_id, latitude, longitude in updates:
+        update_started = time.perf_counter()
+        events += len(engine.update(device_id, latitude, longitude))
+        latencies.append(time.perf_counter() - update_started)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"zones={args.zones} cells={len(engine.index.cells)} index build={build_seconds:.2f}s")
+    print(f"updates={args.updates} devices={args.devices} events={events}")
+    print(f"throughput={args.updates / elapsed:,.0f} updates/s")
+    print(f"latency p50={latencies[len(latencies) // 2] * 1e6:.1f}us "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1e6:.1f}us "
+          f"max={latencies[-1] * 1e6:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
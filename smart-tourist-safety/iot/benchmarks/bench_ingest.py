@@ -0,0 +1,172 @@
+"""
+Ingest benchmark for the device_data table
+Writes device messages one row per transaction, as IoTDataProcessor.store_raw_data
+does, in three modes:
+- a new SQLite connection per row, the processor's original behaviour
+  (rollback journal, synchronous=FULL)
+- the pooled WAL-mode ConnectionPool, one transaction per row
+- the WriteBehindBuffer, batched by its writer thread; the time includes
+  draining the buffer, and latency is the time the caller waits
+Each mode gets its own database file. Then it times marking one row as
+processed as the table grows: the former UPDATE by device_id and payload
+timestamp, which scans the whole table, against the UPDATE by primary key.
+
+Usage (from the smart-tourist-safety directory):
+    python -m iot.benchmarks.bench_ingest [--rows 20000] [--threads 1 4] [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import base64
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from threading import Thread
+
+from iot.data_processor import INDEXES, INSERT_DEVICE_DATA, MARK_PROCESSED, TABLES
+from iot.storage import ConnectionPool, RowIdBlocks, WriteBehindBuffer
+from iot.timestamps import now_ms
+
+
+def synthetic_rows(rng, count, devices=500):
+    """(device_id, tourist_id, data_type, data) with Fernet-sized payloads"""
+    rows = []
+    for number in range(count):
+        device = number % devices
+        payload = base64.b64encode(rng.randbytes(180)).decode()
+        rows.append((f"device_{device:04d}", f"tourist_{device:04d}", "location", payload))
+    return rows
+
+
+# The processor's original statements: an id assigned by SQLite, and marks
+# matched on the device and the payload timestamp, with no index to use
+LEGACY_INSERT = '''
+    INSERT INTO device_data (device_id, tourist_id, data_type, data, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+LEGACY_MARK = 'UPDATE device_data SET processed = TRUE WHERE device_id = ? AND timestamp = ?'
+
+
+def create_tables(db_path, indexes=True):
+    conn = sqlite3.connect(db_path)
+    for statement in list(TABLES.values()) + (INDEXES if indexes else []):
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def connect_per_row(db_path):
+    def store(row):
+        conn = sqlite3.connect(db_path)
+        conn.execute(LEGACY_INSERT, (*row, now_ms()))
+        conn.commit()
+        conn.close()
+    return store, lambda: None
+
+
+def pooled(db_path):
+    pool = ConnectionPool(db_path)
+    row_ids = RowIdBlocks(pool, 'device_data')
+
+    def store(row):
+        pool.execute(INSERT_DEVICE_DATA, (row_ids.next(), *row, now_ms(), False))
+    return store, pool.close
+
+
+def write_behind(db_path):
+    pool = ConnectionPool(db_path)
+    row_ids = RowIdBlocks(pool, 'device_data')
+    writer = WriteBehindBuffer(pool)
+
+    def store(row):
+        writer.put(INSERT_DEVICE_DATA, (row_ids.next(), *row, now_ms(), False))
+
+    def close():
+        writer.close()
+        pool.close()
+    return store, close
+
+
+def run(store, rows, threads, close):
+    """:return: (elapsed seconds until close returns, sorted per-row latencies)"""
+    latencies = [[] for _ in range(threads)]
+
+    def worker(number):
+        for row in rows[number::threads]:
+            started = time.perf_counter()
+            store(row)
+            latencies[number].append(time.perf_counter() - started)
+
+    workers = [Thread(target=worker, args=(number,)) for number in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    close()
+    return time.perf_counter() - started, sorted(sum(latencies, []))
+
+
+def marking(directory, sizes, rng, scans=20, lookups=2000):
+    """
+    Per-row cost of marking a row processed, by table size; like the
+    processor, it marks rows among the most recently inserted
+    """
+    db_path = os.path.join(directory, "marking.db")
+    create_tables(db_path, indexes=False)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    print(f"{'rows':>12}{'scan UPDATE us':>17}{'primary key us':>17}")
+    count = 0
+    for size in sizes:
+        with conn:
+            conn.executemany(LEGACY_INSERT, ((f"device_{number % 500:04d}", f"tourist_{number % 500:04d}",
+                                              "location", "x" * 16, number) for number in range(count, size)))
+        count = size
+        timings = []
+        for statement, samples, parameters in (
+                (LEGACY_MARK, scans, lambda number: (f"device_{number % 500:04d}", number)),
+                (MARK_PROCESSED, lookups, lambda number: (number + 1,))):
+            targets = [rng.randrange(max(size - 1000, 0), size) for _ in range(samples)]
+            started = time.perf_counter()
+            with conn:
+                for number in targets:
+                    conn.execute(statement, parameters(number))
+            timings.append((time.perf_counter() - started) / samples)
+        print(f"{size:>12,}{timings[0] * 1e6:>17,.0f}{timings[1] * 1e6:>17.1f}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="device_data ingest benchmark")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="table sizes to time processed marks at")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = synthetic_rows(rng, args.rows)
+    print(f"{'mode':<18}{'threads':>8}{'rows/s':>10}{'p50 us':>9}{'p99 us':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for threads in args.threads:
+            for name, mode in (("connect per row", connect_per_row), ("pooled WAL", pooled),
+                               ("write-behind", write_behind)):
+                db_path = os.path.join(directory, f"{name.replace(' ', '_')}_{threads}.db")
+                create_tables(db_path, indexes=mode is not connect_per_row)
+                store, close = mode(db_path)
+                elapsed, latencies = run(store, rows, threads, close)
+                stored = sqlite3.connect(db_path).execute('SELECT COUNT(*) FROM device_data').fetchone()[0]
+                assert stored == len(rows), f"{name}: stored {stored} of {len(rows)} rows"
+                print(f"{name:<18}{threads:>8}{len(rows) / elapsed:>10,.0f}"
+                      f"{latencies[len(latencies) // 2] * 1e6:>9.0f}"
+                      f"{latencies[int(len(latencies) * 0.99)] * 1e6:>9.0f}")
+        print()
+        marking(directory, sorted(args.sizes), rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Message pipeline benchmark for the IoT data processor
+Replays encrypted location and health messages from many devices, as the MQTT
+network thread would hand them over. It compares processing them on that
+thread with the sharded worker pipeline, using worker threads only or a decrypt
+process pool. The time runs until every message is handled and written.
+Receive latency is how long the network thread is held per message.
+
+Usage (from the smart-tourist-safety directory):
+    python -m iot.benchmarks.bench_pipeline [--messages 20000] [--devices 500]
+"""
+
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+
+from iot.data_processor import IoTDataProcessor
+from iot.timestamps import now_ms
+
+CENTRE = (28.6139, 77.2090)  # New Delhi
+
+
+def synthetic_messages(rng, count, devices):
+    """Device keys, and (payload, topic) pairs; a fifth are health updates"""
+    keys = {f"device_{device:04d}": Fernet.generate_key() for device in range(devices)}
+    ciphers = {device_id: Fernet(key) for device_id, key in keys.items()}
+    messages = []
+    for number in range(count):
+        device_id = f"device_{number % devices:04d}"
+        if number % 5 == 4:
+            topic, data = "iot/device/health", {"type": "health_update", "data": {
+                "heart_rate": rng.randint(60, 100), "body_temperature": 36.8, "timestamp": now_ms()}}
+        else:
+            topic, data = "iot/device/location", {"type": "location_update", "data": {
+                "latitude": CENTRE[0] + rng.uniform(-0.1, 0.1), "longitude": CENTRE[1] + rng.uniform(-0.1, 0.1),
+                "accuracy": 5.0, "timestamp": now_ms()}}
+        token = ciphers[device_id].encrypt(json.dumps(data).encode())
+        messages.append(({"device_id": device_id, "tourist_id": f"tourist_{number % devices:04d}",
+                          "data": base64.b64encode(token).decode(), "timestamp": now_ms()}, topic))
+    return keys, messages
+
+
+class NoBroker:
+    def publish(self, *args):
+        pass
+
+
+def run(directory, keys, messages, name, **options):
+    """:return: (messages per second, sorted receive latencies in seconds)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor = IoTDataProcessor(db_path=os.path.join(directory, f"{name}.db"), **options)
+        processor.mqtt_client = NoBroker()
+        for device_id, key in keys.items():
+            processor.register_device(device_id, device_id.replace("device", "tourist"), key.decode())
+
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for payload, topic in messages:
+            received = time.perf_counter()
+            if processor.pipeline is not None:
+                processor.pipeline.submit(payload, topic)
+            else:
+                processor.process_incoming_data(payload, topic)
+            latencies.append(time.perf_counter() - received)
+        processor.close()
+        elapsed = time.perf_counter() - started
+    return len(messages) / elapsed, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message pipeline benchmark")
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--devices', type=int, default=500)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--processes', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    keys, messages = synthetic_messages(random.Random(args.seed), args.messages, args.devices)
+    modes = [("network thread", {"pipeline_workers": 0})]
+    modes += [(f"{workers} worker threads", {"pipeline_workers": workers}) for workers in args.workers]
+    modes += [(f"4 workers, {processes} processes", {"pipeline_workers": 4, "decrypt_processes": processes})
+              for processes in args.processes]
+
+    print(f"{len(messages):,} messages from {args.devices} devices, {os.cpu_count()} CPUs")
+    print(f"{'mode':<28}{'msg/s':>10}{'receive p50 us':>16}{'receive p99 us':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for number, (name, options) in enumerate(modes):
+            throughput, latencies = run(directory, keys, messages, f"mode_{number}", **options)
+            print(f"{name:<28}{throughput:>10,.0f}{latencies[len(latencies) // 2] * 1e6:>16.1f}"
+                  f"{latencies[int(len(latencies) * 0.99)] * 1e6:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Device Cipher Cache for the IoT Data Processor
+This module keeps a ready-made MultiFernet per device in a bounded LRU, so
+decrypting a message needs no database read and no key parsing. A device has
+numbered key versions in device_keys. Its cipher tries the current version
+first, then up to accepted_versions - 1 older ones, so messages encrypted
+before a key rotation still decrypt.
+
+Every change to a device's keys bumps its revision in device_registry. Each
+process polls for revisions newer than the last one it saw and drops those
+devices from its cache. Keys registered or rotated by another process, e.g.
+the API service, therefore take effect within refresh_seconds.
+
+A device without keys is remembered as unknown for unknown_seconds, so a
+stream of messages from an unregistered device does not query SQLite for
+each one; its registration drops it from the unknown devices like any other
+key change.
+
+payload_token is copied into ai/training_pipeline.py, which decrypts stored
+rows for training; tests/test_shared_copies.py checks that the copies match.
+"""
+
+import base64
+import time
+from collections import OrderedDict
+from itertools import groupby
+from threading import Lock
+
+from cryptography.fernet import Fernet, MultiFernet
+
+from iot import metrics
+
+FERNET_TOKEN_PREFIX = 'gAAAAA'  # Version byte 0x80 and a timestamp high word of 0
+
+SELECT_ALL_KEYS = '''
+    SELECT k.device_id, k.version, k.encryption_key
+    FROM device_registry r JOIN device_keys k ON k.device_id = r.device_id
+    WHERE k.version > r.key_version - ?
+    ORDER BY r.revision DESC, k.device_id, k.version DESC
+'''
+SELECT_DEVICE_KEYS = '''
+    SELECT k.version, k.encryption_key
+    FROM device_registry r JOIN device_keys k ON k.device_id = r.device_id
+    WHERE r.device_id = ? AND k.version > r.key_version - ?
+    ORDER BY k.version DESC
+'''
+SELECT_REVISION = 'SELECT COALESCE(MAX(revision), 0) FROM device_registry'
+SELECT_CHANGED = 'SELECT device_id, revision FROM device_registry WHERE revision > ?'
+
+
+def payload_token(encrypted_data):
+    """
+    Fernet token of a message payload. Payloads are normally the base64 of
+    the token; a bare token, which is already base64, is accepted too
+    """
+    if encrypted_data.startswith(FERNET_TOKEN_PREFIX):
+        return encrypted_data
+    return base64.b64decode(encrypted_data)
+
+
+class CipherCache:
+    """
+    Bounded LRU of device_id -> (MultiFernet, current key, current version,
+    accepted keys newest first)
+    """
+
+    def __init__(self, pool, capacity=50000, accepted_versions=2, refresh_seconds=1.0, unknown_seconds=30.0):
+        """
+        :param pool: ConnectionPool of the database holding device_registry
+        :param capacity: Devices whose ciphers are kept at most, and devices
+                         remembered as unknown at most
+        :param accepted_versions: Key versions a device's messages may use,
+                                  counting the current one
+        :param refresh_seconds: How often to check device_registry for keys
+                                changed by other processes
+        :param unknown_seconds: How long a device without keys is answered
+                                from the cache
+        """
+        self.pool = pool
+        self.capacity = capacity
+        self.accepted_versions = accepted_versions
+        self.refresh_seconds = refresh_seconds
+        self.unknown_seconds = unknown_seconds
+        self.entries = OrderedDict()  # Least recently used first
+        self.unknown = OrderedDict()  # device_id -> time it stops being answered from the cache, oldest first
+        self.lock = Lock()
+        self.revision = 0  # Newest device_registry revision seen
+        self.invalidations = 0  # So a load racing an invalidation is not cached
+        self.next_refresh = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load_all(self):
+        """
+        Warm-load the most recently changed devices, up to capacity, in one query
+        :return: Number of devices loaded
+        """
+        with self.pool.connection() as conn:
+            revision = conn.execute(SELECT_REVISION).fetchone()[0]
+            rows = conn.execute(SELECT_ALL_KEYS, (self.accepted_versions,))
+            loaded = OrderedDict()
+            for device_id, keys in groupby(rows, key=lambda row: row[0]):
+                if len(loaded) >= self.capacity:
+                    break
+                try:
+                    loaded[device_id] = self._entry([(version, key) for _, version, key in keys])
+                except ValueError as e:
+                    print(f"Skipping malformed key of device {device_id}: {e}")
+        with self.lock:
+            # Most recently changed last, i.e. the last to be evicted
+            for device_id in reversed(loaded):
+                self.entries[device_id] = loaded[device_id]
+                self.entries.move_to_end(device_id)
+            self._evict()
+            self.revision = max(self.revision, revision)
+            self.next_refresh = time.monotonic() + self.refresh_seconds
+        return len(loaded)
+
+    def get(self, device_id):
+        """
+        :return: (cipher, current key, current version, accepted keys) of a
+                 registered device, or None
+        """
+        now = time.monotonic()
+        if now >= self.next_refresh:
+            self.refresh()
+        with self.lock:
+            entry = self.entries.get(device_id)
+            if entry is not None:
+                self.entries.move_to_end(device_id)
+                metrics.CIPHER_CACHE.labels('hit').inc()
+                return entry
+            if self.unknown.get(device_id, 0.0) > now:
+                metrics.CIPHER_CACHE.labels('unknown').inc()
+                return None
+            invalidations = self.invalidations
+        metrics.CIPHER_CACHE.labels('miss').inc()
+        keys = self.pool.fetchall(SELECT_DEVICE_KEYS, (device_id, self.accepted_versions))
+        if not keys:
+            with self.lock:
+                if invalidations == self.invalidations:
+                    self.unknown.pop(device_id, None)
+                    self.unknown[device_id] = now + self.unknown_seconds
+                    while self.unknown and (len(self.unknown) > self.capacity or
+                                            next(iter(self.unknown.values())) <= now):
+                        self.unknown.popitem(last=False)
+            return None
+        entry = self._entry(keys)
+        with self.lock:
+            if invalidations == self.invalidations:
+                self.entries[device_id] = entry
+                self._evict()
+        return entry
+
+    def invalidate(self, device_id):
+        """Drop a device's cipher; the next message reloads its keys"""
+        with self.lock:
+            self.invalidations += 1
+            self.unknown.pop(device_id, None)
+            if self.entries.pop(device_id, None) is not None:
+                metrics.CIPHER_CACHE.labels('invalidated').inc()
+
+    def refresh(self):
+        """Drop the devices whose keys changed since the last refresh"""
+        with self.lock:
+            self.next_refresh = time.monotonic() + self.refresh_seconds
+            revision = self.revision
+        changed = self.pool.fetchall(SELECT_CHANGED, (revision,))
+        for device_id, device_revision in changed:
+            self.invalidate(device_id)
+            revision = max(revision, device_revision)
+        with self.lock:
+            self.revision = max(self.revision, revision)
+
+    def _entry(self, keys):
+        """:param keys: (version, key) pairs, newest first"""
+        accepted = tuple(key for _, key in keys)
+        return MultiFernet([Fernet(key) for key in accepted]), accepted[0], keys[0][0], accepted
+
+    def _evict(self):
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            metrics.CIPHER_CACHE.labels('evicted').inc()
@@ -3,61 +3,241 @@ IoT Data Processor for Smart Tourist Safety System
 This module processes data received from wearable devices
 """
 
+import atexit
 import json
+import os
 import paho.mqtt.client as mqtt
-from datetime import datetime
 from cryptography.fernet import Fernet
-import base64
-import sqlite3
-from threading import Thread
+from collections import OrderedDict
+from threading import Lock, Thread
 import time
+from iot.ciphers import CipherCache, payload_token
+from iot.geofence import GeofenceEngine
+from iot.pipeline import MessagePipeline
+from iot.trajectory_simplifier import StreamingSimplifier
+from iot.timestamps import now_ms, to_epoch_ms, to_iso
+from iot.storage import ConnectionPool, RowIdBlocks, WriteBehindBuffer
+from iot import metrics
+
+SCHEMA_VERSION = 3  # 1: epoch millisecond timestamps, 2: device_data indexes, 3: versioned keys
+
+TABLES = {
+    'device_data': '''
+        CREATE TABLE IF NOT EXISTS device_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT,
+            tourist_id TEXT,
+            data_type TEXT,
+            data TEXT,
+            timestamp INTEGER,
+            processed BOOLEAN DEFAULT FALSE
+        )
+    ''',
+    'device_registry': '''
+        CREATE TABLE IF NOT EXISTS device_registry (
+            device_id TEXT PRIMARY KEY,
+            tourist_id TEXT,
+            encryption_key TEXT,
+            registered_at INTEGER,
+            key_version INTEGER DEFAULT 1,
+            revision INTEGER DEFAULT 0
+        )
+    ''',
+    'device_keys': '''
+        CREATE TABLE IF NOT EXISTS device_keys (
+            device_id TEXT,
+            version INTEGER,
+            encryption_key TEXT,
+            created_at INTEGER,
+            PRIMARY KEY (device_id, version)
+        )
+    ''',
+}
+# Per-device and per-tourist history, and time windows across all devices
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_device_data_device_time ON device_data (device_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_device_data_tourist_time ON device_data (tourist_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_device_data_time ON device_data (timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_device_registry_revision ON device_registry (revision)',
+]
+TIMESTAMP_COLUMNS = {'device_data': 'timestamp', 'device_registry': 'registered_at'}
+
+# Constant statement text, so each pooled connection prepares them once
+INSERT_DEVICE_DATA = '''
+    INSERT INTO device_data (id, device_id, tourist_id, data_type, data, timestamp, processed)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+# A registry write takes the next revision; writes are serialized, so
+# revisions grow in commit order and other processes can poll for them
+REGISTER_DEVICE = '''
+    INSERT OR REPLACE INTO device_registry
+    (device_id, tourist_id, encryption_key, registered_at, key_version, revision)
+    VALUES (?, ?, ?, ?, 1, (SELECT COALESCE(MAX(revision), 0) + 1 FROM device_registry))
+'''
+ROTATE_DEVICE_KEY = '''
+    UPDATE device_registry
+    SET encryption_key = ?, key_version = ?, revision = (SELECT MAX(revision) + 1 FROM device_registry)
+    WHERE device_id = ?
+'''
+INSERT_DEVICE_KEY = 'INSERT INTO device_keys (device_id, version, encryption_key, created_at) VALUES (?, ?, ?, ?)'
+DELETE_DEVICE_KEYS = 'DELETE FROM device_keys WHERE device_id = ?'
+SELECT_KEY_VERSION = 'SELECT key_version FROM device_registry WHERE device_id = ?'
+MARK_PROCESSED = 'UPDATE device_data SET processed = TRUE WHERE id = ?'
 
 class IoTDataProcessor:
     """
     Processes IoT data from wearable devices
     """
     
-    def __init__(self, mqtt_broker="localhost", mqtt_port=1883, db_path="iot_data.db"):
+    def __init__(self, mqtt_broker="localhost", mqtt_port=1883, db_path="iot_data.db", geofence_path=None,
+                 simplify_tolerance_m=None, simplify_max_gap_seconds=300.0, simplify_idle_seconds=6 * 3600,
+                 write_behind=True, write_buffer_rows=20000, write_batch_size=1000, write_max_delay_seconds=0.05,
+                 cipher_cache_size=50000, key_versions_accepted=2, key_refresh_seconds=1.0,
+                 pipeline_workers=4, pipeline_queue_size=1000, decrypt_processes=0):
+        """
+        :param simplify_tolerance_m: When set, location updates are stored only
+                                     when the simplified track of the device
+                                     needs them (error bound in metres)
+        :param simplify_max_gap_seconds: Longest time between stored points
+        :param simplify_idle_seconds: A device without location updates for
+                                      this long has its held update stored and
+                                      its simplifier dropped
+        :param write_behind: Buffer device_data writes and commit them in
+                             batches from a writer thread
+        :param write_buffer_rows: Buffered writes at most before message
+                                  handling waits for the writer
+        :param write_batch_size: Writes committed at most in one transaction
+        :param write_max_delay_seconds: Longest time a batch is held open; a
+                                        crash can lose about this much data
+        :param cipher_cache_size: Devices whose ready-made ciphers are kept
+        :param key_versions_accepted: Key versions a device may encrypt with,
+                                      counting the current one
+        :param key_refresh_seconds: How soon keys changed by another process
+                                    take effect
+        :param pipeline_workers: Worker threads that process MQTT messages,
+                                 sharded by device; 0 processes them on the
+                                 MQTT network thread
+        :param pipeline_queue_size: Messages each worker queues at most before
+                                    the network thread waits
+        :param decrypt_processes: Processes for decrypting; 0 decrypts on the
+                                  worker threads
+        """
         self.mqtt_broker = mqtt_broker
         self.mqtt_port = mqtt_port
         self.db_path = db_path
+        self.db = ConnectionPool(db_path)
+        self.writer = None
+        self.pipeline = None
         self.mqtt_client = mqtt.Client()
-        self.device_keys = {}  # Store encryption keys for devices
+        self.ciphers = CipherCache(self.db, cipher_cache_size, key_versions_accepted, key_refresh_seconds)
+        self.geofence = GeofenceEngine()
+        self.simplify_tolerance_m = simplify_tolerance_m
+        self.simplify_max_gap_seconds = simplify_max_gap_seconds
+        self.simplify_idle_seconds = simplify_idle_seconds
+        # device_id -> (StreamingSimplifier, last update), least recently updated first
+        self.simplifiers = OrderedDict()
+        self.simplifiers_lock = Lock()
+        self.next_simplifier_sweep = time.monotonic() + simplify_idle_seconds
+        if geofence_path:
+            self.geofence.load_zones_file(geofence_path)
         self.setup_database()
+        self.row_ids = RowIdBlocks(self.db, 'device_data')
+        print(f"Loaded ciphers for {self.ciphers.load_all()} devices")
+        if write_behind:
+            self.writer = WriteBehindBuffer(
+                self.db, max_rows=write_buffer_rows, batch_size=write_batch_size,
+                max_delay_seconds=write_max_delay_seconds, on_flush=self._record_flush,
+                on_full=metrics.WRITE_BUFFER_FULL.inc, on_error=self._record_dropped_writes)
+            metrics.track_queue('device_data_writes', self.writer.pending)
+        if pipeline_workers:
+            self.pipeline = MessagePipeline(self, pipeline_workers, pipeline_queue_size,
+                                            decrypt_processes=decrypt_processes)
+        atexit.register(self.close)
         self.setup_mqtt()
         
     def setup_database(self):
         """
         Set up SQLite database for storing IoT data
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create tables
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS device_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT,
-                tourist_id TEXT,
-                data_type TEXT,
-                data TEXT,
-                timestamp TEXT,
-                processed BOOLEAN DEFAULT FALSE
-            )
-        ''')
+        with self.db.connection() as conn:
+            # Create tables, converting those of an older schema first
+            self.migrate_database(conn)
+            for statement in list(TABLES.values()) + INDEXES:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        print("Database setup completed")
+    
+    def migrate_database(self, conn):
+        """
+        Bring a database written by an older version up to SCHEMA_VERSION, in
+        one transaction:
+        1: tables holding ISO 8601 TEXT timestamps are rebuilt with INTEGER
+           epoch milliseconds; values that do not parse become NULL. The
+           text was written with datetime.now().isoformat(), so values
+           without a UTC offset are read in the local time zone
+        3: device_registry gains key versions and revisions, and each
+           registered key becomes version 1 in device_keys
+        """
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS device_registry (
-                device_id TEXT PRIMARY KEY,
-                tourist_id TEXT,
-                encryption_key TEXT,
-                registered_at TEXT
-            )
-        ''')
+        def epoch_ms(value):
+            try:
+                return to_epoch_ms(value) if value is not None else None
+            except (TypeError, ValueError):
+                return None
         
-        conn.commit()
-        conn.close()
-        print("Database setup completed")
+        conn.create_function('epoch_ms', 1, epoch_ms, deterministic=True)
+        migrated = 0
+        conn.execute('BEGIN')
+        try:
+            for table, column in TIMESTAMP_COLUMNS.items():
+                types = {row[1]: row[2].upper() for row in conn.execute(f'PRAGMA table_info({table})')}
+                if types.get(column, 'INTEGER') == 'INTEGER':
+                    continue
+                columns = list(types)
+                selected = [f'epoch_ms({name})' if name == column else name for name in columns]
+                conn.execute(f'ALTER TABLE {table} RENAME TO {table}_v0')
+                conn.execute(TABLES[table])
+                migrated += conn.execute(f'INSERT INTO {table} ({", ".join(columns)}) '
+                                         f'SELECT {", ".join(selected)} FROM {table}_v0').rowcount
+                conn.execute(f'DROP TABLE {table}_v0')
+            
+            registry = [row[1] for row in conn.execute('PRAGMA table_info(device_registry)')]
+            if registry and version < 3:
+                for column, default in (('key_version', 1), ('revision', 0)):
+                    if column not in registry:
+                        conn.execute(f'ALTER TABLE device_registry ADD COLUMN {column} INTEGER DEFAULT {default}')
+                conn.execute(TABLES['device_keys'])
+                conn.execute('''
+                    INSERT OR IGNORE INTO device_keys (device_id, version, encryption_key, created_at)
+                    SELECT device_id, 1, encryption_key, registered_at FROM device_registry
+                    WHERE encryption_key IS NOT NULL
+                ''')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if migrated:
+            print(f"Migrated {migrated} rows to epoch millisecond timestamps")
+    
+    def _record_flush(self, statements, seconds):
+        metrics.WRITE_BATCH_ROWS.observe(statements)
+        metrics.DB_FLUSH.observe(seconds)
+    
+    def _record_dropped_writes(self, statements, error):
+        metrics.ERRORS.labels('db_write').inc(statements)
+        print(f"Dropped {statements} buffered writes: {error}")
+    
+    def write(self, sql, parameters):
+        """
+        Run a device_data write, through the write-behind buffer when enabled
+        """
+        if self.writer is not None:
+            self.writer.put(sql, parameters)
+        else:
+            self.db.execute(sql, parameters)
     
     def setup_mqtt(self):
         """
@@ -77,8 +257,13 @@ class IoTDataProcessor:
         
         def on_message(client, userdata, msg):
             try:
+                started = time.perf_counter()
                 payload = json.loads(msg.payload.decode())
-                self.process_incoming_data(payload, msg.topic)
+                metrics.lap(metrics.PARSE, started)
+                if self.pipeline is not None:
+                    self.pipeline.submit(payload, msg.topic)
+                else:
+                    self.process_incoming_data(payload, msg.topic)
             except Exception as e:
                 print(f"Error processing message: {e}")
         
@@ -92,112 +277,256 @@ class IoTDataProcessor:
     
     def register_device(self, device_id, tourist_id, encryption_key):
         """
-        Register a device in the system
+        Register a device in the system; a device registered before starts
+        over at key version 1 and its older keys stop working
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO device_registry 
-            (device_id, tourist_id, encryption_key, registered_at)
-            VALUES (?, ?, ?, ?)
-        ''', (device_id, tourist_id, encryption_key, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+        started = time.perf_counter()
+        registered_at = now_ms()
+        with self.db.connection() as conn:
+            conn.execute(DELETE_DEVICE_KEYS, (device_id,))
+            conn.execute(INSERT_DEVICE_KEY, (device_id, 1, encryption_key, registered_at))
+            conn.execute(REGISTER_DEVICE, (device_id, tourist_id, encryption_key, registered_at))
+        metrics.lap(metrics.DB_WRITE, started)
         
-        # Store in memory for quick access
-        self.device_keys[device_id] = encryption_key
+        # Other processes notice the new revision within key_refresh_seconds
+        self.ciphers.invalidate(device_id)
         print(f"Device {device_id} registered for tourist {tourist_id}")
     
+    def rotate_device_key(self, device_id, encryption_key=None):
+        """
+        Give a device a new key version; messages encrypted with the previous
+        key_versions_accepted - 1 versions are still accepted
+        :param encryption_key: New Fernet key, or None to generate one
+        :return: (new key, new version)
+        """
+        encryption_key = encryption_key or Fernet.generate_key().decode()
+        Fernet(encryption_key)  # Reject malformed keys before storing them
+        with self.db.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(SELECT_KEY_VERSION, (device_id,)).fetchone()
+            if row is None:
+                raise Exception(f"Device {device_id} is not registered")
+            version = (row[0] or 1) + 1
+            conn.execute(INSERT_DEVICE_KEY, (device_id, version, encryption_key, now_ms()))
+            conn.execute(ROTATE_DEVICE_KEY, (encryption_key, version, device_id))
+        self.ciphers.invalidate(device_id)
+        print(f"Device {device_id} rotated to key version {version}")
+        return encryption_key, version
+    
     def get_device_key(self, device_id):
         """
-        Get encryption key for a device
+        Get the current encryption key for a device
         """
-        if device_id in self.device_keys:
-            return self.device_keys[device_id]
-        
-        # Fetch from database if not in memory
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT encryption_key FROM device_registry WHERE device_id = ?', (device_id,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            self.device_keys[device_id] = result[0]
-            return result[0]
-        return None
+        entry = self.ciphers.get(device_id)
+        return entry[1] if entry is not None else None
     
     def decrypt_data(self, device_id, encrypted_data):
         """
         Decrypt data from a device
         """
-        key = self.get_device_key(device_id)
-        if not key:
+        try:
+            entry = self.ciphers.get(device_id)
+        except ValueError as e:
+            raise Exception(f"Malformed encryption key for device {device_id}: {e}")
+        if entry is None:
             raise Exception(f"No encryption key found for device {device_id}")
         
+        started = time.perf_counter()
         try:
-            cipher = Fernet(key.encode())
-            encrypted_bytes = base64.b64decode(encrypted_data.encode())
-            decrypted_data = cipher.decrypt(encrypted_bytes)
-            return json.loads(decrypted_data.decode())
+            return json.loads(entry[0].decrypt(payload_token(encrypted_data)))
         except Exception as e:
             raise Exception(f"Failed to decrypt data: {e}")
+        finally:
+            metrics.lap(metrics.DECRYPT, started)
     
-    def store_raw_data(self, device_id, tourist_id, data_type, encrypted_data):
+    def store_raw_data(self, device_id, tourist_id, data_type, encrypted_data, row_id=None, processed=False):
         """
         Store raw encrypted data in database
+        :param row_id: Id reserved for the row with self.row_ids, or None for a new one
+        :return: The row id, known before a buffered row is written
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO device_data 
-            (device_id, tourist_id, data_type, data, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (device_id, tourist_id, data_type, encrypted_data, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+        started = time.perf_counter()
+        if row_id is None:
+            row_id = self.row_ids.next()
+        self.write(INSERT_DEVICE_DATA, (row_id, device_id, tourist_id, data_type, encrypted_data, now_ms(), processed))
+        metrics.lap(metrics.DB_WRITE, started)
+        return row_id
     
     def process_incoming_data(self, payload, topic):
         """
-        Process incoming data from MQTT
+        Process incoming data from MQTT, all steps on the calling thread
+        """
+        message = self.accept_message(payload, topic)
+        if message is None:
+            return
+        try:
+            decrypted_data = self.decrypt_data(message["device_id"], message["data"])
+        except Exception as e:
+            self.finish_message(message, None, e)
+            return
+        self.finish_message(message, decrypted_data)
+    
+    def accept_message(self, payload, topic):
+        """
+        First step for a device message: count it, reserve its row id and
+        store the raw data
+        :return: Message state for decrypting and finish_message, or None if
+                 the payload is unusable
         """
         try:
             device_id = payload.get("device_id")
             tourist_id = payload.get("tourist_id")
             encrypted_data = payload.get("data")
-            timestamp = payload.get("timestamp")
             
-            # Store raw data
+            # Store raw data; with simplification, location updates are stored
+            # once decrypted and only when the simplified track needs them
             data_type = topic.split("/")[-1]  # Extract data type from topic
-            self.store_raw_data(device_id, tourist_id, data_type, encrypted_data)
+            metrics.MESSAGES.labels(data_type).inc()
+            row_id = self.row_ids.next()
+            stored = data_type != "location" or self.simplify_tolerance_m is None
+            if stored:
+                self.store_raw_data(device_id, tourist_id, data_type, encrypted_data, row_id)
+            return {"device_id": device_id, "tourist_id": tourist_id, "data_type": data_type,
+                    "data": encrypted_data, "row_id": row_id, "stored": stored}
+        
+        except Exception as e:
+            metrics.ERRORS.labels('process').inc()
+            print(f"Error processing incoming data: {e}")
+            return None
+    
+    def finish_message(self, message, decrypted_data, error=None):
+        """
+        Last step for a device message: handle the decrypted data by type and
+        mark its row processed
+        :param message: State returned by accept_message
+        :param error: Exception raised while decrypting, if any
+        """
+        device_id = message["device_id"]
+        tourist_id = message["tourist_id"]
+        data_type = message["data_type"]
+        row_id = message["row_id"]
+        stored = message["stored"]
+        held = None  # Update the simplifier holds back, not stored yet
+        try:
+            if error is not None:
+                raise error
+            if not stored:
+                held = self.store_simplified_location(device_id, tourist_id, message["data"], decrypted_data, row_id)
+                stored = True
+            print(f"Processed data from {device_id}: {decrypted_data}")
             
-            # Decrypt and process data
+            # Handle specific data types
+            started = time.perf_counter()
+            if data_type == "sos":
+                self.handle_sos_alert(device_id, tourist_id, decrypted_data)
+            elif data_type == "location":
+                self.handle_location_update(device_id, tourist_id, decrypted_data)
+            elif data_type == "health":
+                self.handle_health_update(device_id, tourist_id, decrypted_data)
+            elif data_type == "heartbeat":
+                self.handle_heartbeat(device_id, tourist_id, decrypted_data)
+            metrics.lap(metrics.HANDLE, started)
+            
+            # Mark as processed; a held update is stored already marked
+            if held is not None:
+                held[3] = True
+            else:
+                self.mark_data_as_processed(row_id)
+            
+        except Exception as e:
+            if e is error:
+                metrics.ERRORS.labels('decrypt').inc()
+                print(f"Error decrypting data from {device_id}: {e}")
+            else:
+                metrics.ERRORS.labels('handle').inc()
+                print(f"Error handling data from {device_id}: {e}")
             try:
-                decrypted_data = self.decrypt_data(device_id, encrypted_data)
-                print(f"Processed data from {device_id}: {decrypted_data}")
-                
-                # Handle specific data types
-                if data_type == "sos":
-                    self.handle_sos_alert(device_id, tourist_id, decrypted_data)
-                elif data_type == "location":
-                    self.handle_location_update(device_id, tourist_id, decrypted_data)
-                elif data_type == "health":
-                    self.handle_health_update(device_id, tourist_id, decrypted_data)
-                elif data_type == "heartbeat":
-                    self.handle_heartbeat(device_id, tourist_id, decrypted_data)
-                
-                # Mark as processed
-                self.mark_data_as_processed(device_id, timestamp)
-                
+                if not stored:
+                    self.store_raw_data(device_id, tourist_id, data_type, message["data"], row_id)
             except Exception as e:
-                print(f"Error decrypting data from {device_id}: {e}")
-                
-        except Exception as e:
-            print(f"Error processing incoming data: {e}")
+                metrics.ERRORS.labels('process').inc()
+                print(f"Error processing incoming data: {e}")
+    
+    def store_simplified_location(self, device_id, tourist_id, encrypted_data, location_data, row_id):
+        """
+        Feed a decrypted location update to the device's simplifier and store the
+        points it emits; the newest point is held until a later one decides on it
+        :param row_id: Id the update is stored under, if it is stored
+        :return: The update if it is held, as [tourist_id, encrypted_data, row_id,
+                 processed]; processed is stored along with it. None if it was stored
+        """
+        location = location_data.get("data", {})
+        latitude = location.get("latitude")
+        longitude = location.get("longitude")
+        if latitude is None or longitude is None:
+            self.store_raw_data(device_id, tourist_id, "location", encrypted_data, row_id)
+            return None
+        
+        timestamp = location.get("timestamp")
+        epoch = to_epoch_ms(timestamp) / 1000 if timestamp is not None else time.time()
+        now = time.monotonic()
+        if now >= self.next_simplifier_sweep:
+            self.sweep_simplifiers(now)
+        with self.simplifiers_lock:
+            # Updated under the lock, so a sweep never takes a device in use
+            entry = self.simplifiers.get(device_id)
+            if entry is None:
+                simplifier = StreamingSimplifier(self.simplify_tolerance_m, self.simplify_max_gap_seconds)
+            else:
+                simplifier = entry[0]
+            self.simplifiers[device_id] = (simplifier, now)
+            self.simplifiers.move_to_end(device_id)
+        
+        latest = simplifier.pending or simplifier.anchor
+        if latest is not None and epoch < latest[2]:
+            # Out of order, so it cannot be judged against the track; keep it
+            self.store_raw_data(device_id, tourist_id, "location", encrypted_data, row_id)
+            return None
+        
+        metrics.SIMPLIFIED_POINTS.labels('seen').inc()
+        update = [tourist_id, encrypted_data, row_id, False]
+        for _, _, _, point in simplifier.push(latitude, longitude, epoch, update):
+            self.store_raw_data(device_id, point[0], "location", point[1], point[2], point[3])
+            metrics.SIMPLIFIED_POINTS.labels('stored').inc()
+        pending = simplifier.pending
+        return update if pending is not None and pending[3] is update else None
+    
+    def flush_simplifiers(self):
+        """
+        Store the location update each device simplifier is still holding
+        """
+        with self.simplifiers_lock:
+            simplifiers = [(device_id, simplifier) for device_id, (simplifier, _) in self.simplifiers.items()]
+        for device_id, simplifier in simplifiers:
+            self._store_held(device_id, simplifier)
+    
+    def sweep_simplifiers(self, now=None):
+        """
+        Store the update held for each device without location updates for
+        simplify_idle_seconds and drop its simplifier; runs from
+        store_simplified_location every simplify_idle_seconds. A device that
+        reports again starts a new track, whose first point is stored
+        :return: Number of devices dropped
+        """
+        now = time.monotonic() if now is None else now
+        idle = []
+        with self.simplifiers_lock:
+            self.next_simplifier_sweep = now + self.simplify_idle_seconds
+            cutoff = now - self.simplify_idle_seconds
+            while self.simplifiers:
+                device_id, (simplifier, updated) = next(iter(self.simplifiers.items()))
+                if updated > cutoff:
+                    break
+                del self.simplifiers[device_id]
+                idle.append((device_id, simplifier))
+        for device_id, simplifier in idle:
+            self._store_held(device_id, simplifier)
+        return len(idle)
+    
+    def _store_held(self, device_id, simplifier):
+        for _, _, _, point in simplifier.flush():
+            self.store_raw_data(device_id, point[0], "location", point[1], point[2], point[3])
+            metrics.SIMPLIFIED_POINTS.labels('stored').inc()
     
     def handle_sos_alert(self, device_id, tourist_id, sos_data):
         """
@@ -227,7 +556,7 @@ class IoTDataProcessor:
             "tourist_id": tourist_id,
             "location": location,
             "health_metrics": health,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": to_iso(now_ms())
         }
         
         self.mqtt_client.publish("iot/alerts/sos", json.dumps(alert_payload))
@@ -239,17 +568,27 @@ class IoTDataProcessor:
         location = location_data.get("data", {})
         print(f"Location update from {device_id}: {location.get('latitude')}, {location.get('longitude')}")
         
-        # In a real implementation, this would:
+        # In a real implementation, this would also:
         # 1. Update tourist location in the main system
-        # 2. Check geo-fencing rules
-        # 3. Feed into AI anomaly detection
+        # 2. Feed into AI anomaly detection
+        
+        # Check geo-fencing rules and publish zone enter/exit events
+        latitude = location.get("latitude")
+        longitude = location.get("longitude")
+        if latitude is not None and longitude is not None:
+            started = time.perf_counter()
+            events = self.geofence.update(device_id, latitude, longitude, tourist_id)
+            metrics.lap(metrics.GEOFENCE, started)
+            for event in events:
+                print(f"Geofence {event['alert_type']} for device {device_id}: zone {event['zone_id']}")
+                self.mqtt_client.publish("iot/alerts/geofence", json.dumps(event))
         
         # Publish to location updates topic
         update_payload = {
             "device_id": device_id,
             "tourist_id": tourist_id,
             "location": location,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": to_iso(now_ms())
         }
         
         self.mqtt_client.publish("iot/updates/location", json.dumps(update_payload))
@@ -277,7 +616,7 @@ class IoTDataProcessor:
                 "device_id": device_id,
                 "tourist_id": tourist_id,
                 "heart_rate": heart_rate,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": to_iso(now_ms())
             }
             
             self.mqtt_client.publish("iot/alerts/health", json.dumps(alert_payload))
@@ -300,26 +639,20 @@ class IoTDataProcessor:
                 "device_id": device_id,
                 "tourist_id": tourist_id,
                 "battery_level": battery_level,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": to_iso(now_ms())
             }
             
             self.mqtt_client.publish("iot/alerts/battery", json.dumps(alert_payload))
     
-    def mark_data_as_processed(self, device_id, timestamp):
+    def mark_data_as_processed(self, row_id):
         """
-        Mark data as processed in the database
+        Mark data as processed in the database, by primary key; buffered marks
+        are committed in bulk along with the rows they follow
+        :param row_id: Id returned by store_raw_data
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE device_data 
-            SET processed = TRUE 
-            WHERE device_id = ? AND timestamp = ?
-        ''', (device_id, timestamp))
-        
-        conn.commit()
-        conn.close()
+        started = time.perf_counter()
+        self.write(MARK_PROCESSED, (row_id,))
+        metrics.lap(metrics.DB_WRITE, started)
     
     def start_processing(self):
         """
@@ -335,11 +668,30 @@ class IoTDataProcessor:
             print("Stopping IoT Data Processor...")
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
+            self.close()
+    
+    def close(self):
+        """
+        Finish the queued messages, store what the simplifiers hold, commit the
+        buffered writes and close the database connections; runs at
+        interpreter exit as well
+        """
+        if self.pipeline is not None:
+            self.pipeline.close()
+        self.flush_simplifiers()
+        if self.writer is not None:
+            self.writer.close()
+        self.db.close()
 
 # Example usage
 if __name__ == "__main__":
-    # Initialize data processor
-    processor = IoTDataProcessor()
+    # Initialize data processor; zones and track simplification are set from
+    # the environment, as for the API service
+    simplify_tolerance_m = os.environ.get("IOT_SIMPLIFY_TOLERANCE_M")
+    processor = IoTDataProcessor(
+        geofence_path=os.environ.get("IOT_GEOFENCE_PATH"),
+        simplify_tolerance_m=float(simplify_tolerance_m) if simplify_tolerance_m else None
+    )
     
     # Start processing (this would run in a separate thread in a real application)
     processor_thread = Thread(target=processor.start_processing)
@@ -6,11 +6,11 @@ This module simulates wearable devices that can transmit location and health met
 import json
 import time
 import random
-from datetime import datetime, timedelta
 import paho.mqtt.client as mqtt
 from cryptography.fernet import Fernet
 import base64
 import hashlib
+from iot.timestamps import now_ms
 
 class WearableDevice:
     """
@@ -24,7 +24,7 @@ class WearableDevice:
         self.cipher = Fernet(self.encryption_key)
         self.is_active = True
         self.battery_level = 100
-        self.last_heartbeat = datetime.now()
+        self.last_heartbeat = now_ms()
         
         # Device capabilities
         self.has_gps = True
@@ -45,7 +45,7 @@ class WearableDevice:
             "longitude": round(base_lng + random.uniform(-0.001, 0.001), 6),
             "altitude": random.randint(200, 300),
             "accuracy": random.randint(3, 10),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_ms()
         }
     
     def get_health_metrics(self):
@@ -57,7 +57,7 @@ class WearableDevice:
             "body_temperature": round(random.uniform(36.5, 37.5), 1),
             "steps": random.randint(0, 10000),
             "calories": random.randint(0, 500),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_ms()
         }
     
     def encrypt_data(self, data):
@@ -81,7 +81,7 @@ class WearableDevice:
         Generate device heartbeat data
         """
         self.battery_level = max(0, self.battery_level - random.uniform(0.1, 0.5))
-        self.last_heartbeat = datetime.now()
+        self.last_heartbeat = now_ms()
         
         return {
             "device_id": self.device_id,
@@ -89,7 +89,7 @@ class WearableDevice:
             "battery_level": round(self.battery_level, 2),
             "signal_strength": random.randint(-90, -50),
             "is_active": self.is_active,
-            "timestamp": self.last_heartbeat.isoformat()
+            "timestamp": self.last_heartbeat
         }
     
     def trigger_sos(self):
@@ -105,7 +105,7 @@ class WearableDevice:
             "alert_type": "SOS",
             "location": location,
             "health_metrics": health,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_ms(),
             "priority": "CRITICAL"
         }
         
@@ -180,7 +180,7 @@ class IoTDeviceManager:
                 "device_id": device_id,
                 "tourist_id": device.tourist_id,
                 "data": encrypted_data,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": now_ms()
             }
             
             try:
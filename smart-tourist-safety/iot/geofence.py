@@ -0,0 +1,205 @@
+"""
+Geofence Engine for Smart Tourist Safety System
+This module indexes restricted areas, unsafe zones and site perimeters in a
+uniform grid and turns location updates into zone enter/exit events
+"""
+
+import json
+import math
+import time
+from iot.timestamps import now_ms, to_iso
+from threading import Lock
+
+
+class GeofenceZone:
+    """
+    A polygonal zone given as a list of (latitude, longitude) vertices
+    """
+
+    def __init__(self, zone_id, polygon, zone_type="restricted", name=None):
+        self.zone_id = zone_id
+        self.zone_type = zone_type
+        self.name = name or zone_id
+        self.polygon = [(float(lat), float(lon)) for lat, lon in polygon]
+        if len(self.polygon) < 3:
+            raise ValueError(f"Zone {zone_id} needs at least three vertices")
+        self.edges = list(zip(self.polygon, self.polygon[1:] + self.polygon[:1]))
+
+        lats = [lat for lat, _ in self.polygon]
+        lons = [lon for _, lon in self.polygon]
+        self.bbox = (min(lats), min(lons), max(lats), max(lons))
+
+    def contains(self, latitude, longitude):
+        """
+        Ray-casting point-in-polygon test
+        """
+        inside = False
+        for (lat1, lon1), (lat2, lon2) in self.edges:
+            if (lat1 > latitude) != (lat2 > latitude):
+                crossing = lon1 + (latitude - lat1) * (lon2 - lon1) / (lat2 - lat1)
+                if longitude < crossing:
+                    inside = not inside
+        return inside
+
+
+class GeofenceIndex:
+    """
+    Immutable grid over a set of zones; every cell lists the zones that cover
+    it completely and the zones whose boundary passes through it
+    """
+
+    EMPTY_CELL = (frozenset(), ())
+
+    def __init__(self, zones, cell_size_deg=0.005):
+        self.zones = {zone.zone_id: zone for zone in zones}
+        self.cell_size = cell_size_deg
+        interior = {}
+        boundary = {}
+
+        for zone in zones:
+            # Cells touched by an edge's bounding box may contain the boundary
+            edge_cells = set()
+            for (lat1, lon1), (lat2, lon2) in zone.edges:
+                for cell in self._cells_in_box(min(lat1, lat2), min(lon1, lon2),
+                                               max(lat1, lat2), max(lon1, lon2)):
+                    edge_cells.add(cell)
+            for cell in edge_cells:
+                boundary.setdefault(cell, []).append(zone)
+
+            # The remaining cells of the bounding box are either fully inside or
+            # fully outside, which the cell centre decides
+            for cell in self._cells_in_box(*zone.bbox):
+                if cell not in edge_cells:
+                    centre_lat = (cell[0] + 0.5) * self.cell_size
+                    centre_lon = (cell[1] + 0.5) * self.cell_size
+                    if zone.contains(centre_lat, centre_lon):
+                        interior.setdefault(cell, set()).add(zone.zone_id)
+
+        self.cells = {}
+        for cell in set(interior) | set(boundary):
+            self.cells[cell] = (frozenset(interior.get(cell, ())), tuple(boundary.get(cell, ())))
+
+    def cell_of(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size))
+
+    def _cells_in_box(self, min_lat, min_lon, max_lat, max_lon):
+        low_lat, low_lon = self.cell_of(min_lat, min_lon)
+        high_lat, high_lon = self.cell_of(max_lat, max_lon)
+        for cell_lat in range(low_lat, high_lat + 1):
+            for cell_lon in range(low_lon, high_lon + 1):
+                yield (cell_lat, cell_lon)
+
+    def zones_at(self, latitude, longitude, cell=None):
+        """
+        Ids of all zones containing a point
+        """
+        interior, boundary = self.cells.get(cell or self.cell_of(latitude, longitude), self.EMPTY_CELL)
+        if not boundary:
+            return interior
+        inside = set(interior)
+        for zone in boundary:
+            if zone.contains(latitude, longitude):
+                inside.add(zone.zone_id)
+        return frozenset(inside)
+
+
+class GeofenceEngine:
+    """
+    Tracks which zones every device is in and emits enter/exit events. The
+    state of a device without updates for idle_seconds is dropped; if it
+    reports again, it gets enter events for the zones it is in
+    """
+
+    def __init__(self, zones=None, cell_size_deg=0.005, idle_seconds=6 * 3600):
+        self.cell_size_deg = cell_size_deg
+        self.index = GeofenceIndex(zones or [], cell_size_deg)
+        self.device_state = {}  # device_id -> (cell, zone ids, last update)
+        self.idle_seconds = idle_seconds
+        self.next_sweep = time.monotonic() + idle_seconds
+        self.lock = Lock()
+
+    def load_zones(self, zones):
+        """
+        Replace the active zones; the new index is built before it is swapped in
+        :param zones: List of dicts with zone_id, polygon, zone_type and name
+        """
+        index = GeofenceIndex([
+            GeofenceZone(zone['zone_id'], zone['polygon'], zone.get('zone_type', 'restricted'), zone.get('name'))
+            for zone in zones
+        ], self.cell_size_deg)
+        with self.lock:
+            self.index = index
+            # Cached cells refer to the old index; keep memberships so the next
+            # update reports only real changes
+            self.device_state = {
+                device_id: (None, zone_ids, seen) for device_id, (_, zone_ids, seen) in self.device_state.items()
+            }
+        print(f"Geofence loaded {len(index.zones)} zones into {len(index.cells)} cells")
+        return len(index.zones)
+
+    def load_zones_file(self, filepath):
+        """
+        Load zones from a JSON file holding a list of zone dicts
+        """
+        with open(filepath) as zone_file:
+            return self.load_zones(json.load(zone_file))
+
+    def update(self, device_id, latitude, longitude, tourist_id=None):
+        """
+        Check a location update against the zones
+        :return: List of enter/exit events (empty when nothing changed)
+        """
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.sweep(now)
+        index = self.index
+        cell = index.cell_of(latitude, longitude)
+        state = self.device_state.get(device_id)
+
+        if state is not None and state[0] == cell:
+            # Membership can only change inside a cell crossed by a zone boundary
+            if not index.cells.get(cell, index.EMPTY_CELL)[1]:
+                self.device_state[device_id] = (cell, state[1], now)
+                return []
+        previous = state[1] if state is not None else frozenset()
+
+        current = index.zones_at(latitude, longitude, cell)
+        self.device_state[device_id] = (cell, current, now)
+        if current == previous:
+            return []
+
+        timestamp = to_iso(now_ms())
+        events = []
+        for event_type, zone_ids in (("GEOFENCE_ENTER", current - previous), ("GEOFENCE_EXIT", previous - current)):
+            for zone_id in zone_ids:
+                zone = index.zones.get(zone_id)
+                events.append({
+                    "alert_type": event_type,
+                    "device_id": device_id,
+                    "tourist_id": tourist_id,
+                    "zone_id": zone_id,
+                    "zone_type": zone.zone_type if zone else None,
+                    "zone_name": zone.name if zone else None,
+                    "location": {"latitude": latitude, "longitude": longitude},
+                    "timestamp": timestamp
+                })
+        return events
+
+    def forget_device(self, device_id):
+        """Drop the cached zone membership of a device"""
+        return self.device_state.pop(device_id, None) is not None
+
+    def sweep(self, now=None):
+        """
+        Drop the state of devices without updates for idle_seconds; runs from
+        update every idle_seconds, so a state lasts at most twice that
+        :return: Number of devices dropped
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.next_sweep = now + self.idle_seconds
+            cutoff = now - self.idle_seconds
+            idle = [device_id for device_id, state in list(self.device_state.items()) if state[2] < cutoff]
+            for device_id in idle:
+                self.device_state.pop(device_id, None)
+        return len(idle)
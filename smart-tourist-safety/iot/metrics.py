@@ -0,0 +1,64 @@
+"""
+Prometheus Metrics for the IoT service
+This module defines the request latency and per-stage timing histograms, the
+message counters and the queue depth gauges exposed at GET /metrics.
+The buckets and helpers are a copy of ai/metrics.py, checked by
+tests/test_shared_copies.py.
+"""
+
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# 100 microseconds to 10 seconds; a decrypt or an SQLite write sits at the low end
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_SECONDS = Histogram('iot_request_duration_seconds', "HTTP request latency",
+                            ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter('iot_requests_total', "HTTP requests served", ['endpoint', 'method', 'status'])
+STAGE_SECONDS = Histogram('iot_stage_duration_seconds', "Time spent in one processing stage",
+                          ['stage'], buckets=LATENCY_BUCKETS)
+MESSAGES = Counter('iot_messages_total', "Device messages received, per data type", ['data_type'])
+SIMPLIFIED_POINTS = Counter('iot_simplified_points_total',
+                            "Location points seen and stored by the trajectory simplifier", ['outcome'])
+ERRORS = Counter('iot_processing_errors_total', "Device messages that failed, per stage", ['stage'])
+WRITE_BATCH_ROWS = Histogram('iot_write_batch_rows', "Statements committed per write-behind transaction",
+                             buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000))
+WRITE_BUFFER_FULL = Counter('iot_write_buffer_full_total', "Writes that waited for room in the write-behind buffer")
+CIPHER_CACHE = Counter('iot_cipher_cache_total', "Device cipher cache lookups and removals", ['outcome'])
+PIPELINE_BACKPRESSURE = Counter('iot_pipeline_backpressure_total',
+                                "Messages that waited for room in a full pipeline queue", ['stage'])
+QUEUE_DEPTH = Gauge('iot_queue_depth', "Items waiting in an internal queue", ['queue'])
+
+# Label children bound once, so the hot paths skip the label lookup
+PARSE = STAGE_SECONDS.labels('parse')
+DECRYPT = STAGE_SECONDS.labels('decrypt')
+DB_WRITE = STAGE_SECONDS.labels('db_write')
+DB_FLUSH = STAGE_SECONDS.labels('db_flush')
+HANDLE = STAGE_SECONDS.labels('handle')
+GEOFENCE = STAGE_SECONDS.labels('geofence')
+
+
+def lap(stage, started):
+    """
+    Record the time since started against a stage
+    :param stage: Bound STAGE_SECONDS child, e.g. PARSE
+    :param started: time.perf_counter() value the stage began at
+    :return: Current perf_counter value, to start the next stage from
+    """
+    now = time.perf_counter()
+    stage.observe(now - started)
+    return now
+
+
+def track_queue(name, depth):
+    """
+    Report a queue depth, read only when /metrics is scraped
+    :param depth: Callable returning the current number of waiting items
+    """
+    QUEUE_DEPTH.labels(name).set_function(depth)
+
+
+def exposition():
+    """:return: (body, content type) of the Prometheus text format"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,202 @@
+"""
+Staged Message Pipeline for the IoT Data Processor
+This module takes device messages off the MQTT network thread and processes
+them in three steps:
+    receive: on the network thread, the parsed message is put on the bounded
+             queue of its shard, chosen by device_id
+    decrypt: a shard worker takes up to batch_size queued messages, stores
+             their raw rows and decrypts them, in its own thread or, with
+             decrypt_processes, in a process pool
+    handle:  the same worker stores, handles and marks them in arrival order
+
+Every message of a device goes through the same shard, so a device's
+messages are handled in the order they arrived. Different devices are
+handled in parallel. With a process pool, a shard sends a whole batch in one
+round trip and handles the previous batch while this one is decrypted.
+
+When a shard queue is full, the receive step waits for room. That stops the
+network thread reading from the broker, which holds back the devices. Each
+wait counts in iot_pipeline_backpressure_total, and each shard's backlog is
+reported as a queue depth.
+"""
+
+import json
+import multiprocessing
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Full, Queue
+from threading import Thread
+
+from cryptography.fernet import Fernet, MultiFernet
+
+from iot import metrics
+from iot.ciphers import payload_token
+
+STOP = object()  # Queue marker that stops a shard worker
+MAX_PROCESS_CIPHERS = 4096
+
+_process_ciphers = {}  # accepted keys -> MultiFernet, in each decrypt process
+
+
+def decrypt_batch(tasks):
+    """
+    Decrypt messages in a decrypt process
+    :param tasks: (device_id, accepted keys or None, encrypted data) triples
+    :return: ([(decrypted data, None) or (None, error message)], seconds spent)
+    """
+    started = time.perf_counter()
+    results = []
+    for device_id, keys, encrypted_data in tasks:
+        if keys is None:
+            results.append((None, f"No encryption key found for device {device_id}"))
+            continue
+        try:
+            cipher = _process_ciphers.get(keys)
+            if cipher is None:
+                if len(_process_ciphers) >= MAX_PROCESS_CIPHERS:
+                    _process_ciphers.clear()
+                cipher = _process_ciphers[keys] = MultiFernet([Fernet(key) for key in keys])
+            results.append((json.loads(cipher.decrypt(payload_token(encrypted_data))), None))
+        except Exception as e:
+            results.append((None, f"Failed to decrypt data: {e}"))
+    return results, time.perf_counter() - started
+
+
+class MessagePipeline:
+    """
+    Sharded worker threads feeding an IoTDataProcessor's accept_message,
+    decrypt and finish_message steps
+    """
+
+    def __init__(self, processor, workers=4, queue_size=1000, batch_size=64, decrypt_processes=0):
+        """
+        :param processor: IoTDataProcessor whose steps the workers run
+        :param workers: Shards, each with its own queue and worker thread
+        :param queue_size: Messages a shard queues at most before receive waits
+        :param batch_size: Messages a worker takes from its queue at once
+        :param decrypt_processes: Processes for Fernet and JSON work; 0 decrypts
+                                  on the worker threads
+        """
+        self.processor = processor
+        self.batch_size = batch_size
+        self.queues = [Queue(maxsize=queue_size) for _ in range(workers)]
+        self.executor = None
+        if decrypt_processes:
+            # The processor's write-behind thread is running by now, so the
+            # children must not be forked from this process: a fork copies
+            # locks held by other threads and can deadlock. They come from a
+            # single-threaded fork server instead, or are spawned where there
+            # is none. The first task starts them now rather than on the
+            # first message
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = ProcessPoolExecutor(decrypt_processes, mp_context=multiprocessing.get_context(method))
+            self.executor.submit(decrypt_batch, []).result()
+        self.closed = False
+        self.threads = []
+        for shard, queue in enumerate(self.queues):
+            metrics.track_queue(f'pipeline_shard_{shard}', queue.qsize)
+            thread = Thread(target=self._run, args=(queue,), name=f"pipeline-{shard}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def pending(self):
+        """:return: Messages queued in all shards"""
+        return sum(queue.qsize() for queue in self.queues)
+
+    def submit(self, payload, topic):
+        """
+        Receive step, on the MQTT network thread; waits while the shard of the
+        message's device is full
+        """
+        device_id = payload.get("device_id") if isinstance(payload, dict) else None
+        queue = self.queues[zlib.crc32(str(device_id).encode()) % len(self.queues)]
+        try:
+            queue.put_nowait((payload, topic))
+        except Full:
+            metrics.PIPELINE_BACKPRESSURE.labels('receive').inc()
+            queue.put((payload, topic))
+
+    def close(self):
+        """Process everything queued, then stop the workers and decrypt processes"""
+        if self.closed:
+            return
+        self.closed = True
+        for queue in self.queues:
+            queue.put(STOP)
+        for thread in self.threads:
+            thread.join()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def _gather(self, queue, block):
+        """
+        :param block: Wait for a first message; otherwise return at once if none is queued
+        :return: (up to batch_size messages, whether the stop marker came)
+        """
+        batch = []
+        try:
+            item = queue.get() if block else queue.get_nowait()
+            while item is not STOP:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                item = queue.get_nowait()
+        except Empty:
+            return batch, False
+        return batch, item is STOP
+
+    def _run(self, queue):
+        previous = None  # Batch being decrypted in the process pool
+        while True:
+            batch, stop = self._gather(queue, block=previous is None)
+            current = None
+            try:
+                messages = [message for message in (self.processor.accept_message(payload, topic)
+                                                    for payload, topic in batch) if message is not None]
+                if self.executor is None:
+                    self._decrypt_and_finish(messages)
+                elif messages:
+                    current = (messages, self._submit(messages))
+                if previous is not None:
+                    self._finish_decrypted(*previous)
+            except Exception as e:
+                metrics.ERRORS.labels('process').inc()
+                print(f"Error processing incoming data: {e}")
+            previous = current
+            if stop:
+                if previous is not None:
+                    self._finish_decrypted(*previous)
+                return
+
+    def _decrypt_and_finish(self, messages):
+        for message in messages:
+            try:
+                decrypted_data = self.processor.decrypt_data(message["device_id"], message["data"])
+            except Exception as e:
+                self.processor.finish_message(message, None, e)
+                continue
+            self.processor.finish_message(message, decrypted_data)
+
+    def _submit(self, messages):
+        """Look up the keys here, where the cipher cache lives, and decrypt in a process"""
+        tasks = []
+        for message in messages:
+            try:
+                entry = self.processor.ciphers.get(message["device_id"])
+            except ValueError:
+                entry = None
+            tasks.append((message["device_id"], entry[3] if entry is not None else None, message["data"]))
+        return self.executor.submit(decrypt_batch, tasks)
+
+    def _finish_decrypted(self, messages, future):
+        try:
+            results, seconds = future.result()
+        except Exception as e:
+            results, seconds = [(None, f"Failed to decrypt data: {e}")] * len(messages), 0.0
+        for message, (decrypted_data, error) in zip(messages, results):
+            metrics.DECRYPT.observe(seconds / len(messages))  # Per message, amortized over the batch
+            if error is not None:
+                self.processor.finish_message(message, None, Exception(error))
+            else:
+                self.processor.finish_message(message, decrypted_data)
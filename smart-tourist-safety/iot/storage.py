@@ -0,0 +1,292 @@
+"""
+SQLite Connection Layer for the IoT services
+This module keeps a small pool of open SQLite connections instead of opening
+one per statement. Every connection runs in WAL journal mode with
+synchronous=NORMAL: a commit appends to the write-ahead log without an fsync,
+readers do not block the writer, and a power loss can lose at most the last
+few commits but never corrupts the database. Statements are prepared once
+per connection and reused from its statement cache, so callers should pass
+constant SQL text with ? parameters.
+
+WriteBehindBuffer takes single-row writes off the caller's thread and commits
+them in batches, trading a bounded loss window for one transaction per batch
+instead of one per row.
+"""
+
+import sqlite3
+import time
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from queue import Empty, Full, LifoQueue, SimpleQueue
+from threading import Event, Lock, Semaphore, Thread
+
+STOP = object()  # Queue marker that stops the writer
+
+
+class ConnectionPool:
+    """
+    Open SQLite connections shared by the threads of one process. A thread
+    takes a connection for one unit of work and returns it afterwards; when
+    none is idle, a new one is opened, and at most max_idle are kept open
+    """
+
+    def __init__(self, db_path, max_idle=4, synchronous="NORMAL", cache_size_kib=16384,
+                 busy_timeout_ms=5000, cached_statements=64):
+        """
+        :param db_path: SQLite database file
+        :param max_idle: Connections kept open between uses
+        :param synchronous: SQLite synchronous level; FULL fsyncs every commit
+        :param cache_size_kib: Page cache per connection
+        :param busy_timeout_ms: How long a writer waits for another one's lock
+        :param cached_statements: Prepared statements kept per connection
+        """
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.idle = LifoQueue(maxsize=max_idle)  # Most recently used first, its pages are warm
+        self.opened = 0
+        self.closed = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_size_kib)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection; an open transaction is committed when the block
+        exits normally and rolled back when it raises
+        """
+        try:
+            conn = self.idle.get_nowait()
+        except Empty:
+            conn = self._open()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn):
+        if self.closed:
+            conn.close()
+            return
+        try:
+            self.idle.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def execute(self, sql, parameters=()):
+        """
+        Run one statement in its own transaction
+        :return: Number of rows changed
+        """
+        with self.connection() as conn:
+            return conn.execute(sql, parameters).rowcount
+
+    def fetchone(self, sql, parameters=()):
+        """:return: First row of a query, or None"""
+        with self.connection() as conn:
+            return conn.execute(sql, parameters).fetchone()
+
+    def fetchall(self, sql, parameters=()):
+        """:return: All rows of a query"""
+        with self.connection() as conn:
+            return conn.execute(sql, parameters).fetchall()
+
+    def close(self):
+        """
+        Checkpoint the write-ahead log into the database file and truncate it,
+        then close the idle connections; connections still borrowed close when
+        returned, and pages they are reading stay in the log
+        """
+        self.closed = True
+        checkpointed = False
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except Empty:
+                break
+            if not checkpointed:
+                try:
+                    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                    checkpointed = True
+                except sqlite3.Error:
+                    pass  # Busy; the last connection to close checkpoints anyway
+            conn.close()
+
+
+class RowIdBlocks:
+    """
+    Primary keys for an AUTOINCREMENT table, handed out before the INSERT so
+    that a buffered row can be referred to before it is written. Ids are
+    reserved a block at a time by advancing the table's sqlite_sequence entry.
+    SQLite never assigns an id at or below it, so neither other processes
+    writing the same database nor INSERTs without an id can reuse them. Ids
+    left over when a process stops are skipped
+    """
+
+    def __init__(self, pool, table, block_size=1000):
+        self.pool = pool
+        self.table = table
+        self.block_size = block_size
+        self.lock = Lock()
+        self.next_id = 1
+        self.last_id = 0  # Last id of the reserved block
+
+    def next(self):
+        """:return: An id no other row of the table has or will get"""
+        with self.lock:
+            if self.next_id > self.last_id:
+                self._reserve()
+            row_id = self.next_id
+            self.next_id += 1
+            return row_id
+
+    def _reserve(self):
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(f'''
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT ?, (SELECT COALESCE(MAX(rowid), 0) FROM {self.table})
+                WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+            ''', (self.table, self.table))
+            conn.execute('UPDATE sqlite_sequence SET seq = seq + ? WHERE name = ?', (self.block_size, self.table))
+            self.last_id = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (self.table,)).fetchone()[0]
+        self.next_id = self.last_id - self.block_size + 1
+
+
+class WriteBehindBuffer:
+    """
+    Bounded buffer of write statements committed by a dedicated writer
+    thread. The writer takes whatever is waiting, up to batch_size statements
+    gathered for at most max_delay_seconds, and commits them in one
+    transaction; runs of the same statement go through one executemany.
+    Statements are committed in the order they were put. When the buffer is
+    full, put blocks, which holds back the MQTT network thread and so the
+    broker
+    """
+
+    def __init__(self, pool, max_rows=20000, batch_size=1000, max_delay_seconds=0.05, retries=3,
+                 on_flush=None, on_full=None, on_error=None):
+        """
+        :param pool: ConnectionPool the writer commits through
+        :param max_rows: Statements buffered at most before put blocks
+        :param batch_size: Statements committed at most in one transaction
+        :param max_delay_seconds: Longest time the writer holds a batch open for
+                                  more statements; with the commit time, what
+                                  a crash can lose at most
+        :param retries: Attempts to commit a batch before it is dropped
+        :param on_flush: Called with (statements, seconds) after each commit
+        :param on_full: Called when a put has to wait for room
+        :param on_error: Called with (statements, error) when a batch is dropped
+        """
+        self.pool = pool
+        self.batch_size = batch_size
+        self.max_delay_seconds = max_delay_seconds
+        self.retries = retries
+        self.on_flush = on_flush
+        self.on_full = on_full
+        self.on_error = on_error
+        self.queue = SimpleQueue()
+        self.slots = Semaphore(max_rows)  # Room left in the buffer
+        self.lock = Lock()
+        self.closed = False
+        self.writer = Thread(target=self._run, name="write-behind", daemon=True)
+        self.writer.start()
+
+    def pending(self):
+        """:return: Statements waiting to be committed"""
+        return self.queue.qsize()
+
+    def put(self, sql, parameters):
+        """
+        Queue one statement; blocks while the buffer is full. After close the
+        statement is committed directly
+        """
+        if not self.slots.acquire(blocking=False):
+            if self.on_full is not None:
+                self.on_full()
+            self.slots.acquire()
+        with self.lock:
+            if not self.closed:
+                self.queue.put((sql, parameters))
+                return
+        self.slots.release()
+        self.pool.execute(sql, parameters)
+
+    def flush(self):
+        """Wait until every statement put so far is committed"""
+        done = Event()
+        with self.lock:
+            if self.closed:
+                return
+            self.queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Commit what is buffered and stop the writer; safe to call twice"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.queue.put(STOP)
+        self.writer.join()
+
+    def _run(self):
+        while True:
+            marker = self.queue.get()
+            if isinstance(marker, tuple):
+                self.slots.release()
+                batch, marker = self._gather(marker)
+                self._commit(batch)
+            if marker is STOP:
+                return
+            if marker is not None:
+                marker.set()
+
+    def _gather(self, first):
+        """
+        Statements from first on, until there are batch_size of them, the
+        oldest is due, or a flush or stop marker arrives
+        :return: (batch, marker or None)
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except Empty:
+                break
+            if not isinstance(item, tuple):
+                return batch, item
+            self.slots.release()
+            batch.append(item)
+        return batch, None
+
+    def _commit(self, batch):
+        started = time.perf_counter()
+        for attempt in range(self.retries):
+            try:
+                with self.pool.connection() as conn:
+                    for sql, rows in groupby(batch, key=itemgetter(0)):
+                        conn.executemany(sql, [parameters for _, parameters in rows])
+                break
+            except sqlite3.Error as e:
+                if attempt == self.retries - 1:
+                    if self.on_error is not None:
+                        self.on_error(len(batch), e)
+                    return
+                time.sleep(0.1 * 2 ** attempt)
+        if self.on_flush is not None:
+            self.on_flush(len(batch), time.perf_counter() - started)
@@ -0,0 +1,28 @@
+"""
+Shared setup for the IoT service tests
+The modules import each other as the iot package, from the smart-tourist-safety directory
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from iot.data_processor import IoTDataProcessor
+
+
+@pytest.fixture
+def make_processor(tmp_path):
+    """Factory of processors on a database in tmp_path; closed after the test"""
+    processors = []
+
+    def make(db_name='iot_data.db', **options):
+        options.setdefault('mqtt_port', 1)  # Nothing listens there; the connect fails at once
+        processor = IoTDataProcessor(db_path=str(tmp_path / db_name), **options)
+        processors.append(processor)
+        return processor
+    yield make
+    for processor in processors:
+        processor.close()
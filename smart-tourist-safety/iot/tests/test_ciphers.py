@@ -0,0 +1,90 @@
+"""
+Device keys: messages encrypted before a rotation still decrypt, and
+devices without keys are answered from the cache
+"""
+
+import base64
+import json
+
+import pytest
+from cryptography.fernet import Fernet
+
+from iot.ciphers import CipherCache
+
+MESSAGE = {"data": {"latitude": 27.175, "longitude": 78.042}}
+
+
+def encrypt(key, bare=False):
+    token = Fernet(key).encrypt(json.dumps(MESSAGE).encode())
+    return token.decode() if bare else base64.b64encode(token).decode()
+
+
+@pytest.fixture
+def processor(make_processor):
+    return make_processor(write_behind=False, pipeline_workers=0)
+
+
+def test_rotated_key_accepts_the_previous_version(processor):
+    first = Fernet.generate_key().decode()
+    processor.register_device('device_1', 'tourist_1', first)
+    second, version = processor.rotate_device_key('device_1')
+
+    assert version == 2
+    assert processor.get_device_key('device_1') == second
+    assert processor.decrypt_data('device_1', encrypt(first)) == MESSAGE
+    assert processor.decrypt_data('device_1', encrypt(second, bare=True)) == MESSAGE
+
+    third, version = processor.rotate_device_key('device_1')
+    assert version == 3
+    assert processor.decrypt_data('device_1', encrypt(second)) == MESSAGE
+    assert processor.decrypt_data('device_1', encrypt(third)) == MESSAGE
+    with pytest.raises(Exception, match="Failed to decrypt"):
+        processor.decrypt_data('device_1', encrypt(first))
+
+
+def test_registration_starts_over_at_version_one(processor):
+    first = Fernet.generate_key().decode()
+    processor.register_device('device_1', 'tourist_1', first)
+    processor.rotate_device_key('device_1')
+
+    fresh = Fernet.generate_key().decode()
+    processor.register_device('device_1', 'tourist_1', fresh)
+
+    assert processor.ciphers.get('device_1')[2] == 1
+    with pytest.raises(Exception, match="Failed to decrypt"):
+        processor.decrypt_data('device_1', encrypt(first))
+
+
+def test_rotation_by_another_process_is_picked_up(processor):
+    first = Fernet.generate_key().decode()
+    processor.register_device('device_1', 'tourist_1', first)
+    other = CipherCache(processor.db, refresh_seconds=0)
+    assert other.get('device_1')[1] == first
+
+    second, _ = processor.rotate_device_key('device_1')
+
+    assert other.get('device_1')[1:3] == (second, 2)
+
+
+def test_unknown_devices_are_cached_until_registered(processor, monkeypatch):
+    cache = CipherCache(processor.db, refresh_seconds=0)
+    queries = []
+    fetchall = processor.db.fetchall
+    monkeypatch.setattr(processor.db, 'fetchall',
+                        lambda sql, parameters=(): queries.append(sql) or fetchall(sql, parameters))
+
+    for _ in range(5):
+        assert cache.get('device_1') is None
+    assert sum('device_keys' in sql for sql in queries) == 1
+
+    key = Fernet.generate_key().decode()
+    processor.register_device('device_1', 'tourist_1', key)
+
+    assert cache.get('device_1')[1] == key
+
+
+def test_unknown_devices_expire(processor):
+    cache = CipherCache(processor.db, unknown_seconds=0)
+
+    assert cache.get('device_1') is None
+    assert not cache.unknown
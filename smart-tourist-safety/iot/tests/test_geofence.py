@@ -0,0 +1,47 @@
+"""
+Zone enter/exit events and device state expiry
+"""
+
+from iot.geofence import GeofenceEngine
+
+SQUARE = [{"zone_id": "zone_1", "polygon": [[0.0, 0.0], [0.0, 0.1], [0.1, 0.1], [0.1, 0.0]]}]
+
+
+def engine():
+    geofence = GeofenceEngine()
+    geofence.load_zones(SQUARE)
+    return geofence
+
+
+def events(geofence, device_id, latitude, longitude):
+    return [(event["alert_type"], event["zone_id"]) for event in geofence.update(device_id, latitude, longitude)]
+
+
+def test_enter_and_exit_events_are_emitted_once():
+    geofence = engine()
+
+    assert events(geofence, "device_1", 0.05, 0.05) == [("GEOFENCE_ENTER", "zone_1")]
+    assert events(geofence, "device_1", 0.051, 0.05) == []
+    assert events(geofence, "device_1", 0.2, 0.2) == [("GEOFENCE_EXIT", "zone_1")]
+    assert events(geofence, "device_1", 0.3, 0.3) == []
+
+
+def test_reloading_zones_keeps_memberships():
+    geofence = engine()
+    events(geofence, "device_1", 0.05, 0.05)
+
+    geofence.load_zones(SQUARE)
+
+    assert events(geofence, "device_1", 0.05, 0.05) == []
+
+
+def test_idle_devices_are_dropped():
+    geofence = engine()
+    events(geofence, "device_1", 0.05, 0.05)
+    events(geofence, "device_2", 0.05, 0.05)
+    cell, zone_ids, seen = geofence.device_state["device_1"]
+    geofence.device_state["device_1"] = (cell, zone_ids, seen - geofence.idle_seconds - 1)
+
+    assert geofence.sweep() == 1
+    assert list(geofence.device_state) == ["device_2"]
+    assert events(geofence, "device_1", 0.05, 0.05) == [("GEOFENCE_ENTER", "zone_1")]
@@ -0,0 +1,100 @@
+"""
+A database written by the first release is migrated to the current schema
+"""
+
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from iot.data_processor import SCHEMA_VERSION
+from iot.timestamps import to_epoch_ms
+
+# Schema and writes of the first release, which stored datetime.now().isoformat()
+BASELINE_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS device_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id TEXT,
+        tourist_id TEXT,
+        data_type TEXT,
+        data TEXT,
+        timestamp TEXT,
+        processed BOOLEAN DEFAULT FALSE
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS device_registry (
+        device_id TEXT PRIMARY KEY,
+        tourist_id TEXT,
+        encryption_key TEXT,
+        registered_at TEXT
+    )
+    ''',
+]
+KOLKATA = timezone(timedelta(hours=5, minutes=30))
+
+
+@pytest.fixture
+def kolkata(monkeypatch):
+    monkeypatch.setenv('TZ', 'Asia/Kolkata')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'iot_data.db')
+    for statement in BASELINE_TABLES:
+        conn.execute(statement)
+    conn.execute("INSERT INTO device_registry VALUES ('device_1', 'tourist_1', 'a2V5', '2025-09-08T10:00:00.123456')")
+    conn.executemany(
+        'INSERT INTO device_data (device_id, tourist_id, data_type, data, timestamp, processed) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        [('device_1', 'tourist_1', 'location', 'token_1', '2025-09-08T10:05:00.250000', True),
+         ('device_1', 'tourist_1', 'health', 'token_2', '2025-09-08T10:06:00+00:00', False),
+         ('device_1', 'tourist_1', 'location', 'token_3', 'not a timestamp', False)])
+    conn.commit()
+    conn.close()
+    return tmp_path
+
+
+def columns(conn, table):
+    return {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def test_baseline_database_is_migrated(kolkata, baseline_db, make_processor):
+    processor = make_processor(write_behind=False, pipeline_workers=0)
+
+    with processor.db.connection() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+        assert columns(conn, 'device_data')['timestamp'] == 'INTEGER'
+        assert columns(conn, 'device_registry')['registered_at'] == 'INTEGER'
+        rows = conn.execute('SELECT id, data, timestamp, processed FROM device_data ORDER BY id').fetchall()
+        registry = conn.execute('SELECT registered_at, key_version, revision FROM device_registry').fetchall()
+        keys = conn.execute('SELECT device_id, version, encryption_key, created_at FROM device_keys').fetchall()
+        indexes = {row[1] for row in conn.execute('PRAGMA index_list(device_data)')}
+
+    # Naive text was written in the processor's local time zone
+    registered_at = to_epoch_ms(datetime(2025, 9, 8, 10, 0, 0, 123456, tzinfo=KOLKATA))
+    assert rows == [
+        (1, 'token_1', to_epoch_ms(datetime(2025, 9, 8, 10, 5, 0, 250000, tzinfo=KOLKATA)), 1),
+        (2, 'token_2', to_epoch_ms('2025-09-08T10:06:00+00:00'), 0),
+        (3, 'token_3', None, 0),
+    ]
+    assert registry == [(registered_at, 1, 0)]
+    assert keys == [('device_1', 1, 'a2V5', registered_at)]
+    assert {'idx_device_data_device_time', 'idx_device_data_time'} <= indexes
+
+
+def test_migrated_database_opens_unchanged(kolkata, baseline_db, make_processor):
+    make_processor(write_behind=False, pipeline_workers=0).close()
+    processor = make_processor(write_behind=False, pipeline_workers=0)
+
+    with processor.db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM device_keys').fetchone()[0] == 1
+        assert conn.execute('SELECT timestamp FROM device_data WHERE id = 1').fetchone()[0] == \
+            to_epoch_ms(datetime(2025, 9, 8, 10, 5, 0, 250000, tzinfo=KOLKATA))
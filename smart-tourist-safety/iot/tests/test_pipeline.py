@@ -0,0 +1,76 @@
+"""
+Message pipeline: a device's messages are handled in the order they arrived,
+and failures are counted against the step they happened in
+"""
+
+import base64
+import json
+
+import pytest
+from cryptography.fernet import Fernet
+from prometheus_client import REGISTRY
+
+DEVICES = [f"device_{index}" for index in range(6)]
+
+
+def message(key, device_id, sequence):
+    data = {"data": {"latitude": 27.175 + sequence * 1e-4, "longitude": 78.042, "sequence": sequence}}
+    token = Fernet(key).encrypt(json.dumps(data).encode())
+    return {"device_id": device_id, "tourist_id": f"tourist_{device_id}", "data": base64.b64encode(token).decode()}
+
+
+def errors(stage):
+    return REGISTRY.get_sample_value('iot_processing_errors_total', {'stage': stage}) or 0.0
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    """Sequence numbers of the handled location updates, per device"""
+    from iot.data_processor import IoTDataProcessor
+
+    sequences = {}
+    handle = IoTDataProcessor.handle_location_update
+
+    def record(self, device_id, tourist_id, location_data):
+        sequences.setdefault(device_id, []).append(location_data["data"]["sequence"])
+        return handle(self, device_id, tourist_id, location_data)
+    monkeypatch.setattr(IoTDataProcessor, 'handle_location_update', record)
+    return sequences
+
+
+@pytest.mark.parametrize('decrypt_processes', [0, 2])
+def test_each_device_is_handled_in_arrival_order(make_processor, handled, decrypt_processes):
+    processor = make_processor(pipeline_workers=3, decrypt_processes=decrypt_processes)
+    assert (processor.pipeline.executor is not None) == bool(decrypt_processes)
+    keys = {device_id: Fernet.generate_key().decode() for device_id in DEVICES}
+    for device_id, key in keys.items():
+        processor.register_device(device_id, f"tourist_{device_id}", key)
+
+    for sequence in range(200):
+        device_id = DEVICES[sequence * 7 % len(DEVICES)]
+        processor.pipeline.submit(message(keys[device_id], device_id, sequence), 'iot/device/location')
+    processor.close()
+
+    assert sorted(handled) == DEVICES
+    for device_id, sequences in handled.items():
+        assert sequences == sorted(sequences)
+    assert sum(len(sequences) for sequences in handled.values()) == 200
+    with processor.db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM device_data WHERE processed').fetchone()[0] == 200
+
+
+def test_failures_are_counted_per_step(make_processor, monkeypatch):
+    processor = make_processor(pipeline_workers=1)
+    key = Fernet.generate_key().decode()
+    processor.register_device('device_1', 'tourist_1', key)
+    decrypt_errors, handle_errors = errors('decrypt'), errors('handle')
+
+    def fail(device_id, tourist_id, location_data):
+        raise RuntimeError("handler failed")
+    monkeypatch.setattr(processor, 'handle_location_update', fail)
+    processor.pipeline.submit(message(key, 'device_1', 1), 'iot/device/location')
+    processor.pipeline.submit(message(Fernet.generate_key().decode(), 'device_1', 2), 'iot/device/location')
+    processor.close()
+
+    assert errors('decrypt') - decrypt_errors == 1
+    assert errors('handle') - handle_errors == 1
@@ -0,0 +1,48 @@
+"""
+The AI and IoT services are built into separate images, so each carries its
+own copy of the code they share; the copies must stay identical
+"""
+
+import ast
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (ai module, iot module) -> definitions both carry
+SHARED = {
+    ('trajectory_simplifier.py', 'trajectory_simplifier.py'): ['METRES_PER_DEGREE', 'StreamingSimplifier'],
+    ('metrics.py', 'metrics.py'): ['LATENCY_BUCKETS', 'lap', 'track_queue', 'exposition'],
+    ('timestamps.py', 'timestamps.py'): ['EPOCH', 'EPOCH_MS_CUTOFF', 'to_epoch_ms'],
+    ('training_pipeline.py', 'ciphers.py'): ['FERNET_TOKEN_PREFIX', 'payload_token'],
+}
+
+
+def definitions(*path):
+    """:return: Top-level name -> dumped AST (docstrings included, comments not)"""
+    with open(os.path.join(ROOT, *path)) as f:
+        tree = ast.parse(f.read())
+    found = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            found[node.name] = ast.dump(node)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    found[target.id] = ast.dump(node.value)
+    return found
+
+
+@pytest.mark.parametrize('ai_module, iot_module', sorted(SHARED))
+def test_shared_definitions_are_identical(ai_module, iot_module):
+    ai, iot = definitions('ai', ai_module), definitions('iot', iot_module)
+
+    for name in SHARED[ai_module, iot_module]:
+        assert name in ai and name in iot, f"{name} missing from ai/{ai_module} or iot/{iot_module}"
+        assert ai[name] == iot[name], f"ai/{ai_module} and iot/{iot_module} disagree on {name}"
+
+
+def test_earth_radius_matches_geo_kernels():
+    assert definitions('iot', 'trajectory_simplifier.py')['EARTH_RADIUS_M'] == \
+        definitions('ai', 'geo_kernels.py')['EARTH_RADIUS_M']
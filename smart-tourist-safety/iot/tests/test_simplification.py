@@ -0,0 +1,68 @@
+"""
+Simplified location storage: a device's held update is stored when the device
+goes idle, and its simplifier is dropped
+"""
+
+import time
+
+import pytest
+
+
+def update(processor, device_id, sequence):
+    """Feed a decrypted location update, one metre on from the last, ten seconds later"""
+    location = {"data": {"latitude": 27.175 + sequence * 1e-5, "longitude": 78.042, "timestamp": 1757325600000 + sequence * 10000}}
+    return processor.store_simplified_location(device_id, f"tourist_{device_id}", f"{device_id}-{sequence}",
+                                               location, processor.row_ids.next())
+
+
+def stored(processor):
+    with processor.db.connection() as conn:
+        return [row[0] for row in conn.execute('SELECT data FROM device_data ORDER BY id')]
+
+
+@pytest.fixture
+def processor(make_processor):
+    return make_processor(simplify_tolerance_m=10, write_behind=False, pipeline_workers=0,
+                          simplify_idle_seconds=60)
+
+
+def test_an_idle_device_has_its_held_update_stored_and_is_dropped(processor):
+    for sequence in range(3):
+        update(processor, "device_a", sequence)
+    update(processor, "device_b", 0)
+    assert stored(processor) == ["device_a-0", "device_b-0"]
+
+    assert processor.sweep_simplifiers(time.monotonic() + 30) == 0
+    assert processor.sweep_simplifiers(time.monotonic() + 61) == 2
+
+    # Stored under the row id it reserved on arrival
+    assert stored(processor) == ["device_a-0", "device_a-2", "device_b-0"]
+    assert not processor.simplifiers
+
+
+def test_recently_updated_devices_are_kept(processor):
+    update(processor, "device_a", 0)
+    update(processor, "device_b", 0)
+    time.sleep(0.01)
+    update(processor, "device_a", 1)
+    _, updated = processor.simplifiers["device_b"]
+
+    assert list(processor.simplifiers) == ["device_b", "device_a"]
+    assert processor.sweep_simplifiers(updated + 60) == 1
+    assert list(processor.simplifiers) == ["device_a"]
+
+
+def test_updates_sweep_idle_devices_and_a_returning_device_starts_a_new_track(processor):
+    processor.simplify_idle_seconds = 0.05
+    update(processor, "device_a", 0)
+    update(processor, "device_a", 1)
+    time.sleep(0.1)
+    processor.next_simplifier_sweep = 0
+
+    update(processor, "device_b", 0)
+    assert "device_a" not in processor.simplifiers
+    assert stored(processor) == ["device_a-0", "device_a-1", "device_b-0"]
+
+    # The first point of a new track is always stored
+    assert update(processor, "device_a", 2) is None
+    assert stored(processor)[-1] == "device_a-2"
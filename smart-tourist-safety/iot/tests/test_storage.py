@@ -0,0 +1,259 @@
+"""
+Write-behind buffer: statements are committed in order, in bounded batches,
+and flush and close wait for them. Pooled connections are reused most recent
+first and closing checkpoints the log. Reserved row ids are never handed out
+twice, and rows are marked processed by them
+"""
+
+import base64
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+
+import pytest
+from cryptography.fernet import Fernet
+
+from iot.storage import ConnectionPool, RowIdBlocks, WriteBehindBuffer
+
+INSERT = 'INSERT INTO events (id, value) VALUES (?, ?)'
+APPEND = "UPDATE events SET value = value || ? WHERE id = ?"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'events.db'))
+    pool.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, value TEXT)')
+    yield pool
+    pool.close()
+
+
+def rows(pool):
+    return sqlite3.connect(pool.db_path).execute('SELECT id, value FROM events ORDER BY id').fetchall()
+
+
+def test_statements_commit_in_put_order(pool):
+    flushes = []
+    buffer = WriteBehindBuffer(pool, batch_size=7, on_flush=lambda statements, seconds: flushes.append(statements))
+
+    # Every update depends on the insert and the updates put before it
+    for row in range(20):
+        buffer.put(INSERT, (row, 'a'))
+        buffer.put(APPEND, ('b', row))
+        if row:
+            buffer.put(APPEND, (str(row), row - 1))
+    buffer.flush()
+
+    assert rows(pool) == [(row, 'ab' + str(row + 1) if row < 19 else 'ab') for row in range(20)]
+    assert max(flushes) <= 7
+    assert sum(flushes) == 59
+    buffer.close()
+
+
+def test_flush_commits_without_waiting_for_the_delay(pool):
+    flushes = []
+    buffer = WriteBehindBuffer(pool, max_delay_seconds=60,
+                               on_flush=lambda statements, seconds: flushes.append(statements))
+    for row in range(5):
+        buffer.put(INSERT, (row, 'a'))
+
+    buffer.flush()
+
+    assert len(rows(pool)) == 5
+    assert flushes == [5]
+    assert buffer.pending() == 0
+    buffer.close()
+
+
+def test_close_commits_and_later_writes_go_direct(pool):
+    buffer = WriteBehindBuffer(pool, max_delay_seconds=60)
+    buffer.put(INSERT, (1, 'a'))
+
+    buffer.close()
+    buffer.close()
+    assert rows(pool) == [(1, 'a')]
+
+    buffer.put(INSERT, (2, 'b'))
+    buffer.flush()
+    assert rows(pool) == [(1, 'a'), (2, 'b')]
+
+
+def test_full_buffer_holds_back_the_caller(pool):
+    full = Event()
+    buffer = WriteBehindBuffer(pool, max_rows=2, max_delay_seconds=0, on_full=full.set)
+
+    # Another writer holds the database lock, so the writer thread cannot commit
+    blocker = sqlite3.connect(pool.db_path, isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    producer = Thread(target=lambda: [buffer.put(INSERT, (row, 'a')) for row in range(10)])
+    producer.start()
+
+    assert full.wait(5)
+    assert producer.is_alive()
+    blocker.execute('COMMIT')
+    blocker.close()
+    producer.join(5)
+    buffer.flush()
+
+    assert [row for row, _ in rows(pool)] == list(range(10))
+    buffer.close()
+
+
+def test_failed_batch_is_reported_and_writing_continues(pool):
+    errors = []
+    buffer = WriteBehindBuffer(pool, retries=1, on_error=lambda statements, error: errors.append(statements))
+    buffer.put(INSERT, (1, 'a'))
+    buffer.put(INSERT, (1, 'duplicate'))
+    buffer.flush()
+
+    buffer.put(INSERT, (2, 'b'))
+    buffer.flush()
+
+    assert errors == [2]
+    assert rows(pool) == [(2, 'b')]
+    buffer.close()
+
+
+def test_the_most_recently_returned_connection_is_reused(pool):
+    with pool.connection() as first:
+        with pool.connection() as second:
+            assert second is not first
+    # second went back first, so first is on top
+    with pool.connection() as conn:
+        assert conn is first
+    with pool.connection() as conn:
+        with pool.connection() as other:
+            assert (conn, other) == (first, second)
+    assert pool.opened == 2
+
+
+def test_connections_beyond_max_idle_are_closed(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'idle.db'), max_idle=1)
+    with pool.connection() as first:
+        with pool.connection() as second:
+            pass
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute('SELECT 1')
+    with pool.connection() as conn:
+        assert conn is second
+    pool.close()
+
+
+def test_a_connection_returned_after_close_is_closed(pool):
+    with pool.connection() as borrowed:
+        pool.close()
+        assert borrowed.execute('SELECT COUNT(*) FROM events').fetchone() == (0,)
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        borrowed.execute('SELECT 1')
+    assert pool.idle.empty()
+
+
+def test_close_checkpoints_and_truncates_the_log(pool):
+    # Another process keeps the database open, so closing alone would leave the log
+    other = sqlite3.connect(pool.db_path)
+    other.execute('SELECT COUNT(*) FROM events').fetchone()
+    for row in range(100):
+        pool.execute(INSERT, (row, 'x' * 100))
+    wal = pool.db_path + '-wal'
+    assert os.path.getsize(wal) > 0
+
+    pool.close()
+
+    assert os.path.getsize(wal) == 0
+    assert other.execute('SELECT COUNT(*) FROM events').fetchone() == (100,)
+    other.close()
+
+
+@pytest.fixture
+def autoincrement(tmp_path):
+    """Path of a database with an AUTOINCREMENT table, as device_data is"""
+    db_path = str(tmp_path / 'ids.db')
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT)')
+        conn.execute("INSERT INTO items (value) VALUES ('existing')")
+    return db_path
+
+
+def test_reserved_ids_are_unique_across_processors_and_restarts(autoincrement):
+    first, second = ConnectionPool(autoincrement), ConnectionPool(autoincrement)
+    ids = RowIdBlocks(first, 'items', block_size=5), RowIdBlocks(second, 'items', block_size=5)
+
+    handed_out = [ids[turn % 3 == 0].next() for turn in range(40)]
+    assert len(set(handed_out)) == 40
+    assert min(handed_out) > 1  # Above the row already in the table
+
+    # An INSERT without an id lands above every reserved block
+    first.execute("INSERT INTO items (value) VALUES ('plain')")
+    plain = first.fetchone("SELECT id FROM items WHERE value = 'plain'")[0]
+    assert plain > max(handed_out)
+
+    # A restarted processor skips the ids left over in the old blocks
+    first.close()
+    restarted = RowIdBlocks(ConnectionPool(autoincrement), 'items', block_size=5)
+    assert restarted.next() > max(handed_out + [plain])
+    second.close()
+
+
+def test_threads_sharing_blocks_get_distinct_ids(autoincrement):
+    pool = ConnectionPool(autoincrement)
+    ids = RowIdBlocks(pool, 'items', block_size=7)
+
+    with ThreadPoolExecutor(max_workers=4) as threads:
+        handed_out = list(threads.map(lambda _: ids.next(), range(400)))
+
+    assert len(set(handed_out)) == 400
+    pool.close()
+
+
+def location_message(key, device_id, sequence):
+    data = {"data": {"latitude": 27.175, "longitude": 78.042, "sequence": sequence}}
+    token = Fernet(key).encrypt(json.dumps(data).encode())
+    return {"device_id": device_id, "tourist_id": "tourist_1", "data": base64.b64encode(token).decode()}
+
+
+def device_rows(processor):
+    if processor.writer is not None:
+        processor.writer.flush()
+    with processor.db.connection() as conn:
+        return conn.execute('SELECT id, data_type, processed FROM device_data ORDER BY id').fetchall()
+
+
+@pytest.mark.parametrize('write_behind', [False, True])
+def test_rows_are_marked_processed_by_their_reserved_id(make_processor, write_behind):
+    processor = make_processor(write_behind=write_behind, pipeline_workers=0)
+    key = Fernet.generate_key().decode()
+    processor.register_device("device_1", "tourist_1", key)
+
+    untouched = processor.store_raw_data("device_1", "tourist_1", "health", "raw")
+    for sequence in range(3):
+        processor.process_incoming_data(location_message(key, "device_1", sequence), 'iot/device/location')
+    processor.process_incoming_data({"device_id": "device_1", "data": "not a token"}, 'iot/device/location')
+
+    rows = device_rows(processor)
+    assert rows[0] == (untouched, "health", 0)
+    assert [processed for _, data_type, processed in rows[1:]] == [1, 1, 1, 0]
+
+    processor.mark_data_as_processed(untouched)
+    assert device_rows(processor)[0] == (untouched, "health", 1)
+
+
+def test_two_processors_and_a_restart_never_reuse_an_id(make_processor):
+    first = make_processor(write_behind=False, pipeline_workers=0)
+    second = make_processor(write_behind=False, pipeline_workers=0)
+    key = Fernet.generate_key().decode()
+    first.register_device("device_1", "tourist_1", key)
+
+    for sequence in range(10):
+        processor = first if sequence % 2 else second
+        processor.process_incoming_data(location_message(key, "device_1", sequence), 'iot/device/location')
+    first.close()
+    restarted = make_processor(write_behind=False, pipeline_workers=0)
+    restarted.process_incoming_data(location_message(key, "device_1", 10), 'iot/device/location')
+
+    rows = device_rows(restarted)
+    assert len(rows) == 11
+    assert all(processed for _, _, processed in rows)
+    assert rows[-1][0] > max(row_id for row_id, _, _ in rows[:-1])
@@ -0,0 +1,49 @@
+"""
+Timestamp Conversion for the IoT services
+Devices, the processor and the device_data table carry time as int epoch
+milliseconds. ISO 8601 strings appear only at the edges: alerts and updates
+published for the backend, and payloads from devices or rows stored before
+the switch, which are converted on the way in. As in the AI engine,
+timestamps without a UTC offset are local wall-clock time, as older devices
+and processors wrote them with datetime.now().isoformat(), and numbers below
+EPOCH_MS_CUTOFF are epoch seconds. to_epoch_ms and its constants are a copy
+of ai/timestamps.py, checked by tests/test_shared_copies.py.
+"""
+
+import numbers
+import time
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_MS_CUTOFF = 10 ** 11
+
+
+def now_ms():
+    """:return: Current time in epoch milliseconds"""
+    return time.time_ns() // 1000000
+
+
+def to_epoch_ms(timestamp):
+    """
+    Convert one timestamp to epoch milliseconds
+    :param timestamp: ISO 8601 string, datetime, or epoch milliseconds/seconds
+    :return: int milliseconds since the Unix epoch (sub-millisecond parts are floored)
+    """
+    if isinstance(timestamp, numbers.Real) and not isinstance(timestamp, bool):
+        if abs(timestamp) >= EPOCH_MS_CUTOFF:
+            return int(round(timestamp))
+        return int(round(timestamp * 1000))
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.astimezone(timezone.utc)  # Naive: local wall-clock time
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def to_iso(epoch_ms):
+    """
+    Format epoch milliseconds for the edges, e.g. '2025-09-08T10:00:00.000Z'
+    """
+    moment = EPOCH + timedelta(milliseconds=epoch_ms)
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
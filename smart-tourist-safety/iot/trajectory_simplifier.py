@@ -0,0 +1,86 @@
+"""
+Trajectory Simplification for the IoT Data Processor
+This module decides, point by point, which location updates of a device are
+worth storing. A point is dropped only while the stored track, interpolated
+in time between the stored points around it, places the device within
+tolerance_m metres of where it reported being (synchronized Euclidean
+distance), so stops and sharp turns are stored. Reporting gaps longer than
+max_gap_seconds are stored exactly and no other gap grows beyond it.
+StreamingSimplifier is a copy of the one in ai/trajectory_simplifier.py,
+checked by tests/test_shared_copies.py.
+"""
+
+import math
+
+EARTH_RADIUS_M = 6371008.8  # Mean Earth radius in metres, as in ai/geo_kernels.py
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+class StreamingSimplifier:
+    """
+    Opening-window simplifier for one track fed a point at a time. Each point
+    is held until a later one shows whether it is needed; pending is the
+    newest point that has not been emitted yet
+    """
+
+    def __init__(self, tolerance_m=10.0, max_gap_seconds=300.0, max_buffer=64):
+        """
+        :param tolerance_m: Largest SED of a dropped point, in metres
+        :param max_gap_seconds: Longest time between emitted points, unless the
+                                raw points themselves are further apart
+        :param max_buffer: Points held at most before one is emitted anyway
+        """
+        self.tolerance_m = tolerance_m
+        self.max_gap_seconds = max_gap_seconds
+        self.max_buffer = max_buffer
+        self.anchor = None  # Last emitted (latitude, longitude, epoch, item)
+        self.buffer = []  # Points since the anchor, oldest first
+
+    @property
+    def pending(self):
+        return self.buffer[-1] if self.buffer else None
+
+    def _breaks(self, point):
+        """True when the window from the anchor to point no longer fits the bound"""
+        lat0, lon0, t0, _ = self.anchor
+        if point[2] - t0 > self.max_gap_seconds or len(self.buffer) >= self.max_buffer:
+            return True
+        x_scale = math.cos(math.radians(lat0)) * METRES_PER_DEGREE
+        x1 = (point[1] - lon0) * x_scale
+        y1 = (point[0] - lat0) * METRES_PER_DEGREE
+        span = point[2] - t0
+        for latitude, longitude, epoch, _ in self.buffer:
+            ratio = (epoch - t0) / span if span > 0 else 0.0
+            if math.hypot(ratio * x1 - (longitude - lon0) * x_scale,
+                          ratio * y1 - (latitude - lat0) * METRES_PER_DEGREE) > self.tolerance_m:
+                return True
+        return False
+
+    def push(self, latitude, longitude, epoch, item=None):
+        """
+        Add the next point; epochs must not decrease
+        :param item: Payload carried along with the point, e.g. the raw message
+        :return: List of (latitude, longitude, epoch, item) points now emitted
+        """
+        point = (latitude, longitude, epoch, item)
+        if self.anchor is None:
+            self.anchor = point
+            return [point]
+        emitted = []
+        if self.buffer and self._breaks(point):
+            self.anchor = self.buffer[-1]
+            self.buffer = []
+            emitted.append(self.anchor)
+        self.buffer.append(point)
+        return emitted
+
+    def flush(self):
+        """
+        Emit the pending point, e.g. at shutdown; the track continues from it
+        :return: List with the pending point, or empty
+        """
+        if not self.buffer:
+            return []
+        self.anchor = self.buffer[-1]
+        self.buffer = []
+        return [self.anchor]